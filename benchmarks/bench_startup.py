@@ -0,0 +1,90 @@
+"""
+启动时间基准测试：在新的 Python 进程中测量从导入到主窗口可以进入 mainloop 之前的耗时。
+
+用法：python benchmarks/bench_startup.py [--runs 10] [--max-ms 300] [--tk]
+
+超过 --max-ms 时返回非零退出码，便于在构建脚本中发现启动性能退化。
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# 在子进程中执行的启动流程，与 main.py 的图形界面启动路径一致
+STARTUP_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {src_dir!r})
+from ffmpeg_utils import check_ffmpeg
+found = check_ffmpeg()
+checked = time.perf_counter()
+import gui
+imported = time.perf_counter()
+if {with_tk!r}:
+    from tkinter import Tk
+    root = Tk()
+    gui.set_root(root)
+    gui.show_main_window()
+    root.update()
+    root.destroy()
+end = time.perf_counter()
+print(json.dumps({{
+    "found": found,
+    "check_ffmpeg": checked - start,
+    "import_gui": imported - checked,
+    "total": end - start,
+}}))
+"""
+
+
+def run_once(work_dir, with_tk):
+    script = STARTUP_SCRIPT.format(src_dir=os.path.abspath(SRC_DIR), with_tk=with_tk)
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=work_dir,
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MyFFmpegApp 启动时间基准测试")
+    parser.add_argument("--runs", type=int, default=10, help="测量次数")
+    parser.add_argument(
+        "--max-ms", type=float, default=300, help="启动耗时中位数的上限（毫秒）"
+    )
+    parser.add_argument("--tk", action="store_true", help="包含创建主窗口的耗时")
+    args = parser.parse_args()
+
+    # 在临时目录中运行，第一次运行为冷启动（无 FFmpeg 信息缓存）
+    with tempfile.TemporaryDirectory() as work_dir:
+        cold = run_once(work_dir, args.tk)
+        runs = [run_once(work_dir, args.tk) for _ in range(args.runs)]
+
+    if not cold["found"]:
+        print("警告: 未找到 FFmpeg，check_ffmpeg 的耗时不具代表性", file=sys.stderr)
+
+    def median_ms(name):
+        return statistics.median(run[name] for run in runs) * 1000
+
+    print(f"冷启动:            {cold['total'] * 1000:8.1f} ms")
+    print(f"热启动（中位数）:  {median_ms('total'):8.1f} ms")
+    print(f"  check_ffmpeg:    {median_ms('check_ffmpeg'):8.1f} ms")
+    print(f"  import gui:      {median_ms('import_gui'):8.1f} ms")
+
+    if median_ms("total") > args.max_ms:
+        print(f"启动耗时超过上限 {args.max_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
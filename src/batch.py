@@ -0,0 +1,185 @@
+import os
+import glob
+import threading
+from job_queue import Job, DONE
+from presets import compile_preset, preset_output_extension
+from utils import MEDIA_EXTENSIONS
+
+# 默认的输出文件名格式
+DEFAULT_NAME_PATTERN = "{name}_out"
+# 输出文件名格式中可用的字段
+NAME_FIELDS = ("name", "ext", "index", "parent")
+
+
+def expand_inputs(patterns, recursive=False):
+    """
+    把文件、文件夹和通配符展开为文件列表，按给出的顺序排列并去除重复。
+
+    文件夹只包含媒体文件；recursive 为 True 时包含子文件夹，通配符中可以使用 "**"。
+    """
+    files = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = []
+            for dir_path, dir_names, file_names in os.walk(pattern):
+                if not recursive:
+                    dir_names.clear()
+                dir_names.sort()
+                matches.extend(
+                    os.path.join(dir_path, file_name)
+                    for file_name in sorted(file_names)
+                    if file_name.lower().endswith(MEDIA_EXTENSIONS)
+                )
+        elif any(char in pattern for char in "*?["):
+            matches = sorted(
+                path
+                for path in glob.glob(pattern, recursive=recursive)
+                if os.path.isfile(path)
+            )
+        else:
+            matches = [pattern]
+
+        for path in matches:
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
+
+
+def validate_name_pattern(name_pattern):
+    # 检查输出文件名格式，无效时抛出 ValueError
+    try:
+        name_pattern.format(**{field: "" for field in NAME_FIELDS})
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(
+            f"无效的文件名格式: {name_pattern}（可用字段: "
+            + ", ".join("{" + field + "}" for field in NAME_FIELDS)
+            + f"）: {e}"
+        )
+
+
+def batch_output_path(input_file, output_dir, name_pattern, extension, index):
+    """
+    按文件名格式生成输出路径。
+
+    :param output_dir: 输出文件夹，为空时输出到输入文件所在的文件夹
+    :param name_pattern: 文件名格式，可用 {name}（输入文件名）、{ext}（输入扩展名）、
+        {index}（序号，从 1 开始）、{parent}（输入文件所在文件夹名）
+    """
+    input_dir = os.path.dirname(os.path.abspath(input_file))
+    stem, ext = os.path.splitext(os.path.basename(input_file))
+    name = name_pattern.format(
+        name=stem, ext=ext.lstrip("."), index=index, parent=os.path.basename(input_dir)
+    )
+    return os.path.join(output_dir or input_dir, name + extension)
+
+
+class BatchProgress(object):
+    """
+    合并批量任务的进度，各任务按输入文件大小加权。
+
+    :param on_update: 进度回调，参数为 BatchProgress，在工作线程中调用
+    :param on_job_finish: 单个任务结束时的回调，参数为 job，在工作线程中调用
+    """
+
+    def __init__(self, on_update=None, on_job_finish=None):
+        self.on_update = on_update
+        self.on_job_finish = on_job_finish
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self._weights = {}
+        self._fractions = {}
+        self._lock = threading.Lock()
+
+    def add(self, job, weight):
+        with self._lock:
+            self._weights[job.id] = max(weight, 1)
+            self._fractions[job.id] = 0.0
+            self.total += 1
+
+    @property
+    def percent(self):
+        with self._lock:
+            total_weight = sum(self._weights.values()) or 1
+            done = sum(
+                self._fractions[job_id] * weight
+                for job_id, weight in self._weights.items()
+            )
+        return done / total_weight * 100
+
+    @property
+    def finished(self):
+        return self.done + self.failed >= self.total
+
+    def job_progress(self, job, event):
+        if event.percent is None:
+            return
+        with self._lock:
+            self._fractions[job.id] = event.percent / 100
+        if self.on_update:
+            self.on_update(self)
+
+    def job_finished(self, job):
+        with self._lock:
+            self._fractions[job.id] = 1.0
+            if job.state == DONE:
+                self.done += 1
+            else:
+                self.failed += 1
+        if self.on_job_finish:
+            self.on_job_finish(job)
+        if self.on_update:
+            self.on_update(self)
+
+
+def build_batch_jobs(
+    preset,
+    input_files,
+    output_dir=None,
+    name_pattern=DEFAULT_NAME_PATTERN,
+    skip_existing=False,
+    on_update=None,
+    on_job_finish=None,
+):
+    """
+    把预设应用到每个输入文件，返回 (任务列表, BatchProgress)，任务需要提交到任务队列运行。
+
+    预设必须只有一个输入文件占位符，否则抛出 ValueError。
+    输出文件与输入文件相同、或 skip_existing 为 True 且输出文件已存在时跳过该文件。
+    """
+    template = compile_preset(preset)
+    template.validate()
+    if len(template.file_types) != 1:
+        raise ValueError(
+            f"批量运行只支持一个输入文件的预设，该预设需要 {len(template.file_types)} 个"
+        )
+    validate_name_pattern(name_pattern)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    progress = BatchProgress(on_update, on_job_finish)
+    jobs = []
+    for index, input_file in enumerate(input_files, 1):
+        extension = preset_output_extension(preset["output_type"], input_file)
+        output_file = batch_output_path(
+            input_file, output_dir, name_pattern, extension, index
+        )
+        if os.path.abspath(output_file) == os.path.abspath(input_file):
+            continue
+        if skip_existing and os.path.exists(output_file):
+            continue
+        job = Job(
+            template.fill([input_file], output_file),
+            description=output_file,
+            outputs=template.output_files(output_file),
+            on_progress=progress.job_progress,
+            on_finish=progress.job_finished,
+        )
+        progress.add(
+            job, os.path.getsize(input_file) if os.path.isfile(input_file) else 0
+        )
+        jobs.append(job)
+    return jobs, progress
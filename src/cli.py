@@ -0,0 +1,827 @@
+import os
+import sys
+import time
+import argparse
+from batch import DEFAULT_NAME_PATTERN, build_batch_jobs, expand_inputs
+from ffmpeg_utils import (
+    build_command,
+    build_ladder_command,
+    build_stream_command,
+    ladder_output_files,
+    stream_output_file,
+    resolve_format,
+    check_ffmpeg,
+    STREAM_FORMATS,
+    DEFAULT_SEGMENT_SECONDS,
+)
+from job_queue import Job, get_job_queue, DONE, CANCELLED
+from operations import compile_operations, fuse_trims, parse_operation
+from presets import (
+    get_preset_store,
+    compile_preset,
+    preset_output_extension,
+)
+from thread_budget import estimate_threads
+from utils import probe, convert_time_to_seconds, convert_seconds_to_time
+
+# 命令行选项与导出窗口选项的对应关系
+FORMATS = {
+    "source": "原格式",
+    "mp4-h264": "mp4 (h264)",
+    "mp4-h265": "mp4 (h265)",
+    "hls": "HLS (m3u8)",
+    "dash": "DASH (mpd)",
+}
+ROTATIONS = {
+    "none": "不旋转",
+    "cw90": "顺时针旋转90°",
+    "ccw90": "逆时针旋转90°",
+    "180": "旋转180°",
+    "hflip": "水平翻转",
+    "vflip": "垂直翻转",
+}
+# 进度输出的最小间隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+
+def parse_time(value):
+    # 支持 "HH:MM:SS.xx" 和秒数两种格式
+    if ":" in value:
+        return convert_time_to_seconds(value)
+    return float(value)
+
+
+def output_path(input_file, output, extension, multiple):
+    """
+    确定输出文件路径：output 为文件夹（或有多个输入）时使用输入文件名加新扩展名。
+    """
+    if output is None:
+        output = os.path.dirname(os.path.abspath(input_file))
+    if multiple or os.path.isdir(output):
+        stem = os.path.splitext(os.path.basename(input_file))[0]
+        output = os.path.join(output, f"{stem}.{extension.lstrip('.')}")
+    if os.path.abspath(output) == os.path.abspath(input_file):
+        raise SystemExit(f"输出文件与输入文件相同: {input_file}")
+    return output
+
+
+class ProgressPrinter(object):
+    """
+    把任务进度按固定间隔输出到 stderr。
+    """
+
+    def __init__(self):
+        self._last = {}
+
+    def __call__(self, job, event):
+        now = time.monotonic()
+        if not event.finished and now - self._last.get(job.id, 0) < PROGRESS_INTERVAL:
+            return
+        self._last[job.id] = now
+        text = f"[{job.id}] {os.path.basename(job.description)}: "
+        text += convert_seconds_to_time(event.out_time)
+        if event.percent is not None:
+            text += f" ({event.percent:.1f}%)"
+        if event.speed:
+            text += f" {event.speed:.2f}x"
+        print(text, file=sys.stderr, flush=True)
+
+
+def print_result(job):
+    if job.state == DONE:
+        print(f"[{job.id}] 完成: {job.description}", file=sys.stderr)
+        if job.summary:
+            print(f"[{job.id}] {job.summary}", file=sys.stderr)
+    elif job.state == CANCELLED:
+        print(f"[{job.id}] 已取消: {job.description}", file=sys.stderr)
+    else:
+        print(
+            f"[{job.id}] 失败: {job.description} ({job.error or job.returncode})",
+            file=sys.stderr,
+        )
+
+
+def wait_jobs(job_queue):
+    # 等待所有任务结束，Ctrl+C 时取消所有任务并删除不完整的输出，返回是否被中断
+    try:
+        job_queue.wait()
+        return False
+    except KeyboardInterrupt:
+        print("正在取消所有任务…", file=sys.stderr, flush=True)
+        job_queue.shutdown()
+        return True
+
+
+def parse_ladder(value):
+    resolutions = value.split(",") if value else []
+    for resolution in resolutions:
+        width, _, height = resolution.partition("x")
+        if not (width.isdigit() and height.isdigit()):
+            raise SystemExit(f"无效的分辨率: {resolution}")
+    return resolutions
+
+
+def stream_job(args, input_file, format):
+    # 分段输出写入文件夹，默认为输入文件旁边的 "名称_hls" 或 "名称_dash"
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    muxer = STREAM_FORMATS[format]
+    if args.output is None:
+        output_dir = os.path.join(
+            os.path.dirname(os.path.abspath(input_file)), f"{stem}_{muxer}"
+        )
+    elif len(args.inputs) > 1:
+        output_dir = os.path.join(args.output, stem)
+    else:
+        output_dir = args.output
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    info = probe(input_file)
+    command = build_stream_command(
+        input_file,
+        output_dir,
+        format,
+        parse_ladder(args.ladder),
+        args.audio_bitrate,
+        51 - args.quality,
+        ROTATIONS[args.rotate],
+        args.segment_seconds,
+        info is None or info.has_audio,
+    )
+    return Job(
+        command,
+        description=output_dir,
+        outputs=[stream_output_file(output_dir, format)],
+    )
+
+
+def encode_mode_options(args):
+    # 选中的编码方式，多分辨率和分段输出只能作为一个普通任务运行，不能与这些方式组合
+    return [
+        option
+        for option, selected in (
+            ("--target-size", args.target_size),
+            ("--parallel", args.parallel),
+            ("--resumable", args.resumable),
+        )
+        if selected
+    ]
+
+
+def convert_jobs(args, audio):
+    jobs = []
+    format = FORMATS.get(args.format, args.format)
+    if not audio and format in STREAM_FORMATS and encode_mode_options(args):
+        raise SystemExit(
+            f"{STREAM_FORMATS[format]} 格式不能与 {'、'.join(encode_mode_options(args))} 同时使用"
+        )
+    if not audio and args.ladder and encode_mode_options(args):
+        raise SystemExit(
+            f"--ladder 不能与 {'、'.join(encode_mode_options(args))} 同时使用"
+        )
+    for input_file in args.inputs:
+        if not audio and format in STREAM_FORMATS:
+            jobs.append(stream_job(args, input_file, format))
+            continue
+        extension, _ = resolve_format(input_file, format)
+        output_file = output_path(
+            input_file, args.output, extension, len(args.inputs) > 1
+        )
+        if audio:
+            command = build_command(
+                input_file,
+                output_file,
+                format,
+                None,
+                None,
+                args.audio_bitrate,
+                None,
+                None,
+                None,
+                None,
+                not args.no_metadata,
+                None,
+                None,
+                None,
+            )
+        else:
+            width, _, height = (args.resolution or "").partition("x")
+            command = build_command(
+                input_file,
+                output_file,
+                format,
+                "自定义" if args.resolution else "与原视频相同",
+                None,
+                args.audio_bitrate,
+                51 - args.quality,
+                width,
+                height,
+                ROTATIONS[args.rotate],
+                not args.no_metadata,
+                None,
+                None,
+                False,
+            )
+        if not audio and args.target_size:
+            from two_pass import two_pass_target
+
+            if args.parallel or args.resumable:
+                raise SystemExit(
+                    "--target-size 不能与 --parallel、--resumable 同时使用"
+                )
+            jobs.append(
+                Job(
+                    description=output_file,
+                    target=two_pass_target(command, args.target_size),
+                    threads=estimate_threads(command),
+                    outputs=[output_file],
+                )
+            )
+        elif not audio and args.ladder:
+            resolutions = parse_ladder(args.ladder)
+            output_files = ladder_output_files(output_file, resolutions)
+            jobs.append(
+                Job(
+                    build_ladder_command(
+                        input_file,
+                        output_files,
+                        format,
+                        resolutions,
+                        args.audio_bitrate,
+                        51 - args.quality,
+                        ROTATIONS[args.rotate],
+                        not args.no_metadata,
+                    ),
+                    description=output_file,
+                    outputs=output_files,
+                )
+            )
+        elif not audio and args.resumable:
+            from parallel_encode import default_workers
+            from resumable_encode import resumable_target
+
+            jobs.append(
+                Job(
+                    description=output_file,
+                    target=resumable_target(
+                        command, default_workers() if args.parallel else 1
+                    ),
+                    threads=(
+                        os.cpu_count() if args.parallel else estimate_threads(command)
+                    ),
+                    outputs=[output_file],
+                )
+            )
+        elif not audio and args.parallel:
+            from parallel_encode import run_parallel_encode
+
+            jobs.append(
+                Job(
+                    description=output_file,
+                    target=lambda job, command=command: run_parallel_encode(
+                        command,
+                        on_progress=job.report_progress,
+                        log=job.log,
+                        threads=job.threads,
+                        on_start=job.process_started,
+                    ),
+                    threads=os.cpu_count(),
+                    outputs=[output_file],
+                )
+            )
+        else:
+            jobs.append(Job(command, outputs=[output_file]))
+    return jobs
+
+
+def trim_jobs(args):
+    jobs = []
+    for input_file in args.inputs:
+        output_file = output_path(
+            input_file,
+            args.output,
+            os.path.splitext(input_file)[1],
+            len(args.inputs) > 1,
+        )
+        start = parse_time(args.start)
+        if args.end:
+            end = parse_time(args.end)
+        else:
+            info = probe(input_file)
+            if info is None or info.duration is None:
+                raise SystemExit(f"无法获取媒体时长: {input_file}")
+            end = info.duration
+        trim_duration = convert_seconds_to_time(end - start)
+
+        if args.mode == "smart":
+            from smart_cut import run_smart_cut
+
+            jobs.append(
+                Job(
+                    description=output_file,
+                    total_duration=trim_duration,
+                    target=lambda job, i=input_file, o=output_file, s=start, e=end: (
+                        run_smart_cut(
+                            i,
+                            o,
+                            s,
+                            e,
+                            job.report_progress,
+                            job.log,
+                            job.process_started,
+                        )
+                    ),
+                    outputs=[output_file],
+                )
+            )
+            continue
+
+        command = build_command(
+            input_file,
+            output_file,
+            "原格式",
+            None,
+            None,
+            None,
+            None,
+            None,
+            None,
+            None,
+            True,
+            convert_seconds_to_time(start),
+            convert_seconds_to_time(end),
+            args.mode == "quick",
+        )
+        jobs.append(Job(command, total_duration=trim_duration, outputs=[output_file]))
+    return jobs
+
+
+def operation_jobs(args):
+    try:
+        operations = [parse_operation(text) for text in args.op]
+    except ValueError as e:
+        raise SystemExit(str(e))
+    jobs = []
+    for input_file in args.inputs:
+        output_file = output_path(
+            input_file,
+            args.output,
+            os.path.splitext(input_file)[1],
+            len(args.inputs) > 1,
+        )
+        try:
+            command = compile_operations(input_file, output_file, operations)
+            info = probe(input_file)
+            start, end = fuse_trims(operations, info.duration if info else None)
+        except ValueError as e:
+            raise SystemExit(f"{input_file}: {e}")
+        total_duration = None
+        if end is not None:
+            total_duration = convert_seconds_to_time(end - start)
+        jobs.append(
+            Job(
+                command,
+                description=output_file,
+                total_duration=total_duration,
+                outputs=[output_file],
+            )
+        )
+    return jobs
+
+
+def preset_jobs(args):
+    preset = get_preset_store().get(args.key)
+    if preset is None:
+        raise SystemExit(f"预设不存在: {args.key}")
+
+    template = compile_preset(preset)
+    try:
+        template.validate()
+    except ValueError as e:
+        raise SystemExit(f"预设 {args.key} 无法运行: {e}")
+    if len(args.inputs) != len(template.file_types):
+        raise SystemExit(
+            f"预设需要 {len(template.file_types)} 个输入文件"
+            f"（{', '.join(template.file_types)}），实际为 {len(args.inputs)} 个"
+        )
+    output_file = output_path(
+        args.inputs[0],
+        args.output,
+        preset_output_extension(preset["output_type"], args.inputs[0]),
+        False,
+    )
+    command = template.fill(args.inputs, output_file)
+    return [
+        Job(
+            command,
+            description=output_file,
+            outputs=template.output_files(output_file),
+        )
+    ]
+
+
+def batch(args):
+    preset = get_preset_store().get(args.key)
+    if preset is None:
+        raise SystemExit(f"预设不存在: {args.key}")
+    input_files = expand_inputs(args.inputs, args.recursive)
+    if not input_files:
+        raise SystemExit("没有找到输入文件")
+
+    last_update = [0]
+
+    def on_update(progress):
+        now = time.monotonic()
+        if not progress.finished and now - last_update[0] < PROGRESS_INTERVAL:
+            return
+        last_update[0] = now
+        print(
+            f"批量进度: {progress.percent:.1f}% "
+            f"（完成 {progress.done}，失败 {progress.failed}，共 {progress.total}）",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    try:
+        jobs, progress = build_batch_jobs(
+            preset,
+            input_files,
+            args.output,
+            args.pattern,
+            args.skip_existing,
+            on_update=on_update,
+            on_job_finish=print_result,
+        )
+    except ValueError as e:
+        raise SystemExit(f"预设 {args.key} 无法批量运行: {e}")
+    if not jobs:
+        print("没有需要处理的文件", file=sys.stderr)
+        return 0
+    if args.estimate:
+        return estimate_jobs(jobs)
+
+    job_queue = get_job_queue()
+    if args.jobs:
+        job_queue.set_max_workers(args.jobs)
+    if args.pin_cpus:
+        job_queue.set_pin_cpus(True)
+    for job in jobs:
+        job_queue.submit(job)
+    if wait_jobs(job_queue):
+        return 130
+    return 0 if progress.failed == 0 else 1
+
+
+def resume(args):
+    from parallel_encode import default_workers
+    from resumable_encode import pending_encodes, resumable_target
+
+    encodes = pending_encodes()
+    if not encodes:
+        print("没有未完成的断点续传编码", file=sys.stderr)
+        return 0
+    for command, done, total in encodes:
+        print(f"{command[-1]}: 已完成 {done} / {total} 个片段", file=sys.stderr)
+    if args.list:
+        return 0
+
+    workers = default_workers() if args.parallel else 1
+    jobs = [
+        Job(
+            description=command[-1],
+            target=resumable_target(command, workers),
+            threads=os.cpu_count() if args.parallel else estimate_threads(command),
+            outputs=[command[-1]],
+        )
+        for command, done, total in encodes
+    ]
+    return run_jobs(jobs, args.jobs, args.pin_cpus)
+
+
+def scan(args):
+    from probe_db import scan_folder
+
+    def on_progress(done, total):
+        if done == total or done % 100 == 0:
+            print(f"已探测 {done} / {total}", file=sys.stderr, flush=True)
+
+    count = scan_folder(
+        args.folder, not args.no_recursive, args.workers, on_progress=on_progress
+    )
+    print(f"扫描完成，新探测 {count} 个文件", file=sys.stderr)
+    return 0
+
+
+def watch(args):
+    from watch_folder import STABLE_SECONDS, FolderWatcher, WatchRule
+    from watch_folder import WATCH_FILE, load_watch_rules
+
+    if args.mappings:
+        rules = []
+        for mapping in args.mappings:
+            folder, _, key = mapping.rpartition("=")
+            if not folder or not key.isdigit():
+                raise SystemExit(f"无效的监视规则: {mapping}（格式为 文件夹=预设编号）")
+            rules.append(
+                WatchRule(folder, int(key), args.output, args.pattern, args.recursive)
+            )
+    else:
+        try:
+            rules = load_watch_rules(args.config or WATCH_FILE)
+        except (OSError, ValueError, KeyError) as e:
+            raise SystemExit(f"无法读取监视配置: {e}")
+
+    job_queue = get_job_queue()
+    if args.jobs:
+        job_queue.set_max_workers(args.jobs)
+    if args.pin_cpus:
+        job_queue.set_pin_cpus(True)
+    watcher = FolderWatcher(
+        rules,
+        job_queue,
+        stable_seconds=(
+            STABLE_SECONDS if args.stable_seconds is None else args.stable_seconds
+        ),
+        polling=args.poll,
+        on_job_finish=print_result,
+        log=lambda text: print(text, file=sys.stderr, flush=True),
+    )
+    try:
+        watcher.run()
+    except ValueError as e:
+        raise SystemExit(str(e))
+    except KeyboardInterrupt:
+        print("正在停止监视并取消所有任务…", file=sys.stderr, flush=True)
+        job_queue.shutdown()
+    return 0
+
+
+def estimate_jobs(jobs):
+    # 估算每个任务的耗时和输出大小，不运行任务
+    total_seconds = 0.0
+    total_size = 0
+    for job in jobs:
+        try:
+            estimate = job.estimate()
+        except ValueError as e:
+            print(f"[{job.id}] {job.description}: 无法估算（{e}）", file=sys.stderr)
+            continue
+        if estimate is None:
+            print(
+                f"[{job.id}] {job.description}: 无法估算（任务由多个步骤组成）",
+                file=sys.stderr,
+            )
+            continue
+        print(f"[{job.id}] {job.description}: {estimate.describe()}", file=sys.stderr)
+        total_seconds += estimate.seconds
+        total_size += estimate.size
+    if len(jobs) > 1:
+        print(
+            f"合计: 依次运行预计耗时 {convert_seconds_to_time(total_seconds)}，"
+            f"输出约 {total_size / 1000000:.1f} MB",
+            file=sys.stderr,
+        )
+    return 0
+
+
+def run_jobs(jobs, max_workers, pin_cpus=False):
+    job_queue = get_job_queue()
+    if max_workers:
+        job_queue.set_max_workers(max_workers)
+    if pin_cpus:
+        job_queue.set_pin_cpus(True)
+    printer = ProgressPrinter()
+    for job in jobs:
+        job.on_progress = printer
+        job.on_finish = print_result
+        job_queue.submit(job)
+    if wait_jobs(job_queue):
+        return 130
+    return 0 if all(job.state == DONE for job in jobs) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="MyFFmpegApp", description="视频&音频处理器（命令行模式）"
+    )
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    def add_io(subparser):
+        subparser.add_argument("inputs", nargs="+", help="输入文件")
+        subparser.add_argument(
+            "-o", "--output", help="输出文件或文件夹，默认为输入文件所在的文件夹"
+        )
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            help="同时运行的 FFmpeg 进程数，默认按 CPU 核心数估算",
+        )
+        subparser.add_argument(
+            "--pin-cpus",
+            action="store_true",
+            help="把每个任务绑定到分到的 CPU 核心上",
+        )
+        subparser.add_argument(
+            "--estimate",
+            action="store_true",
+            help="只编码几个短样本，估算耗时和输出大小，不导出",
+        )
+
+    convert_parser = subparsers.add_parser("convert", help="导出视频")
+    add_io(convert_parser)
+    convert_parser.add_argument(
+        "-f",
+        "--format",
+        default="source",
+        help="输出格式：source、mp4-h264、mp4-h265、avi、mkv、mov、flv、webm、hls、dash",
+    )
+    convert_parser.add_argument("-s", "--resolution", help="分辨率，如 1920x1080")
+    convert_parser.add_argument("-a", "--audio-bitrate", help="音频码率（kbps）")
+    convert_parser.add_argument(
+        "-q",
+        "--quality",
+        type=int,
+        default=28,
+        choices=range(52),
+        metavar="0-51",
+        help="视频品质，值越大质量越高，默认 28",
+    )
+    convert_parser.add_argument(
+        "-r", "--rotate", default="none", choices=ROTATIONS, help="旋转或翻转"
+    )
+    convert_parser.add_argument(
+        "--no-metadata", action="store_true", help="不保留元数据"
+    )
+    convert_parser.add_argument("--parallel", action="store_true", help="分段并行编码")
+    convert_parser.add_argument(
+        "--target-size",
+        type=float,
+        metavar="MB",
+        help="目标文件大小（MB），按时长和音频码率计算视频码率并两遍编码，忽略 -q",
+    )
+    convert_parser.add_argument(
+        "--resumable",
+        action="store_true",
+        help="分段编码并记录进度，中断后再次运行相同的命令时从上次完成的片段继续",
+    )
+    convert_parser.add_argument(
+        "--ladder",
+        help="一次解码同时输出多个分辨率，如 1280x720,1920x1080；文件名后加上高度",
+    )
+    convert_parser.add_argument(
+        "--segment-seconds",
+        type=int,
+        default=DEFAULT_SEGMENT_SECONDS,
+        help=f"hls、dash 格式的分段时长（秒），默认 {DEFAULT_SEGMENT_SECONDS}",
+    )
+
+    audio_parser = subparsers.add_parser("audio", help="导出音频")
+    add_io(audio_parser)
+    audio_parser.add_argument(
+        "-f",
+        "--format",
+        default="source",
+        help="输出格式：source、mp3、wav、flac、aac、ogg",
+    )
+    audio_parser.add_argument("-a", "--audio-bitrate", help="音频码率（kbps）")
+    audio_parser.add_argument("--no-metadata", action="store_true", help="不保留元数据")
+
+    trim_parser = subparsers.add_parser("trim", help="裁剪视频或音频")
+    add_io(trim_parser)
+    trim_parser.add_argument(
+        "--start", default="0", help="开始时间，HH:MM:SS.xx 或秒数"
+    )
+    trim_parser.add_argument("--end", help="结束时间，默认为媒体结尾")
+    trim_parser.add_argument(
+        "-m",
+        "--mode",
+        default="accurate",
+        choices=["accurate", "quick", "smart"],
+        help="裁剪方式：精确、快速或智能",
+    )
+
+    ops_parser = subparsers.add_parser(
+        "ops", help="按顺序组合多个操作，合并为一次 FFmpeg 调用"
+    )
+    add_io(ops_parser)
+    ops_parser.add_argument(
+        "--op",
+        action="append",
+        required=True,
+        help="操作，可重复，按给出的顺序应用：trim=开始-结束、scale=宽x高、"
+        "rotate=cw90|ccw90|180|hflip|vflip、codec=编码器、vbitrate=kbps、"
+        "abitrate=kbps、crf=0-51、metadata=keep|strip",
+    )
+
+    preset_parser = subparsers.add_parser("preset", help="运行预设")
+    preset_parser.add_argument("key", type=int, help="预设编号")
+    add_io(preset_parser)
+
+    batch_parser = subparsers.add_parser("batch", help="对多个文件批量运行预设")
+    batch_parser.add_argument("key", type=int, help="预设编号")
+    add_io(batch_parser)
+    batch_parser.add_argument(
+        "-p",
+        "--pattern",
+        default=DEFAULT_NAME_PATTERN,
+        help="输出文件名格式，可用 {name}、{ext}、{index}、{parent}，"
+        f"默认 {DEFAULT_NAME_PATTERN}",
+    )
+    batch_parser.add_argument(
+        "-r", "--recursive", action="store_true", help="包含子文件夹"
+    )
+    batch_parser.add_argument(
+        "--skip-existing", action="store_true", help="跳过输出文件已存在的输入"
+    )
+
+    resume_parser = subparsers.add_parser(
+        "resume", help="继续所有中断的断点续传编码（convert --resumable）"
+    )
+    resume_parser.add_argument("--list", action="store_true", help="只列出未完成的编码")
+    resume_parser.add_argument("--parallel", action="store_true", help="分段并行编码")
+    resume_parser.add_argument(
+        "-j", "--jobs", type=int, help="同时运行的 FFmpeg 进程数"
+    )
+    resume_parser.add_argument(
+        "--pin-cpus", action="store_true", help="把每个任务绑定到分到的 CPU 核心上"
+    )
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="监视文件夹，用预设自动处理新出现的文件"
+    )
+    watch_parser.add_argument(
+        "mappings",
+        nargs="*",
+        metavar="文件夹=预设编号",
+        help="监视的文件夹和使用的预设，省略时从 --config 读取",
+    )
+    watch_parser.add_argument(
+        "-o", "--output", help="输出文件夹，不能位于监视的文件夹中"
+    )
+    watch_parser.add_argument(
+        "-p",
+        "--pattern",
+        default=DEFAULT_NAME_PATTERN,
+        help=f"输出文件名格式，默认 {DEFAULT_NAME_PATTERN}",
+    )
+    watch_parser.add_argument(
+        "-r", "--recursive", action="store_true", help="包含子文件夹"
+    )
+    watch_parser.add_argument(
+        "--config", help="监视规则的配置文件，默认为 data/watch.json"
+    )
+    watch_parser.add_argument(
+        "--stable-seconds",
+        type=float,
+        help="文件大小保持不变多少秒后开始处理，默认 10",
+    )
+    watch_parser.add_argument(
+        "--poll", action="store_true", help="不使用 inotify，定期检查文件夹"
+    )
+    watch_parser.add_argument("-j", "--jobs", type=int, help="同时运行的 FFmpeg 进程数")
+    watch_parser.add_argument(
+        "--pin-cpus", action="store_true", help="把每个任务绑定到分到的 CPU 核心上"
+    )
+
+    scan_parser = subparsers.add_parser("scan", help="扫描文件夹并缓存媒体信息")
+    scan_parser.add_argument("folder", help="要扫描的文件夹")
+    scan_parser.add_argument(
+        "--no-recursive", action="store_true", help="不包含子文件夹"
+    )
+    scan_parser.add_argument("--workers", type=int, help="同时运行的 ffprobe 进程数")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not check_ffmpeg():
+        print("未找到 FFmpeg，请先安装或运行图形界面自动下载", file=sys.stderr)
+        return 1
+
+    if args.action == "scan":
+        return scan(args)
+    if args.action == "batch":
+        return batch(args)
+    if args.action == "resume":
+        return resume(args)
+    if args.action == "watch":
+        return watch(args)
+    if args.action == "convert":
+        jobs = convert_jobs(args, audio=False)
+    elif args.action == "audio":
+        jobs = convert_jobs(args, audio=True)
+    elif args.action == "trim":
+        jobs = trim_jobs(args)
+    elif args.action == "ops":
+        jobs = operation_jobs(args)
+    else:
+        jobs = preset_jobs(args)
+    if args.estimate:
+        return estimate_jobs(jobs)
+    return run_jobs(jobs, args.jobs, args.pin_cpus)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import hashlib
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# 每次从网络读取的块大小
+CHUNK_SIZE = 1024 * 1024
+# 写文件的缓冲区大小，缓冲区写满后才落盘并记录续传位置
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+# 进度回调的最小间隔（秒），界面每秒最多刷新 10 次
+PROGRESS_INTERVAL = 0.1
+# 续传状态文件的最小保存间隔（秒）
+STATE_SAVE_INTERVAL = 1.0
+# 每个并行分段的最小字节数，文件太小时不分段
+MIN_RANGE_SIZE = 8 * 1024 * 1024
+# 网络请求超时（秒）
+TIMEOUT = 30
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ThrottledProgress(object):
+    """
+    合并下载进度，按固定间隔调用 callback(已下载字节数, 总字节数, 速度)。
+
+    可以在多个下载线程中同时调用 add()，总字节数未知时为 None。
+    """
+
+    def __init__(self, callback, total=None, interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self.downloaded = 0
+        self._resumed = 0
+        self._start = time.monotonic()
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def resume(self, size):
+        # 续传时已存在的字节数，不计入下载速度
+        with self._lock:
+            self.downloaded += size
+            self._resumed += size
+
+    def add(self, size):
+        with self._lock:
+            self.downloaded += size
+            now = time.monotonic()
+            if now - self._last < self.interval:
+                return
+            self._last = now
+        self._notify(now)
+
+    def finish(self):
+        self._notify(time.monotonic())
+
+    def _notify(self, now):
+        if self.callback is None:
+            return
+        elapsed = now - self._start
+        speed = (self.downloaded - self._resumed) / elapsed if elapsed > 0 else 0
+        self.callback(self.downloaded, self.total, speed)
+
+
+def fetch_checksum(url, session=None):
+    """
+    下载 .sha256 校验文件，返回十六进制的 SHA-256 值；获取失败时返回 None。
+    """
+    session = session or requests
+    try:
+        response = session.get(url, timeout=TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None
+    fields = response.text.split()
+    if fields and len(fields[0]) == 64:
+        return fields[0].lower()
+    return None
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _probe_url(session, url):
+    # 返回 (文件大小, 是否支持 Range 请求)，无法获取时为 (None, False)
+    try:
+        response = session.head(url, allow_redirects=True, timeout=TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None, False
+    size = response.headers.get("Content-Length")
+    accept_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    if not size or not size.isdigit():
+        return None, False
+    return int(size), accept_ranges
+
+
+def _split_ranges(size, connections):
+    # 返回 [[开始, 结束（含）, 已下载字节数]]
+    count = max(1, min(connections, size // MIN_RANGE_SIZE))
+    step = size // count
+    bounds = [i * step for i in range(count)] + [size]
+    return [[bounds[i], bounds[i + 1] - 1, 0] for i in range(count)]
+
+
+def _load_state(state_file, part_file, url, size):
+    # 读取续传状态，URL 或文件大小不一致时视为无效
+    if not os.path.exists(part_file) or os.path.getsize(part_file) != size:
+        return None
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("url") != url or state.get("size") != size:
+        return None
+    return state
+
+
+def _save_state(state_file, state):
+    temp_file = state_file + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temp_file, state_file)
+
+
+class _StateSaver(object):
+    """
+    多个分段线程共享的续传状态，按固定间隔写入状态文件。
+    """
+
+    def __init__(self, state_file, state):
+        self.state_file = state_file
+        self.state = state
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, byte_range, done, force=False):
+        with self._lock:
+            byte_range[2] = done
+            now = time.monotonic()
+            if force or now - self._last >= STATE_SAVE_INTERVAL:
+                self._last = now
+                _save_state(self.state_file, self.state)
+
+
+def _fetch_range(session, url, part_file, byte_range, progress, saver):
+    start, end, done = byte_range
+    if start + done > end:
+        return
+    headers = {"Range": f"bytes={start + done}-{end}"}
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code != 206:
+            raise DownloadError(f"服务器不支持断点续传: HTTP {response.status_code}")
+        written = done
+        pending = 0
+        with open(part_file, "r+b", buffering=WRITE_BUFFER_SIZE) as f:
+            f.seek(start + written)
+            try:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+                    pending += len(chunk)
+                    progress.add(len(chunk))
+                    # 只记录已落盘的位置，中断后从这里续传
+                    if pending >= WRITE_BUFFER_SIZE:
+                        f.flush()
+                        pending = 0
+                        saver.update(byte_range, written)
+            finally:
+                f.flush()
+                saver.update(byte_range, written, force=True)
+    if start + written <= end:
+        raise DownloadError("连接中断，下载不完整")
+
+
+def _fetch_whole(session, url, part_file, progress):
+    # 服务器不支持 Range 请求时从头下载
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        with open(part_file, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                progress.add(len(chunk))
+
+
+def download_file(
+    url, output_file, sha256=None, connections=1, on_progress=None, session=None
+):
+    """
+    下载文件，支持断点续传和多连接并行下载。
+
+    下载中的数据写入 output_file + ".part"，续传位置记录在 ".part.json" 中，
+    中断后再次调用会从记录的位置继续。下载完成并通过校验后才重命名为 output_file。
+
+    :param url: 下载地址
+    :param output_file: 保存路径
+    :param sha256: 期望的 SHA-256 值，为 None 时不校验
+    :param connections: 并行连接数，服务器不支持 Range 请求时只用一个连接
+    :param on_progress: 进度回调 on_progress(已下载字节数, 总字节数, 速度)，按固定间隔调用
+    :param session: requests.Session，默认新建
+    """
+    session = session or requests.Session()
+    part_file = output_file + ".part"
+    state_file = part_file + ".json"
+    size, accept_ranges = _probe_url(session, url)
+    progress = ThrottledProgress(on_progress, size)
+
+    if size and accept_ranges:
+        state = _load_state(state_file, part_file, url, size)
+        if state is None:
+            state = {"url": url, "size": size}
+            state["ranges"] = _split_ranges(size, connections)
+            with open(part_file, "wb") as f:
+                f.truncate(size)
+            _save_state(state_file, state)
+        ranges = state["ranges"]
+        progress.resume(sum(byte_range[2] for byte_range in ranges))
+
+        saver = _StateSaver(state_file, state)
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(
+                    _fetch_range, session, url, part_file, byte_range, progress, saver
+                )
+                for byte_range in ranges
+            ]
+            for future in futures:
+                future.result()
+    else:
+        _fetch_whole(session, url, part_file, progress)
+    progress.finish()
+
+    if sha256 and file_sha256(part_file) != sha256.lower():
+        os.remove(part_file)
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        raise DownloadError("文件校验失败，请重新下载")
+
+    os.replace(part_file, output_file)
+    if os.path.exists(state_file):
+        os.remove(state_file)
+    return output_file
+
+
+def extract_bin(zip_file, target_dir, on_progress=None):
+    """
+    只解压压缩包中 bin 目录下的文件，直接写入 target_dir，返回解压出的文件路径列表。
+
+    每个文件先写入临时文件再重命名，解压中断不会留下不完整的可执行文件。
+
+    :param on_progress: 进度回调 on_progress(已解压字节数, 总字节数, 速度)，按固定间隔调用
+    """
+    with zipfile.ZipFile(zip_file) as archive:
+        members = [
+            member
+            for member in archive.infolist()
+            if not member.is_dir() and "bin" in member.filename.split("/")[:-1]
+        ]
+        if not members:
+            raise DownloadError("压缩包中没有找到 bin 目录")
+        progress = ThrottledProgress(
+            on_progress, sum(member.file_size for member in members)
+        )
+        if not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+        paths = []
+        for member in members:
+            path = os.path.join(target_dir, os.path.basename(member.filename))
+            temp_file = path + ".tmp"
+            with archive.open(member) as source, open(temp_file, "wb") as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    target.write(chunk)
+                    progress.add(len(chunk))
+            # 保留压缩包中记录的权限，没有记录时设为可执行
+            mode = (member.external_attr >> 16) & 0o777
+            os.chmod(temp_file, mode or 0o755)
+            os.replace(temp_file, path)
+            paths.append(path)
+        progress.finish()
+    return paths
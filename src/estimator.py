@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+from ffmpeg_utils import run_ffmpeg_command
+from parallel_encode import input_index
+from thread_budget import apply_threads, estimate_threads, option_value
+from thread_budget import output_positions
+from two_pass import output_duration, parse_seconds, remove_option
+from utils import file_key, probe, convert_seconds_to_time
+
+# 在输入中均匀分布的样本数和每个样本的时长（秒）
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 5
+# 输出不超过样本总时长的这个倍数时，直接完整编码一次
+FULL_ENCODE_FACTOR = 2
+# 会改变输入时间范围的选项，样本命令中替换为样本的范围
+TRIM_OPTIONS = ("-ss", "-to", "-t")
+# 输出为文件夹或分段文件的格式，无法按样本估算
+SEGMENTED_FORMATS = ("hls", "dash")
+
+
+class Estimate(object):
+    """
+    按样本编码外推的导出耗时和输出大小。
+
+    :param seconds: 预计的编码耗时（秒）
+    :param size: 预计的输出大小（字节），多个输出时为总和
+    :param speed: 样本的平均编码倍速（输出时长 / 耗时）
+    :param duration: 输出的总时长（秒）
+    :param samples: 编码的样本数
+    """
+
+    def __init__(self, seconds, size, speed, duration, samples):
+        self.seconds = seconds
+        self.size = size
+        self.speed = speed
+        self.duration = duration
+        self.samples = samples
+
+    @property
+    def bitrate(self):
+        # 平均码率（kbit/s）
+        return self.size * 8 / 1000 / self.duration if self.duration else None
+
+    def describe(self):
+        return (
+            f"预计耗时 {convert_seconds_to_time(self.seconds)}，"
+            f"输出约 {self.size / 1000000:.1f} MB（{self.speed:.2f}x）"
+        )
+
+    def to_dict(self):
+        return {
+            "seconds": self.seconds,
+            "size": self.size,
+            "speed": self.speed,
+            "duration": self.duration,
+            "samples": self.samples,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["seconds"],
+            data["size"],
+            data["speed"],
+            data["duration"],
+            data["samples"],
+        )
+
+
+def _output_positions(command, outputs):
+    # 样本命令中需要替换为临时文件的位置，必须找到每个输出文件，否则样本会覆盖实际的输出
+    positions = output_positions(command, outputs) if outputs else None
+    if not positions:
+        raise ValueError("命令中找不到输出文件")
+    return set(positions)
+
+
+def settings_key(command, outputs, threads):
+    """
+    命令中与输入、输出路径无关的部分，作为估算缓存的键；输出的扩展名决定封装格式，予以保留。
+    """
+    key = list(command)
+    key[input_index(command) + 1] = "{input}"
+    for index in _output_positions(command, outputs):
+        key[index] = "{output}" + os.path.splitext(command[index])[1]
+    return json.dumps([key, threads])
+
+
+def plan_samples(start, duration):
+    """
+    在 [start, start + duration] 中均匀选取样本，返回 [(开始秒数, 时长)]。
+    """
+    if duration <= SAMPLE_COUNT * SAMPLE_SECONDS * FULL_ENCODE_FACTOR:
+        return [(start, duration)]
+    return [
+        (
+            start + duration * (i + 0.5) / SAMPLE_COUNT - SAMPLE_SECONDS / 2,
+            SAMPLE_SECONDS,
+        )
+        for i in range(SAMPLE_COUNT)
+    ]
+
+
+def sample_command(command, outputs, start, length, work_dir, number):
+    """
+    把导出命令改写为只编码一个样本的命令，返回 (命令, 样本输出文件列表)。
+
+    输出文件保留原来的扩展名，使封装格式与实际导出相同。
+    """
+    positions = _output_positions(command, outputs)
+    result = []
+    sample_files = []
+    for i, arg in enumerate(command):
+        if i in positions:
+            extension = os.path.splitext(arg)[1]
+            arg = os.path.join(
+                work_dir, f"sample_{number}_{len(sample_files)}{extension}"
+            )
+            sample_files.append(arg)
+        result.append(arg)
+    for name in TRIM_OPTIONS:
+        result = remove_option(result, name)
+    # -ss 和 -t 都作为输入选项，只读取样本范围，对所有输出都生效
+    i = input_index(result)
+    result = result[:i] + ["-ss", f"{start:.6f}", "-t", f"{length:.6f}"] + result[i:]
+    return result, sample_files
+
+
+def run_estimate(command, outputs, threads):
+    """
+    编码若干个样本，按样本的编码速度和每秒输出字节数外推整个导出。
+
+    :raise ValueError: 命令无法按样本估算或样本编码失败
+    """
+    if option_value(command, "-f") in SEGMENTED_FORMATS:
+        raise ValueError("不支持 HLS/DASH 分段输出")
+    input_file = command[input_index(command) + 1]
+    info = probe(input_file)
+    if info is None:
+        raise ValueError(f"无法读取媒体信息: {input_file}")
+    duration = output_duration(command, info)
+    if not duration:
+        raise ValueError("无法获取媒体时长")
+    start = parse_seconds(option_value(command, "-ss")) or 0.0
+
+    samples = plan_samples(start, duration)
+    work_dir = tempfile.mkdtemp(prefix="estimate_")
+    elapsed = 0.0
+    size = 0
+    sampled = 0.0
+    log = []
+    try:
+        for number, (sample_start, length) in enumerate(samples):
+            sample, sample_files = sample_command(
+                command, outputs, sample_start, length, work_dir, number
+            )
+            began = time.monotonic()
+            returncode = run_ffmpeg_command(
+                apply_threads(sample, threads, sample_files), log=log
+            )
+            elapsed += time.monotonic() - began
+            if returncode != 0:
+                raise ValueError(f"样本编码失败: {log[-1] if log else returncode}")
+            size += sum(
+                os.path.getsize(path) for path in sample_files if os.path.exists(path)
+            )
+            sampled += length
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    speed = sampled / elapsed if elapsed > 0 else 1.0
+    return Estimate(
+        duration / speed, int(size / sampled * duration), speed, duration, len(samples)
+    )
+
+
+def estimate_command(command, outputs, threads=None):
+    """
+    估算 FFmpeg 命令的编码耗时和输出大小，返回 Estimate。
+
+    结果按 (输入文件, 命令的其余部分, 线程数) 缓存在探测数据库中，输入文件变化后失效，
+    相同设置再次估算时不再编码样本。样本编码在调用方线程中运行，需要几秒到几十秒。
+
+    :param outputs: 命令写入的输出文件，由生成命令的调用方提供，样本编码时替换为临时文件
+    :param threads: 编码使用的线程数，默认与任务队列的估算相同
+    :raise ValueError: 命令无法按样本估算或样本编码失败
+    """
+    # 延迟导入，避免循环依赖
+    from probe_db import get_probe_db
+
+    threads = threads or estimate_threads(command)
+    index = input_index(command)
+    if index is None:
+        raise ValueError("只支持单个输入文件的命令")
+    try:
+        path, size, mtime, inode = file_key(command[index + 1])
+    except OSError:
+        raise ValueError(f"无法读取输入文件: {command[index + 1]}")
+
+    settings = settings_key(command, outputs, threads)
+    db = get_probe_db()
+    data = db.get_estimate(path, settings, size, mtime, inode)
+    if data is not None:
+        return Estimate.from_dict(data)
+    estimate = run_estimate(command, outputs, threads)
+    db.put_estimate(path, settings, size, mtime, inode, estimate.to_dict())
+    return estimate
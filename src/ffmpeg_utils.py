@@ -1,77 +1,157 @@
 import subprocess
 import os
-import requests
-import zipfile
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+import json
+import shutil
 import threading
-import re
-from utils import convert_time_to_seconds
+from process_control import popen_kwargs
+from progress import ProgressParser, add_progress_args, parse_duration_line
+from utils import DATA_DIR, convert_time_to_seconds
 
+LOCAL_FFMPEG_DIR = os.path.join(DATA_DIR, "ffmpeg", "bin")
+# 缓存 FFmpeg 路径、版本和编译配置，避免每次启动都运行 ffmpeg -version
+FFMPEG_INFO_FILE = os.path.join(DATA_DIR, "ffmpeg_info.json")
+FFMPEG_DOWNLOAD_URL = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
+# 下载 FFmpeg 时的并行连接数
+DOWNLOAD_CONNECTIONS = 4
 
-def check_ffmpeg():
+_ffmpeg_info = None
+# 各封装格式默认的视频、音频编码，见 get_muxer_codecs
+_muxer_codecs = {}
+
+
+def find_ffmpeg():
+    # 查找 ffmpeg 可执行文件，不启动子进程；找不到时返回 None
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+
+    local_dir = os.path.join(os.getcwd(), LOCAL_FFMPEG_DIR)
+    path = shutil.which("ffmpeg", path=local_dir)
+    if path:
+        os.environ["PATH"] += os.pathsep + local_dir
+    return path
+
+
+def _read_ffmpeg_info():
     try:
-        subprocess.run(
-            ["ffmpeg", "-version"],
+        with open(FFMPEG_INFO_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_ffmpeg_info(info):
+    try:
+        if not os.path.exists(DATA_DIR):
+            os.makedirs(DATA_DIR)
+        temp_file = FFMPEG_INFO_FILE + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+        os.replace(temp_file, FFMPEG_INFO_FILE)
+    except OSError:
+        pass
+
+
+def get_ffmpeg_info():
+    """
+    返回 FFmpeg 的路径、版本和编译配置，找不到 FFmpeg 时返回 None。
+
+    结果按可执行文件的路径、大小和修改时间缓存在 data 目录中，FFmpeg 未更换时不启动子进程。
+    """
+    global _ffmpeg_info
+    path = find_ffmpeg()
+    if path is None:
+        return None
+    stat = os.stat(path)
+    key = {"path": path, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    for info in (_ffmpeg_info, _read_ffmpeg_info()):
+        if info and all(info.get(name) == value for name, value in key.items()):
+            _ffmpeg_info = info
+            return info
+
+    try:
+        result = subprocess.run(
+            [path, "-version"],
             check=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
         )
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        pass
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+    lines = result.stdout.splitlines()
+    info = dict(key)
+    info["version"] = lines[0] if lines else ""
+    info["configuration"] = next(
+        (line for line in lines if line.startswith("configuration:")), ""
+    )
+    info["output"] = result.stdout
+    _write_ffmpeg_info(info)
+    _ffmpeg_info = info
+    return info
 
-    ffmpeg_path = os.path.join(os.getcwd(), "data", "ffmpeg", "bin", "ffmpeg.exe")
-    if os.path.isfile(ffmpeg_path):
-        os.environ["PATH"] += os.pathsep + os.path.join(
-            os.getcwd(), "data", "ffmpeg", "bin"
-        )
-        return True
 
-    return False
+def check_ffmpeg():
+    return get_ffmpeg_info() is not None
 
 
 def download_ffmpeg(progress_var, progress_label, root):
-    url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
-    local_zip_path = "ffmpeg.zip"
-    extract_path = "data"
-
-    response = requests.get(url, stream=True)
-    total_size = int(response.headers.get("content-length", 0))
-    downloaded_size = 0
-
-    with open(local_zip_path, "wb") as file:
-        for chunk in response.iter_content(chunk_size=8192):
-            file.write(chunk)
-            downloaded_size += len(chunk)
-
-            # 使用 root.after 在主线程中更新 Tkinter 组件
-            root.after(0, lambda: progress_var.set(downloaded_size / total_size * 100))
-            root.after(
-                0,
-                lambda: progress_label.config(
-                    text=f"下载进度: {downloaded_size / total_size * 100:.2f}%"
-                ),
-            )
+    import zipfile
+    from downloader import download_file, fetch_checksum, extract_bin, DownloadError
+    from requests import RequestException
 
-    # 使用 root.after 更新完成状态
-    root.after(0, lambda: progress_label.config(text="下载完成，正在解压..."))
+    local_zip_path = os.path.join(DATA_DIR, "ffmpeg.zip")
+    if not os.path.exists(DATA_DIR):
+        os.makedirs(DATA_DIR)
 
-    with zipfile.ZipFile(local_zip_path, "r") as zip_ref:
-        zip_ref.extractall(extract_path)
+    def on_progress(downloaded, total, speed):
+        # 进度已按固定间隔合并，每次只向主线程提交一个更新
+        def update():
+            text = f"已下载 {downloaded / 1048576:.1f} MB"
+            if total:
+                progress_var.set(downloaded / total * 100)
+                text = f"下载进度: {downloaded / total * 100:.2f}%"
+            progress_label.config(text=f"{text} ({speed / 1048576:.1f} MB/s)")
 
-    extracted_dir_name = None
-    with zipfile.ZipFile(local_zip_path, "r") as zip_ref:
-        extracted_dir_name = zip_ref.namelist()[0].split("/")[0]
+        root.after(0, update)
 
-    if extracted_dir_name:
-        os.rename(
-            os.path.join(extract_path, extracted_dir_name),
-            os.path.join(extract_path, "ffmpeg"),
+    try:
+        download_file(
+            FFMPEG_DOWNLOAD_URL,
+            local_zip_path,
+            sha256=fetch_checksum(FFMPEG_DOWNLOAD_URL + ".sha256"),
+            connections=DOWNLOAD_CONNECTIONS,
+            on_progress=on_progress,
         )
+    except (DownloadError, RequestException, OSError) as e:
+        # 已下载的部分保留在 data 目录中，下次启动时继续下载
+        message = f"下载失败: {e}"
+        root.after(0, lambda: progress_label.config(text=message))
+        return
+
+    def on_extract_progress(extracted, total, speed):
+        def update():
+            percent = extracted / total * 100 if total else 100
+            progress_var.set(percent)
+            progress_label.config(
+                text=f"正在解压: {percent:.0f}% ({speed / 1048576:.1f} MB/s)"
+            )
+
+        root.after(0, update)
 
-    os.environ["PATH"] += os.pathsep + os.path.join(extract_path, "ffmpeg", "bin")
+    # 只解压 bin 目录下的可执行文件
+    try:
+        extract_bin(local_zip_path, LOCAL_FFMPEG_DIR, on_extract_progress)
+    except (DownloadError, zipfile.BadZipFile, OSError) as e:
+        message = f"解压失败: {e}"
+        root.after(0, lambda: progress_label.config(text=message))
+        return
     os.remove(local_zip_path)
+    os.environ["PATH"] += os.pathsep + os.path.abspath(LOCAL_FFMPEG_DIR)
 
     # 使用 root.after 关闭窗口
     root.after(0, root.destroy)
@@ -85,6 +165,9 @@ def start_download(progress_var, progress_label, root):
 
 
 def start_ffmpeg_download():
+    import tkinter as tk
+    from tkinter import ttk
+
     root = tk.Tk()
     root.title("FFmpeg 安装器")
     root.geometry("400x150")
@@ -104,93 +187,162 @@ def start_ffmpeg_download():
     root.mainloop()
 
 
-def run_ffmpeg_command_with_progress(
-    command, progress_var, progress_bar, progress_label, root, total_duration=None
+def run_ffmpeg_command(
+    command, on_progress=None, total_duration=None, log=None, on_start=None
 ):
+    """
+    运行 FFmpeg 命令，通过 -progress 管道读取进度，返回进程的返回码。
+
+    :param command: FFmpeg 命令列表
+    :param on_progress: 进度回调，参数为 ProgressEvent
+    :param total_duration: 输出的总时长（"HH:MM:SS.xx"），为空时从 FFmpeg 日志中解析
+    :param log: 用于收集 FFmpeg 日志（stderr）的列表或 deque，可为空
+    :param on_start: 进程启动后的回调，参数为 subprocess.Popen
+    """
+    command = add_progress_args(command)
+
     # 输出执行的命令
     command_with_quotes = [f'"{arg}"' if " " in arg else arg for arg in command]
     print("Executing command:", " ".join(command_with_quotes))
 
+    # stdin 用于取消时发送 "q"
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        **popen_kwargs(),
+    )
+    if on_start:
+        on_start(process)
+    parser = ProgressParser(
+        convert_time_to_seconds(total_duration) if total_duration else None
+    )
+
+    # 日志在单独的线程中读取，避免 stderr 管道写满阻塞 FFmpeg
+    def read_log():
+        for line in process.stderr:
+            if parser.total_seconds is None:
+                parser.total_seconds = parse_duration_line(line)
+            if log is not None:
+                log.append(line.rstrip())
+
+    log_thread = threading.Thread(target=read_log, daemon=True)
+    log_thread.start()
+
+    for line in process.stdout:
+        event = parser.feed(line)
+        if event and on_progress:
+            on_progress(event)
+
+    returncode = process.wait()
+    log_thread.join()
     try:
-        # 重置进度条和进度变量
-        progress_var.set("进度: 0%")
-        progress_bar["value"] = 0
-        progress_bar["maximum"] = 100
-        progress_label.grid()  # 显示进度标签
-        progress_bar.grid()  # 显示进度条
-
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        process.stdin.close()
+    except OSError:
+        pass
+    return returncode
+
+
+def write_concat_list(paths, list_file):
+    # 生成 concat 分离器使用的文件列表
+    with open(list_file, "w", encoding="utf-8") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+def get_muxer_codecs(muxer):
+    """
+    返回 FFmpeg 封装格式默认的 (视频编码, 音频编码)，没有默认编码时对应项为 None，
+    FFmpeg 不支持该格式时返回 None。默认编码取决于 FFmpeg 的编译配置，结果在内存中缓存。
+    """
+    if muxer in _muxer_codecs:
+        return _muxer_codecs[muxer]
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-h", f"muxer={muxer}"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
         )
-        time_pattern = re.compile(r"time=(\d+:\d+:\d+\.\d+)")
-        duration_pattern = re.compile(r"Duration: (\d+:\d+:\d+\.\d+)")
-
-        def update_progress(
-            current_time, total_duration, current_seconds, total_seconds
-        ):
-            progress_var.set(f"进度: {current_time} / {total_duration}")
-            progress_bar["value"] = current_seconds
-            progress_bar["maximum"] = total_seconds
-
-        if total_duration:
-            total_seconds = convert_time_to_seconds(total_duration)
-            root.after(
-                0, update_progress, "00:00:00.00", total_duration, 0, total_seconds
-            )
-        else:
-            total_seconds = None
-
-        while True:
-            output = process.stderr.readline()
-            if output == "" and process.poll() is not None:
-                break
-            if output:
-                # 解析总时长
-                if total_seconds is None:
-                    duration_match = duration_pattern.search(output)
-                    if duration_match:
-                        total_duration = duration_match.group(1)
-                        total_seconds = convert_time_to_seconds(total_duration)
-                        root.after(
-                            0,
-                            update_progress,
-                            "00:00:00.00",
-                            total_duration,
-                            0,
-                            total_seconds,
-                        )
-
-                # 解析进度信息
-                time_match = time_pattern.search(output)
-                if time_match:
-                    current_time = time_match.group(1)
-                    current_seconds = convert_time_to_seconds(current_time)
-                    if total_seconds:
-                        progress_percentage = (current_seconds / total_seconds) * 100
-                        root.after(
-                            0,
-                            update_progress,
-                            current_time,
-                            total_duration,
-                            progress_percentage,
-                            100,
-                        )
-
-        return process.poll()
-    except Exception as e:
-        return f"执行命令时出错: {e}"
-
-
-def show_ffmpeg_info():
-    command = ["ffmpeg", "-version"]
-    result = subprocess.run(
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-    )
-    messagebox.showinfo("FFmpeg信息", result.stdout)
+    except OSError:
+        return None
+
+    codecs = None
+    if result.stdout.lstrip().startswith("Muxer "):
+        defaults = {}
+        for line in result.stdout.splitlines():
+            name, _, value = line.strip().partition(":")
+            if name in ("Default video codec", "Default audio codec"):
+                defaults[name] = value.strip().rstrip(".")
+        codecs = (
+            defaults.get("Default video codec"),
+            defaults.get("Default audio codec"),
+        )
+    _muxer_codecs[muxer] = codecs
+    return codecs
+
+
+def get_ffmpeg_version():
+    info = get_ffmpeg_info()
+    return info["output"] if info else "未找到 FFmpeg"
+
+
+# 旋转选项对应的视频滤镜
+ROTATE_FILTERS = {
+    "顺时针旋转90°": "transpose=1",
+    "逆时针旋转90°": "transpose=2",
+    "旋转180°": "transpose=2,transpose=2",
+    "水平翻转": "hflip",
+    "垂直翻转": "vflip",
+}
+# 分段输出格式选项对应的 FFmpeg 封装格式
+STREAM_FORMATS = {
+    "HLS (m3u8)": "hls",
+    "DASH (mpd)": "dash",
+}
+# 分段输出的默认分段时长（秒）
+DEFAULT_SEGMENT_SECONDS = 6
+# 多分辨率输出时各分辨率的最大码率（kbps），按高度查找，配合 -crf 限制码率峰值
+LADDER_MAXRATES = {
+    480: 1500,
+    600: 2000,
+    720: 3000,
+    768: 3500,
+    1080: 6000,
+    1440: 12000,
+    2160: 24000,
+}
+
+
+def resolve_format(input_file, format):
+    """
+    把导出窗口中的格式选项解析为 (输出文件扩展名, 视频编码器)，编码器未指定时为 None。
+    """
+    # 处理“原格式”选项
+    if format.startswith("原格式"):
+        format = os.path.splitext(input_file)[1][1:]
+
+    # 处理编码器选项
+    codec = None
+    if format == "mp4 (h264)":
+        format = "mp4"
+        codec = "libx264"
+    elif format == "mp4 (h265)":
+        format = "mp4"
+        codec = "libx265"
+    return format, codec
 
 
-def generate_command(
+def build_command(
     input_file,
+    output_file,
     format,
     resolution,
     video_bitrate,
@@ -206,19 +358,7 @@ def generate_command(
 ):
     # 获取输入文件的扩展名
     input_format = os.path.splitext(input_file)[1][1:]
-
-    # 处理“原格式”选项
-    if format.startswith("原格式"):
-        format = input_format
-
-    # 处理编码器选项
-    codec = None
-    if format == "mp4 (h264)":
-        format = "mp4"
-        codec = "libx264"
-    elif format == "mp4 (h265)":
-        format = "mp4"
-        codec = "libx265"
+    format, codec = resolve_format(input_file, format)
 
     # 处理自定义分辨率
     if resolution == "与原视频相同":
@@ -226,52 +366,210 @@ def generate_command(
     elif resolution == "自定义":
         resolution = f"{custom_width}x{custom_height}"
 
-    output_file = filedialog.asksaveasfilename(
-        title="保存文件",
-        defaultextension=f".{format}",
-        filetypes=[(f"{format.upper()} 文件", f"*.{format}"), ("所有文件", "*.*")],
-    )
-    if output_file:
-        command = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            input_file,
-            "-map_metadata",
-            "0" if keep_metadata else "-1",
-        ]
+    command = [
+        "ffmpeg",
+        "-y",
+        "-i",
+        input_file,
+        "-map_metadata",
+        "0" if keep_metadata else "-1",
+    ]
+
+    if keep_metadata and input_format == "mov":
+        command.extend(["-movflags", "use_metadata_tags"])
+
+    if codec:
+        command.extend(["-c:v", codec])
+    if resolution:
+        command.extend(["-s", resolution])
+    if video_bitrate and video_bitrate != "kbps":
+        command.extend(["-b:v", f"{video_bitrate}k"])
+    if audio_bitrate and audio_bitrate != "kbps":
+        command.extend(["-b:a", f"{audio_bitrate}k"])
+    if quality:
+        command.extend(["-crf", str(quality)])
+    if rotate in ROTATE_FILTERS:
+        command.extend(["-vf", ROTATE_FILTERS[rotate]])
+
+    if start_time and end_time:
+        command.extend(["-ss", start_time, "-to", end_time])
+        if quick_trim:
+            command.extend(["-c:v", "copy", "-c:a", "copy"])
+
+    command.append(output_file)
+
+    return command
+
+
+def ladder_output_files(output_file, resolutions):
+    # 每个分辨率的输出文件名为 "名称_高度p.扩展名"
+    stem, extension = os.path.splitext(output_file)
+    return [
+        f"{stem}_{resolution.split('x')[1]}p{extension}" for resolution in resolutions
+    ]
+
+
+def _ladder_filter_graph(resolutions, rotate):
+    # 旋转只做一次，再用 split 分给各个分辨率，输出标签为 [v0]、[v1]...
+    # resolutions 为空时保持原分辨率，只输出 [v0]
+    filters = [ROTATE_FILTERS[rotate]] if rotate in ROTATE_FILTERS else []
+    if len(resolutions) > 1:
+        filters.append(f"split={len(resolutions)}")
+    elif not filters:
+        filters.append("null")
+    filter_graph = "[0:v]" + ",".join(filters)
+    if not resolutions:
+        return filter_graph + "[v0]"
+    filter_graph += "".join(f"[s{i}]" for i in range(len(resolutions)))
+    for i, resolution in enumerate(resolutions):
+        width, height = resolution.split("x")
+        filter_graph += f";[s{i}]scale={width}:{height}[v{i}]"
+    return filter_graph
+
+
+def build_ladder_command(
+    input_file,
+    output_files,
+    format,
+    resolutions,
+    audio_bitrate,
+    quality,
+    rotate,
+    keep_metadata,
+):
+    """
+    生成多分辨率输出的命令：只解码一次，用 split 滤镜把画面分给各分辨率分别缩放和编码。
 
+    :param output_files: 与 resolutions 一一对应的输出文件路径
+    :param resolutions: 分辨率列表，如 ["1280x720", "1920x1080"]
+    """
+    input_format = os.path.splitext(input_file)[1][1:]
+    _, codec = resolve_format(input_file, format)
+
+    command = [
+        "ffmpeg",
+        "-y",
+        "-i",
+        input_file,
+        "-filter_complex",
+        _ladder_filter_graph(resolutions, rotate),
+    ]
+    for i, (resolution, output_file) in enumerate(zip(resolutions, output_files)):
+        # 每个输出的选项放在各自的输出文件之前
+        command.extend(["-map", f"[v{i}]", "-map", "0:a?"])
+        command.extend(["-map_metadata", "0" if keep_metadata else "-1"])
         if keep_metadata and input_format == "mov":
             command.extend(["-movflags", "use_metadata_tags"])
-
         if codec:
             command.extend(["-c:v", codec])
-        if resolution:
-            command.extend(["-s", resolution])
-        if video_bitrate and video_bitrate != "kbps":
-            command.extend(["-b:v", f"{video_bitrate}k"])
-        if audio_bitrate and audio_bitrate != "kbps":
-            command.extend(["-b:a", f"{audio_bitrate}k"])
         if quality:
             command.extend(["-crf", str(quality)])
-        if rotate != "不旋转":
-            if rotate == "顺时针旋转90°":
-                command.extend(["-vf", "transpose=1"])
-            elif rotate == "逆时针旋转90°":
-                command.extend(["-vf", "transpose=2"])
-            elif rotate == "旋转180°":
-                command.extend(["-vf", "transpose=2,transpose=2"])
-            elif rotate == "水平翻转":
-                command.extend(["-vf", "hflip"])
-            elif rotate == "垂直翻转":
-                command.extend(["-vf", "vflip"])
-
-        if start_time and end_time:
-            command.extend(["-ss", start_time, "-to", end_time])
-            if quick_trim:
-                command.extend(["-c:v", "copy", "-c:a", "copy"])
-
+        maxrate = LADDER_MAXRATES.get(int(resolution.split("x")[1]))
+        if maxrate:
+            command.extend(["-maxrate", f"{maxrate}k", "-bufsize", f"{maxrate * 2}k"])
+        if audio_bitrate and audio_bitrate != "kbps":
+            command.extend(["-b:a", f"{audio_bitrate}k"])
         command.append(output_file)
+    return command
+
+
+def stream_output_file(output_dir, format):
+    # 分段输出的播放列表路径，即命令中的输出文件；HLS 的 %v 为各分辨率的编号
+    if STREAM_FORMATS.get(format, format) == "hls":
+        return os.path.join(output_dir, "stream_%v", "index.m3u8")
+    return os.path.join(output_dir, "manifest.mpd")
+
 
-        return command
-    return None
+def build_stream_command(
+    input_file,
+    output_dir,
+    format,
+    resolutions,
+    audio_bitrate,
+    quality,
+    rotate,
+    segment_seconds=DEFAULT_SEGMENT_SECONDS,
+    has_audio=True,
+):
+    """
+    生成 HLS 或 DASH 分段输出的命令，分段在编码过程中直接写入 output_dir。
+
+    多个分辨率共用一次解码，所有分辨率在相同的时间点强制插入关键帧，保证分段对齐，
+    并生成主播放列表（HLS 为 master.m3u8，DASH 为 manifest.mpd）。
+
+    :param format: STREAM_FORMATS 中的选项或 "hls"、"dash"
+    :param resolutions: 分辨率列表，为空时只输出原分辨率
+    :param has_audio: 输入是否有音频
+    """
+    muxer = STREAM_FORMATS.get(format, format)
+    count = max(len(resolutions), 1)
+    command = [
+        "ffmpeg",
+        "-y",
+        "-i",
+        input_file,
+        "-filter_complex",
+        _ladder_filter_graph(resolutions, rotate),
+    ]
+    for i in range(count):
+        command.extend(["-map", f"[v{i}]"])
+        # HLS 的每个分辨率都需要一路音频，DASH 的音频单独成组，只需要一路
+        if has_audio and (muxer == "hls" or i == 0):
+            command.extend(["-map", "0:a:0"])
+
+    command.extend(["-c:v", "libx264", "-sc_threshold", "0"])
+    command.extend(["-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})"])
+    if quality:
+        command.extend(["-crf", str(quality)])
+    for i, resolution in enumerate(resolutions):
+        maxrate = LADDER_MAXRATES.get(int(resolution.split("x")[1]))
+        if maxrate:
+            command.extend([f"-maxrate:v:{i}", f"{maxrate}k"])
+            command.extend([f"-bufsize:v:{i}", f"{maxrate * 2}k"])
+    if has_audio:
+        command.extend(["-c:a", "aac"])
+        if audio_bitrate and audio_bitrate != "kbps":
+            command.extend(["-b:a", f"{audio_bitrate}k"])
+
+    if muxer == "hls":
+        if has_audio:
+            stream_map = " ".join(f"v:{i},a:{i}" for i in range(count))
+        else:
+            stream_map = " ".join(f"v:{i}" for i in range(count))
+        command.extend(
+            [
+                "-f",
+                "hls",
+                "-hls_time",
+                str(segment_seconds),
+                "-hls_playlist_type",
+                "vod",
+                "-hls_segment_filename",
+                os.path.join(output_dir, "stream_%v", "segment_%05d.ts"),
+                "-master_pl_name",
+                "master.m3u8",
+                "-var_stream_map",
+                stream_map,
+                stream_output_file(output_dir, muxer),
+            ]
+        )
+    else:
+        adaptation_sets = "id=0,streams=v"
+        if has_audio:
+            adaptation_sets += " id=1,streams=a"
+        command.extend(
+            [
+                "-f",
+                "dash",
+                "-seg_duration",
+                str(segment_seconds),
+                "-use_template",
+                "1",
+                "-use_timeline",
+                "1",
+                "-adaptation_sets",
+                adaptation_sets,
+                stream_output_file(output_dir, muxer),
+            ]
+        )
+    return command
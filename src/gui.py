@@ -1,7 +1,6 @@
 import os
 import threading
 import tkinter as tk
-import json
 from tkinter import (
     ttk,
     StringVar,
@@ -14,14 +13,42 @@ from tkinter import (
     Toplevel,
     Canvas,
     Menu,
+    PhotoImage,
 )
+from batch import DEFAULT_NAME_PATTERN, build_batch_jobs, expand_inputs
 from file_operations import import_files
 from ffmpeg_utils import (
-    show_ffmpeg_info,
-    run_ffmpeg_command_with_progress,
-    generate_command,
+    get_ffmpeg_version,
+    build_command,
+    build_ladder_command,
+    build_stream_command,
+    ladder_output_files,
+    stream_output_file,
+    resolve_format,
+    STREAM_FORMATS,
+    DEFAULT_SEGMENT_SECONDS,
 )
+from job_queue import (
+    Job,
+    get_job_queue,
+    STATE_NAMES,
+    QUEUED,
+    RUNNING,
+    PAUSED,
+    CANCELLED,
+)
+from presets import (
+    get_preset_store,
+    compile_preset,
+    preset_output_extension,
+    split_command,
+    join_command,
+    PresetTemplate,
+)
+from process_control import GRACEFUL_TIMEOUT
+from thread_budget import estimate_threads
 from utils import (
+    probe,
     get_media_duration,
     get_aspect_ratio,
     convert_time_to_seconds,
@@ -128,6 +155,65 @@ def add_placeholder(entry, placeholder, disable_placeholder=False):
 def set_root(tk_root):
     global root
     root = tk_root
+    root.protocol("WM_DELETE_WINDOW", confirm_exit)
+
+
+def confirm_exit():
+    # 关闭窗口时结束所有 FFmpeg 进程，避免留下孤儿进程
+    job_queue = get_job_queue()
+    counts = job_queue.counts()
+    unfinished = counts[QUEUED] + counts[RUNNING] + counts[PAUSED]
+    if unfinished and not messagebox.askyesno(
+        "退出", f"还有 {unfinished} 个任务未完成，退出将取消这些任务，确定退出吗？"
+    ):
+        return
+    job_queue.shutdown(timeout=GRACEFUL_TIMEOUT)
+    root.destroy()
+
+
+def show_ffmpeg_info():
+    messagebox.showinfo("FFmpeg信息", get_ffmpeg_version())
+
+
+def generate_command(
+    input_file,
+    format,
+    resolution,
+    video_bitrate,
+    audio_bitrate,
+    quality,
+    custom_width,
+    custom_height,
+    rotate,
+    keep_metadata,
+    start_time,
+    end_time,
+    quick_trim,
+    output_file=None,
+):
+    # 让用户指定输出文件名，再生成命令；估算时传入占位的输出文件名，不弹出对话框
+    # 命令由 build_command 生成，最后一个参数为输出文件
+    if not output_file:
+        output_format, _ = resolve_format(input_file, format)
+        output_file = ask_save_file(output_format)
+    if output_file:
+        return build_command(
+            input_file,
+            output_file,
+            format,
+            resolution,
+            video_bitrate,
+            audio_bitrate,
+            quality,
+            custom_width,
+            custom_height,
+            rotate,
+            keep_metadata,
+            start_time,
+            end_time,
+            quick_trim,
+        )
+    return None
 
 
 def clear_layout():
@@ -136,7 +222,7 @@ def clear_layout():
         widget.destroy()
 
     # 清除列和行的配置
-    for i in range(10):  # 假设最多有10行和列
+    for i in range(13):  # 假设最多有13行和列
         root.columnconfigure(i, weight=0)
         root.rowconfigure(i, weight=0)
 
@@ -176,15 +262,30 @@ def show_main_window():
     )
     trim_media_button.grid(row=3, column=0, columnspan=2, pady=10)
 
+    # 组合操作按钮
+    operations_button = ttk.Button(
+        root,
+        text="组合操作",
+        command=lambda: import_files(1, ["媒体"], operations_window),
+        width=20,
+    )
+    operations_button.grid(row=4, column=0, columnspan=2, pady=10)
+
     # 预设按钮
     preset_button = ttk.Button(
         root, text="预设", command=lambda: show_preset_window(), width=20
     )
-    preset_button.grid(row=4, column=0, columnspan=2, pady=10)
+    preset_button.grid(row=5, column=0, columnspan=2, pady=10)
+
+    # 任务队列按钮
+    job_queue_button = ttk.Button(
+        root, text="任务队列", command=lambda: show_job_queue_window(), width=20
+    )
+    job_queue_button.grid(row=6, column=0, columnspan=2, pady=10)
 
     # 版权信息和FFmpeg信息
     footer_frame = ttk.Frame(root)
-    footer_frame.grid(row=5, column=0, columnspan=2, pady=20, sticky="s")
+    footer_frame.grid(row=7, column=0, columnspan=2, pady=20, sticky="s")
 
     footer_label = ttk.Label(
         footer_frame, text="© 2024 视频处理器", font=("SimSun", 10), foreground="gray"
@@ -209,7 +310,7 @@ def show_main_window():
     # 配置列和行的权重，使其在窗口大小改变时自动调整
     for i in range(2):
         root.columnconfigure(i, weight=1)
-    for i in range(6):
+    for i in range(8):
         root.rowconfigure(i, weight=1)
 
 
@@ -244,7 +345,7 @@ def export_video_window(file_paths):
             "mov",
             "flv",
             "webm",
-        ]
+        ] + list(STREAM_FORMATS)
         format_menu = ttk.Combobox(
             root, textvariable=format_var, values=format_options, state="readonly"
         )
@@ -395,18 +496,306 @@ def export_video_window(file_paths):
             row=7, column=1, columnspan=2, padx=5, pady=5, sticky="w"
         )
 
+        # 并行编码复选框
+        parallel_var = BooleanVar()
+        parallel_checkbutton = ttk.Checkbutton(
+            root, text=" 分段并行编码", variable=parallel_var
+        )
+        parallel_checkbutton.grid(row=8, column=1, padx=5, pady=5, sticky="w")
+        CreateToolTip(
+            parallel_checkbutton,
+            text="在关键帧处把视频切分为多段同时编码，再无损拼接，适合多核机器上的长视频",
+        )
+
+        # 断点续传复选框
+        resumable_var = BooleanVar()
+        resumable_checkbutton = ttk.Checkbutton(
+            root, text=" 断点续传", variable=resumable_var
+        )
+        resumable_checkbutton.grid(row=8, column=2, padx=5, pady=5, sticky="w")
+        CreateToolTip(
+            resumable_checkbutton,
+            text="分段编码并记录进度，中断、取消或重启后再次导出相同的文件时从上次完成的片段继续",
+        )
+
+        # 多分辨率输出选项，勾选后一次解码同时输出多个分辨率
+        ladder_vars = []
+        ladder_resolutions = [
+            option
+            for option in resolution_options
+            if option not in ("与原视频相同", "自定义")
+        ]
+        if ladder_resolutions:
+            ladder_label = Label(root, text="多分辨率输出:")
+            ladder_label.grid(row=9, column=0, padx=5, pady=5, sticky="e")
+            CreateToolTip(
+                ladder_label,
+                text="勾选多个分辨率时只解码一次，同时输出所有分辨率，文件名后加上高度，如 _720p",
+            )
+            ladder_frame = Frame(root)
+            ladder_frame.grid(row=9, column=1, columnspan=2, padx=5, pady=5, sticky="w")
+            for option in ladder_resolutions:
+                var = BooleanVar()
+                ttk.Checkbutton(ladder_frame, text=option, variable=var).pack(
+                    side="left", padx=2
+                )
+                ladder_vars.append((option, var))
+
+        # HLS/DASH 分段时长，仅在选择分段输出格式时可用
+        segment_label = Label(root, text="分段时长:")
+        segment_label.grid(row=10, column=0, padx=5, pady=5, sticky="e")
+        CreateToolTip(
+            segment_label,
+            text="HLS/DASH 每个分段的时长（秒），所有分辨率在相同的时间点分段",
+        )
+        segment_var = IntVar(root)
+        segment_var.set(DEFAULT_SEGMENT_SECONDS)
+        segment_spinbox = ttk.Spinbox(
+            root, from_=1, to=60, textvariable=segment_var, width=5, state="disabled"
+        )
+        segment_spinbox.grid(row=10, column=1, padx=5, pady=5, sticky="w")
+
+        # 目标文件大小，填写后按大小两遍编码，忽略视频品质
+        target_size_frame = Frame(root)
+        target_size_frame.grid(row=10, column=2, padx=5, pady=5, sticky="w")
+        target_size_label = Label(target_size_frame, text="目标大小:")
+        target_size_label.pack(side="left")
+        CreateToolTip(
+            target_size_label,
+            text="按输出文件大小计算码率并两遍编码，适合有上传大小限制的场景",
+        )
+        target_size_var = StringVar(root)
+        target_size_entry = ttk.Entry(
+            target_size_frame, textvariable=target_size_var, width=8
+        )
+        target_size_entry.pack(side="left")
+        add_placeholder(target_size_entry, "MB")
+
+        def toggle_segment(*args):
+            if format_var.get() in STREAM_FORMATS:
+                segment_spinbox.config(state="normal")
+            else:
+                segment_spinbox.config(state="disabled")
+
+        format_var.trace("w", toggle_segment)
+
         # 导出和返回按钮
         button_frame = Frame(root)
-        button_frame.grid(row=8, column=0, columnspan=3, pady=10)
+        button_frame.grid(row=11, column=0, columnspan=3, pady=10)
 
         back_button = ttk.Button(button_frame, text="返回", command=show_main_window)
         back_button.grid(row=0, column=0, padx=5)
 
-        export_button = ttk.Button(
-            button_frame,
-            text="导出",
-            command=lambda: start_export_thread(
-                generate_command(
+        def export_video():
+            ladder = [option for option, var in ladder_vars if var.get()]
+            target_size = target_size_var.get().strip()
+            if target_size == "MB":
+                target_size = ""
+            # 选中的编码方式，多分辨率和分段输出只能作为一个普通任务运行，不能与这些方式组合
+            encode_modes = [
+                name
+                for name, selected in (
+                    ("目标大小", target_size),
+                    ("分段并行编码", parallel_var.get()),
+                    ("断点续传", resumable_var.get()),
+                )
+                if selected
+            ]
+            if format_var.get() in STREAM_FORMATS:
+                if encode_modes:
+                    messagebox.showerror(
+                        "错误", f"HLS/DASH 输出时不能使用{'、'.join(encode_modes)}"
+                    )
+                    return
+                # 分段输出写入一个文件夹，勾选的分辨率都会输出
+                output_dir = filedialog.askdirectory(title="选择输出文件夹")
+                if not output_dir:
+                    return
+                info = probe(input_file)
+                try:
+                    segment_seconds = max(1, segment_var.get())
+                except tk.TclError:
+                    segment_seconds = DEFAULT_SEGMENT_SECONDS
+                start_export_job(
+                    build_stream_command(
+                        input_file,
+                        output_dir,
+                        format_var.get(),
+                        ladder,
+                        audio_bitrate_var.get(),
+                        51 - quality_var.get(),
+                        rotate_var.get(),
+                        segment_seconds,
+                        info is None or info.has_audio,
+                    ),
+                    export_button,
+                    progress_bar,
+                    progress_var,
+                    progress_label,
+                    root,
+                    description=output_dir,
+                    outputs=[stream_output_file(output_dir, format_var.get())],
+                )
+                return
+            if ladder:
+                if encode_modes:
+                    messagebox.showerror(
+                        "错误", f"多分辨率输出时不能使用{'、'.join(encode_modes)}"
+                    )
+                    return
+                output_format, _ = resolve_format(input_file, format_var.get())
+                output_file = ask_save_file(output_format)
+                if not output_file:
+                    return
+                output_files = ladder_output_files(output_file, ladder)
+                start_export_job(
+                    build_ladder_command(
+                        input_file,
+                        output_files,
+                        format_var.get(),
+                        ladder,
+                        audio_bitrate_var.get(),
+                        51 - quality_var.get(),
+                        rotate_var.get(),
+                        metadata_var.get(),
+                    ),
+                    export_button,
+                    progress_bar,
+                    progress_var,
+                    progress_label,
+                    root,
+                    description=output_file,
+                    outputs=output_files,
+                )
+                return
+
+            command = generate_command(
+                input_file,
+                format_var.get(),
+                resolution_var.get(),
+                None,
+                audio_bitrate_var.get(),
+                51 - quality_var.get(),
+                custom_width_var.get(),
+                custom_height_var.get(),
+                rotate_var.get(),
+                metadata_var.get(),
+                None,
+                None,
+                False,
+            )
+            if not command:
+                return
+            if target_size:
+                # 延迟导入，仅在使用该功能时加载
+                from two_pass import two_pass_target
+
+                try:
+                    target_mb = float(target_size)
+                except ValueError:
+                    messagebox.showerror("错误", "目标大小必须是数字（MB）")
+                    return
+                if parallel_var.get() or resumable_var.get():
+                    messagebox.showerror(
+                        "错误", "按目标大小编码时不能使用分段并行编码或断点续传"
+                    )
+                    return
+                start_export_job(
+                    None,
+                    export_button,
+                    progress_bar,
+                    progress_var,
+                    progress_label,
+                    root,
+                    target=two_pass_target(command, target_mb),
+                    threads=estimate_threads(command),
+                    description=command[-1],
+                    outputs=[command[-1]],
+                )
+                return
+
+            if resumable_var.get():
+                # 延迟导入，仅在使用该功能时加载
+                from parallel_encode import default_workers
+                from resumable_encode import resumable_target
+
+                parallel = parallel_var.get()
+                start_export_job(
+                    None,
+                    export_button,
+                    progress_bar,
+                    progress_var,
+                    progress_label,
+                    root,
+                    target=resumable_target(
+                        command, default_workers() if parallel else 1
+                    ),
+                    threads=os.cpu_count() if parallel else estimate_threads(command),
+                    description=command[-1],
+                    outputs=[command[-1]],
+                )
+                return
+
+            if parallel_var.get():
+                # 延迟导入，仅在使用该功能时加载
+                from parallel_encode import run_parallel_encode
+
+                start_export_job(
+                    None,
+                    export_button,
+                    progress_bar,
+                    progress_var,
+                    progress_label,
+                    root,
+                    target=lambda job: run_parallel_encode(
+                        command,
+                        on_progress=job.report_progress,
+                        log=job.log,
+                        threads=job.threads,
+                        on_start=job.process_started,
+                    ),
+                    threads=os.cpu_count(),
+                    description=command[-1],
+                    outputs=[command[-1]],
+                )
+                return
+
+            start_export_job(
+                command,
+                export_button,
+                progress_bar,
+                progress_var,
+                progress_label,
+                root,
+                outputs=[command[-1]],
+            )
+
+        export_button = ttk.Button(button_frame, text="导出", command=export_video)
+        export_button.grid(row=0, column=1, padx=5)
+
+        def estimate_video():
+            # 输出文件只用于确定封装格式，样本编码写入临时文件夹
+            output_format, _ = resolve_format(input_file, format_var.get())
+            placeholder = f"estimate.{output_format}"
+            ladder = [option for option, var in ladder_vars if var.get()]
+            if format_var.get() in STREAM_FORMATS:
+                estimate_var.set("无法估算: 不支持 HLS/DASH 分段输出")
+                return
+            outputs = [placeholder]
+            if ladder:
+                outputs = ladder_output_files(placeholder, ladder)
+                command = build_ladder_command(
+                    input_file,
+                    outputs,
+                    format_var.get(),
+                    ladder,
+                    audio_bitrate_var.get(),
+                    51 - quality_var.get(),
+                    rotate_var.get(),
+                    metadata_var.get(),
+                )
+            else:
+                command = generate_command(
                     input_file,
                     format_var.get(),
                     resolution_var.get(),
@@ -420,33 +809,37 @@ def export_video_window(file_paths):
                     None,
                     None,
                     False,
-                ),
-                export_button,
-                back_button,
-                progress_bar,
-                progress_var,
-                progress_label,
-                root,
-            ),
+                    output_file=placeholder,
+                )
+            start_estimate(command, outputs, estimate_var, estimate_button)
+
+        estimate_button = ttk.Button(button_frame, text="估算", command=estimate_video)
+        estimate_button.grid(row=0, column=2, padx=5)
+        CreateToolTip(
+            estimate_button,
+            text="编码几个短样本，估算导出耗时和输出大小，相同的文件和设置只估算一次",
+        )
+        estimate_var = StringVar()
+        Label(button_frame, textvariable=estimate_var).grid(
+            row=1, column=0, columnspan=3
         )
-        export_button.grid(row=0, column=1, padx=5)
 
         # 进度条
         progress_var = StringVar()
         progress_var.set("进度: 0%")
         progress_label = Label(root, textvariable=progress_var)
-        progress_label.grid(row=8, column=0, columnspan=3, pady=5, sticky="ew")
+        progress_label.grid(row=11, column=0, columnspan=3, pady=5, sticky="ew")
         progress_label.grid_remove()  # 初始隐藏进度标签
         progress_bar = ttk.Progressbar(
             root, orient="horizontal", length=200, mode="determinate"
         )
-        progress_bar.grid(row=9, column=0, columnspan=3, pady=5, sticky="ew")
+        progress_bar.grid(row=12, column=0, columnspan=3, pady=5, sticky="ew")
         progress_bar.grid_remove()  # 初始隐藏进度条
 
         # 配置列和行的权重，使其在窗口大小改变时自动调整
         for i in range(3):
             root.columnconfigure(i, weight=1)
-        for i in range(9):
+        for i in range(13):
             root.rowconfigure(i, weight=1)
 
 
@@ -514,35 +907,66 @@ def export_audio_window(file_paths):
         back_button = ttk.Button(button_frame, text="返回", command=show_main_window)
         back_button.grid(row=0, column=0, padx=5)
 
-        export_button = ttk.Button(
-            button_frame,
-            text="导出",
-            command=lambda: start_export_thread(
-                generate_command(
-                    input_file,
-                    format_var.get(),
-                    None,
-                    None,
-                    audio_bitrate_var.get(),
-                    None,
-                    None,
-                    None,
-                    None,
-                    metadata_var.get(),
-                    None,
-                    None,
-                    None,
-                ),
+        def export_audio():
+            command = generate_command(
+                input_file,
+                format_var.get(),
+                None,
+                None,
+                audio_bitrate_var.get(),
+                None,
+                None,
+                None,
+                None,
+                metadata_var.get(),
+                None,
+                None,
+                None,
+            )
+            if not command:
+                return
+            start_export_job(
+                command,
                 export_button,
-                back_button,
                 progress_bar,
                 progress_var,
                 progress_label,
                 root,
-            ),
-        )
+                outputs=[command[-1]],
+            )
+
+        export_button = ttk.Button(button_frame, text="导出", command=export_audio)
         export_button.grid(row=0, column=1, padx=5)
 
+        def estimate_audio():
+            # 输出文件只用于确定封装格式，样本编码写入临时文件夹
+            output_format, _ = resolve_format(input_file, format_var.get())
+            placeholder = f"estimate.{output_format}"
+            command = generate_command(
+                input_file,
+                format_var.get(),
+                None,
+                None,
+                audio_bitrate_var.get(),
+                None,
+                None,
+                None,
+                None,
+                metadata_var.get(),
+                None,
+                None,
+                None,
+                output_file=placeholder,
+            )
+            start_estimate(command, [placeholder], estimate_var, estimate_button)
+
+        estimate_var = StringVar()
+        estimate_button = ttk.Button(button_frame, text="估算", command=estimate_audio)
+        estimate_button.grid(row=0, column=2, padx=5)
+        ttk.Label(button_frame, textvariable=estimate_var).grid(
+            row=1, column=0, columnspan=3
+        )
+
         # 进度条
         progress_var = StringVar()
         progress_var.set("进度: 0%")
@@ -555,14 +979,69 @@ def export_audio_window(file_paths):
         progress_bar.grid(row=5, column=0, columnspan=3, pady=5, sticky="ew")
         progress_bar.grid_remove()  # 初始隐藏进度条
 
+        # 波形概览
+        waveform_canvas = create_waveform_canvas(root, input_file, margin=10)
+        if waveform_canvas is not None:
+            waveform_canvas.grid(row=6, column=0, columnspan=3, pady=5, sticky="ew")
+
         # 配置列和行的权重，使其在窗口大小改变时自动调整
         for i in range(3):
             root.columnconfigure(i, weight=1)
-        for i in range(6):
+        for i in range(7):
             root.rowconfigure(i, weight=1)
 
 
+def create_waveform_canvas(parent, input_file, height=60, margin=50):
+    """
+    创建显示音频波形概览的画布，波形在后台线程中计算，完成后绘制。
+
+    numpy 不可用时返回 None。
+
+    :param margin: 波形左右两侧留出的宽度（像素），与裁剪滑动条对齐
+    """
+    try:
+        from waveform import waveform_peaks, waveform_polygon
+    except ImportError:
+        return None
+
+    canvas = Canvas(parent, height=height)
+    peaks = None
+
+    def draw(event=None):
+        # 窗口可能已被关闭
+        if peaks is None or not canvas.winfo_exists():
+            return
+        canvas.delete("waveform")
+        coords = waveform_polygon(
+            peaks, margin, height / 2, canvas.winfo_width() - 2 * margin, height
+        )
+        if coords:
+            canvas.create_polygon(coords, fill="#4a7bd0", outline="", tags="waveform")
+
+    def set_peaks(result):
+        nonlocal peaks
+        peaks = result
+        draw()
+
+    def load():
+        try:
+            result = waveform_peaks(input_file)
+        except (OSError, ValueError):
+            return
+        if result is not None:
+            root.after(0, set_peaks, result)
+
+    canvas.bind("<Configure>", draw)
+    threading.Thread(target=load, daemon=True).start()
+    return canvas
+
+
 def trim_media_window(file_paths):
+    # 延迟导入，仅在使用裁剪功能时加载
+    from smart_cut import can_smart_cut, run_smart_cut
+    from thumbnails import generate_filmstrip, FILMSTRIP_TILES, THUMBNAIL_HEIGHT
+    from preview import FramePreview, PREVIEW_DELAY_MS
+
     # 清理之前的布局配置
     clear_layout()
 
@@ -604,6 +1083,20 @@ def trim_media_window(file_paths):
             end_pos - 5, 15, end_pos + 5, 35, fill="red"
         )
 
+        # 预览滑杆位置的帧，拖动停顿后才解码，避免每次移动都启动 FFmpeg
+        frame_preview = None
+        preview_after_id = None
+
+        def schedule_preview(seconds):
+            nonlocal preview_after_id
+            if frame_preview is None:
+                return
+            if preview_after_id is not None:
+                root.after_cancel(preview_after_id)
+            preview_after_id = root.after(
+                PREVIEW_DELAY_MS, frame_preview.request, seconds
+            )
+
         def move_slider(event):
             nonlocal start_pos, end_pos
             x = event.x
@@ -611,20 +1104,15 @@ def trim_media_window(file_paths):
             if abs(x - start_pos) < abs(x - end_pos):
                 start_pos = max(50, min(x, canvas.winfo_width() - 50))
                 canvas.coords(start_slider, start_pos - 5, 15, start_pos + 5, 35)
-                start_time_var.set(
-                    convert_seconds_to_time(
-                        (start_pos - 50) / total_length * total_seconds
-                    )
-                )
+                seconds = (start_pos - 50) / total_length * total_seconds
+                start_time_var.set(convert_seconds_to_time(seconds))
             else:
                 end_pos = min(canvas.winfo_width() - 50, max(x, 50))
                 canvas.coords(end_slider, end_pos - 5, 15, end_pos + 5, 35)
-                end_time_var.set(
-                    convert_seconds_to_time(
-                        (end_pos - 50) / total_length * total_seconds
-                    )
-                )
+                seconds = (end_pos - 50) / total_length * total_seconds
+                end_time_var.set(convert_seconds_to_time(seconds))
             canvas.coords(line, 50, 25, canvas.winfo_width() - 50, 25)
+            schedule_preview(seconds)
 
         canvas.bind("<B1-Motion>", move_slider)
 
@@ -637,6 +1125,67 @@ def trim_media_window(file_paths):
 
         canvas.bind("<Configure>", resize)
 
+        # 滑动条上方的胶片条，缩略图在后台线程中生成，逐张显示
+        info = probe(input_file)
+        if info is not None and info.has_video and total_seconds:
+            filmstrip = Canvas(scale_frame, height=THUMBNAIL_HEIGHT)
+            filmstrip.pack(fill="x", expand=True, before=canvas)
+            tiles = {}  # 序号 -> (画布项, PhotoImage)，保留引用防止图像被回收
+
+            def tile_x(i):
+                return 50 + i / FILMSTRIP_TILES * (filmstrip.winfo_width() - 100)
+
+            def draw_tile(i, data):
+                # 窗口可能已被关闭
+                if not filmstrip.winfo_exists():
+                    return
+                image = PhotoImage(data=data, format="PPM")
+                item = filmstrip.create_image(tile_x(i), 0, image=image, anchor="nw")
+                tiles[i] = (item, image)
+
+            def place_tiles(event):
+                for i, (item, image) in tiles.items():
+                    filmstrip.coords(item, tile_x(i), 0)
+
+            filmstrip.bind("<Configure>", place_tiles)
+            filmstrip.bind("<B1-Motion>", move_slider)
+
+            # 预览图显示在胶片条上方
+            preview_label = Label(scale_frame)
+            preview_label.pack(before=filmstrip)
+
+            def show_frame(seconds, data):
+                if not preview_label.winfo_exists():
+                    return
+                image = PhotoImage(data=data, format="PPM")
+                preview_label.config(image=image)
+                preview_label.image = image  # 保留引用防止图像被回收
+
+            frame_preview = FramePreview(
+                input_file,
+                lambda seconds, data: root.after(0, show_frame, seconds, data),
+            )
+            frame_preview.request(0)
+
+            # 离开裁剪窗口时停止生成
+            cancel_filmstrip = threading.Event()
+            filmstrip.bind("<Destroy>", lambda event: cancel_filmstrip.set())
+            threading.Thread(
+                target=generate_filmstrip,
+                args=(input_file, total_seconds),
+                kwargs={
+                    "on_tile": lambda i, data: root.after(0, draw_tile, i, data),
+                    "cancel": cancel_filmstrip,
+                },
+                daemon=True,
+            ).start()
+        elif info is not None and info.has_audio:
+            # 音频文件在滑动条上方显示波形
+            waveform_canvas = create_waveform_canvas(scale_frame, input_file)
+            if waveform_canvas is not None:
+                waveform_canvas.pack(fill="x", expand=True, before=canvas)
+                waveform_canvas.bind("<B1-Motion>", move_slider)
+
         # 显示开始时间和结束时间
         time_frame = ttk.Frame(root)
         time_frame.grid(row=2, column=0, columnspan=3, pady=10, sticky="ew")
@@ -646,19 +1195,41 @@ def trim_media_window(file_paths):
         end_time_label = ttk.Label(time_frame, textvariable=end_time_var)
         end_time_label.pack(side="right", padx=10)
 
-        # 快速裁剪复选框
-        quick_trim_var = BooleanVar()
-        quick_trim_checkbox = ttk.Checkbutton(
-            root,
+        # 裁剪方式选项
+        trim_mode_var = StringVar(root)
+        trim_mode_var.set("accurate")
+        trim_mode_frame = ttk.Frame(root)
+        trim_mode_frame.grid(row=3, column=0, columnspan=3, pady=5)
+
+        accurate_trim_radio = ttk.Radiobutton(
+            trim_mode_frame, text="精确裁剪", value="accurate", variable=trim_mode_var
+        )
+        accurate_trim_radio.pack(side="left", padx=5)
+        CreateToolTip(accurate_trim_radio, text="重新编码整个片段，帧准确但速度较慢")
+
+        quick_trim_radio = ttk.Radiobutton(
+            trim_mode_frame,
             text="快速裁剪（可能导致开头和结尾的帧不准确）",
-            variable=quick_trim_var,
+            value="quick",
+            variable=trim_mode_var,
         )
-        quick_trim_checkbox.grid(row=3, column=0, columnspan=3, pady=5)
+        quick_trim_radio.pack(side="left", padx=5)
         CreateToolTip(
-            quick_trim_checkbox,
+            quick_trim_radio,
             text="勾选后，视频将不重新编码，裁剪速度更快，但关键帧可能不准确",
         )
 
+        smart_trim_radio = ttk.Radiobutton(
+            trim_mode_frame, text="智能裁剪", value="smart", variable=trim_mode_var
+        )
+        smart_trim_radio.pack(side="left", padx=5)
+        CreateToolTip(
+            smart_trim_radio,
+            text="只重新编码开头和结尾不完整的关键帧间隔，中间部分直接复制，帧准确且速度快",
+        )
+        if not can_smart_cut(info):
+            smart_trim_radio.config(state="disabled")
+
         # 导出和返回按钮
         button_frame = ttk.Frame(root)
         button_frame.grid(row=4, column=0, columnspan=3, pady=10)
@@ -666,37 +1237,68 @@ def trim_media_window(file_paths):
         back_button = ttk.Button(button_frame, text="返回", command=show_main_window)
         back_button.grid(row=0, column=0, padx=5)
 
-        export_button = ttk.Button(
-            button_frame,
-            text="导出",
-            command=lambda: start_export_thread(
-                generate_command(
-                    input_file,
-                    "原格式",
-                    None,
-                    None,
+        def export_trim():
+            start_time = start_time_var.get()
+            end_time = end_time_var.get()
+            start_seconds = convert_time_to_seconds(start_time)
+            end_seconds = convert_time_to_seconds(end_time)
+            trim_duration = convert_seconds_to_time(end_seconds - start_seconds)
+
+            if trim_mode_var.get() == "smart":
+                output_file = ask_save_file(os.path.splitext(input_file)[1][1:])
+                if not output_file:
+                    return
+                start_export_job(
                     None,
-                    None,
-                    None,
-                    None,
-                    None,
-                    True,
-                    start_time_var.get(),
-                    end_time_var.get(),
-                    quick_trim_var.get(),
-                ),
+                    export_button,
+                    progress_bar,
+                    progress_var,
+                    progress_label,
+                    root,
+                    trim_duration,
+                    target=lambda job: run_smart_cut(
+                        input_file,
+                        output_file,
+                        start_seconds,
+                        end_seconds,
+                        job.report_progress,
+                        job.log,
+                        job.process_started,
+                    ),
+                    description=output_file,
+                    outputs=[output_file],
+                )
+                return
+
+            command = generate_command(
+                input_file,
+                "原格式",
+                None,
+                None,
+                None,
+                None,
+                None,
+                None,
+                None,
+                True,
+                start_time,
+                end_time,
+                trim_mode_var.get() == "quick",
+            )
+            if not command:
+                return
+            start_export_job(
+                command,
                 export_button,
-                back_button,
                 progress_bar,
                 progress_var,
                 progress_label,
                 root,
-                convert_seconds_to_time(
-                    convert_time_to_seconds(end_time_var.get())
-                    - convert_time_to_seconds(start_time_var.get())
-                ),
-            ),
-        )
+                trim_duration,
+                outputs=[command[-1]],
+            )
+
+        export_button = ttk.Button(button_frame, text="导出", command=export_trim)
         export_button.grid(row=0, column=1, padx=5)
 
         # 进度条
@@ -718,163 +1320,303 @@ def trim_media_window(file_paths):
             root.rowconfigure(i, weight=1)
 
 
-def show_preset_window():
-    # 确保 data 目录存在
-    data_dir = "data"
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
+def operations_window(file_paths):
+    # 延迟导入，仅在使用组合操作时加载
+    from operations import (
+        compile_operations,
+        fuse_trims,
+        parse_operation,
+        ROTATE_NAMES,
+    )
+
+    # 操作类型: (parse_operation 中的名称, 参数提示, 可选参数 {显示名称: 参数})
+    operation_kinds = {
+        "裁剪": ("trim", "开始-结束，如 00:00:10-00:01:00，相对于上一步", None),
+        "缩放": ("scale", "宽x高，如 1280x720，-2 表示按比例", None),
+        "旋转/翻转": (
+            "rotate",
+            "",
+            {name: mode for mode, name in ROTATE_NAMES.items()},
+        ),
+        "编码器": (
+            "codec",
+            "",
+            {"h264": "libx264", "h265": "libx265", "不重新编码": "copy"},
+        ),
+        "视频码率": ("vbitrate", "kbps", None),
+        "音频码率": ("abitrate", "kbps", None),
+        "品质": ("crf", "0-51，值越小质量越高", None),
+        "元数据": ("metadata", "", {"保留": "keep", "去除": "strip"}),
+    }
+
+    # 清理之前的布局配置
+    clear_layout()
+
+    # 处理每个文件路径
+    for input_file in file_paths:
+        input_format = os.path.splitext(input_file)[1][1:]
+        operations = []
+
+        # 标题
+        title_label = Label(root, text="组合操作", font=("SimSun", 16, "bold"))
+        title_label.grid(row=0, column=0, columnspan=3, pady=10, sticky="ew")
+
+        # 操作列表，按顺序应用
+        operation_list = tk.Listbox(root, height=8)
+        operation_list.grid(
+            row=1, column=0, columnspan=3, padx=10, pady=5, sticky="nsew"
+        )
+
+        # 添加操作
+        add_frame = ttk.Frame(root)
+        add_frame.grid(row=2, column=0, columnspan=3, padx=10, pady=5)
+        kind_var = StringVar(root)
+        kind_var.set("裁剪")
+        kind_menu = ttk.Combobox(
+            add_frame,
+            textvariable=kind_var,
+            values=list(operation_kinds),
+            state="readonly",
+            width=10,
+        )
+        kind_menu.grid(row=0, column=0, padx=5)
+        value_var = StringVar(root)
+        value_menu = ttk.Combobox(add_frame, textvariable=value_var, width=20)
+        value_menu.grid(row=0, column=1, padx=5)
+        hint_var = StringVar(root)
+        hint_label = Label(add_frame, textvariable=hint_var, foreground="gray")
+        hint_label.grid(row=1, column=0, columnspan=3, sticky="w")
+
+        def update_kind(event=None):
+            # 有可选参数的操作使用下拉选择，其他操作手动输入
+            _, hint, choices = operation_kinds[kind_var.get()]
+            hint_var.set(hint)
+            if choices:
+                value_menu.config(values=list(choices), state="readonly")
+                value_var.set(next(iter(choices)))
+            else:
+                value_menu.config(values=[], state="normal")
+                value_var.set("")
+
+        kind_menu.bind("<<ComboboxSelected>>", update_kind)
+        update_kind()
+
+        # 合并后的 FFmpeg 命令
+        command_var = StringVar(root)
+        command_label = Label(
+            root, textvariable=command_var, wraplength=450, justify="left"
+        )
+        command_label.grid(row=4, column=0, columnspan=3, padx=10, pady=5, sticky="ew")
+
+        def refresh(selection=None):
+            operation_list.delete(0, "end")
+            for i, operation in enumerate(operations, 1):
+                operation_list.insert("end", f"{i}. {operation.describe()}")
+            if selection is not None:
+                operation_list.selection_set(selection)
+            try:
+                command = compile_operations(
+                    input_file, f"输出.{input_format}", operations
+                )
+                command_var.set(join_command(command))
+            except ValueError as e:
+                command_var.set(f"无法合并: {e}")
+
+        def add_operation():
+            name, _, choices = operation_kinds[kind_var.get()]
+            value = value_var.get()
+            if choices:
+                value = choices[value]
+            try:
+                operations.append(parse_operation(f"{name}={value}"))
+            except ValueError as e:
+                messagebox.showerror("错误", str(e))
+                return
+            refresh()
+
+        add_button = ttk.Button(add_frame, text="添加", command=add_operation)
+        add_button.grid(row=0, column=2, padx=5)
+
+        def move_operation(direction):
+            selection = operation_list.curselection()
+            if not selection:
+                return
+            index = selection[0]
+            new_index = index + direction
+            if 0 <= new_index < len(operations):
+                operations.insert(new_index, operations.pop(index))
+                refresh(new_index)
+
+        def delete_operation():
+            selection = operation_list.curselection()
+            if selection:
+                del operations[selection[0]]
+                refresh()
+
+        edit_frame = ttk.Frame(root)
+        edit_frame.grid(row=3, column=0, columnspan=3, pady=5)
+        ttk.Button(edit_frame, text="上移", command=lambda: move_operation(-1)).grid(
+            row=0, column=0, padx=5
+        )
+        ttk.Button(edit_frame, text="下移", command=lambda: move_operation(1)).grid(
+            row=0, column=1, padx=5
+        )
+        ttk.Button(edit_frame, text="删除", command=delete_operation).grid(
+            row=0, column=2, padx=5
+        )
+
+        def export():
+            try:
+                compile_operations(input_file, "", operations)
+                info = probe(input_file)
+                start, end = fuse_trims(operations, info.duration if info else None)
+            except ValueError as e:
+                messagebox.showerror("错误", str(e))
+                return
+            output_file = ask_save_file(input_format)
+            if not output_file:
+                return
+            start_export_job(
+                compile_operations(input_file, output_file, operations),
+                export_button,
+                progress_bar,
+                progress_var,
+                progress_label,
+                root,
+                total_duration=(
+                    None if end is None else convert_seconds_to_time(end - start)
+                ),
+                description=output_file,
+                outputs=[output_file],
+            )
 
-    # 确保 presets.json 文件存在
-    preset_file = os.path.join(data_dir, "presets.json")
-    if not os.path.exists(preset_file):
-        with open(preset_file, "w", encoding="utf-8") as f:
-            json.dump([], f)
+        # 导出和返回按钮
+        button_frame = ttk.Frame(root)
+        button_frame.grid(row=5, column=0, columnspan=3, pady=10)
 
-    # 读取预设文件
-    with open(preset_file, "r", encoding="utf-8") as f:
-        presets = json.load(f)
+        back_button = ttk.Button(button_frame, text="返回", command=show_main_window)
+        back_button.grid(row=0, column=0, padx=5)
 
-    # 按照 key 排序预设
-    presets.sort(key=lambda x: x["key"])
+        export_button = ttk.Button(button_frame, text="导出", command=export)
+        export_button.grid(row=0, column=1, padx=5)
+
+        # 进度条
+        progress_var = StringVar()
+        progress_var.set("进度: 0%")
+        progress_label = Label(root, textvariable=progress_var)
+        progress_label.grid(row=5, column=0, columnspan=3, pady=5, sticky="ew")
+        progress_label.grid_remove()  # 初始隐藏进度标签
+        progress_bar = ttk.Progressbar(
+            root, orient="horizontal", length=200, mode="determinate"
+        )
+        progress_bar.grid(row=6, column=0, columnspan=3, pady=5, sticky="ew")
+        progress_bar.grid_remove()  # 初始隐藏进度条
+
+        refresh()
+
+        # 配置列和行的权重，使其在窗口大小改变时自动调整
+        for i in range(3):
+            root.columnconfigure(i, weight=1)
+        for i in range(7):
+            root.rowconfigure(i, weight=1)
+
+
+def show_preset_window():
+    store = get_preset_store()
 
     # 创建预设管理窗口
     preset_window = Toplevel(root)
     preset_window.title("预设管理")
 
-    # 显示预设的表格
-    columns = ("命令", "描述", "输出格式")
-    tree = ttk.Treeview(preset_window, columns=columns, show="headings")
-    for col in columns:
-        tree.heading(col, text=col)
-    for preset in presets:
-        command_str = " ".join(preset["command"])  # 将命令列表转换为字符串
+    def tree_values(preset):
+        command_str = join_command(preset["command"])  # 将命令列表转换为字符串
         output_type_display = (
             "与导入格式相同"
             if preset["output_type"] == "keep"
             else preset["output_type"]
         )
-        tree.insert(
-            "",
-            "end",
-            iid=preset["key"],
-            values=(command_str, preset["description"], output_type_display),
-        )
-    tree.grid(row=0, column=0, columnspan=4, padx=10, pady=10)
+        return (command_str, preset["description"], output_type_display)
+
+    # 显示预设的表格
+    columns = ("命令", "描述", "输出格式")
+    tree = ttk.Treeview(preset_window, columns=columns, show="headings")
+    for col in columns:
+        tree.heading(col, text=col)
+    for preset in store:
+        tree.insert("", "end", iid=preset["key"], values=tree_values(preset))
+    tree.grid(row=0, column=0, columnspan=5, padx=10, pady=10)
 
     # 添加、修改、删除按钮
     add_button = ttk.Button(
         preset_window,
         text="添加",
-        command=lambda: add_preset(preset_window, tree, presets, preset_file),
+        command=lambda: add_preset(preset_window, tree),
     )
     add_button.grid(row=1, column=0, padx=5, pady=5)
     edit_button = ttk.Button(
         preset_window,
         text="修改",
-        command=lambda: edit_preset(preset_window, tree, presets, preset_file),
+        command=lambda: edit_preset(preset_window, tree),
     )
     edit_button.grid(row=1, column=1, padx=5, pady=5)
     delete_button = ttk.Button(
         preset_window,
         text="删除",
-        command=lambda: delete_preset(tree, presets, preset_file),
+        command=lambda: delete_preset(tree),
     )
     delete_button.grid(row=1, column=2, padx=5, pady=5)
     run_button = ttk.Button(
         preset_window, text="运行", command=lambda: run_preset(tree)
     )
     run_button.grid(row=1, column=3, padx=5, pady=5)
+    batch_button = ttk.Button(
+        preset_window, text="批量运行", command=lambda: batch_preset(tree)
+    )
+    batch_button.grid(row=1, column=4, padx=5, pady=5)
+    CreateToolTip(batch_button, text="对文件夹或通配符匹配的所有文件运行所选预设")
 
     # 创建右键菜单
     def show_context_menu(event):
         context_menu.post(event.x_root, event.y_root)
 
     context_menu = Menu(preset_window, tearoff=0)
-    context_menu.add_command(
-        label="上移", command=lambda: move_preset(tree, presets, preset_file, -1)
-    )
-    context_menu.add_command(
-        label="下移", command=lambda: move_preset(tree, presets, preset_file, 1)
-    )
+    context_menu.add_command(label="上移", command=lambda: move_preset(tree, -1))
+    context_menu.add_command(label="下移", command=lambda: move_preset(tree, 1))
 
     tree.bind("<Button-3>", show_context_menu)
 
-    def move_preset(tree, presets, preset_file, direction):
+    def move_preset(tree, direction):
         selected_item = tree.selection()
         if not selected_item:
             messagebox.showwarning("警告", "请选择一个预设进行移动")
             return
 
         selected_item = selected_item[0]
-        index = next(
-            (
-                i
-                for i, preset in enumerate(presets)
-                if preset["key"] == int(selected_item)
-            ),
-            None,
-        )
-        if index is None:
-            return
-
-        new_index = index + direction
-        if new_index < 0 or new_index >= len(presets):
-            return
+        new_index = store.move(int(selected_item), direction)
+        if new_index is not None:
+            # 只移动对应的行，不重新加载整个表格
+            tree.move(selected_item, "", new_index)
 
-        # 交换预设位置
-        presets[index], presets[new_index] = presets[new_index], presets[index]
-
-        # 更新 key 值以反映新的顺序
-        for i, preset in enumerate(presets):
-            preset["key"] = i + 1
-
-        # 重新保存 JSON 文件
-        with open(preset_file, "w", encoding="utf-8") as f:
-            json.dump(presets, f, ensure_ascii=False, indent=4)
-
-        # 重新加载 Treeview
-        tree.delete(*tree.get_children())
-        for preset in presets:
-            command_str = " ".join(preset["command"])  # 将命令列表转换为字符串
-            output_type_display = (
-                "与导入格式相同"
-                if preset["output_type"] == "keep"
-                else preset["output_type"]
-            )
-            tree.insert(
-                "",
-                "end",
-                iid=preset["key"],
-                values=(command_str, preset["description"], output_type_display),
-            )
-
-    def add_preset(preset_window, tree, presets, preset_file):
+    def add_preset(preset_window, tree):
         def save_preset():
             updated_output_type = output_type_var.get()
             if updated_output_type == "与导入格式相同":
                 updated_output_type = "keep"
 
-            new_preset = {
-                "key": max(preset["key"] for preset in presets) + 1 if presets else 1,
-                "command": command_var.get().split(),  # 将命令字符串转换为列表
-                "description": description_var.get(),
-                "output_type": updated_output_type,
-            }
-            presets.append(new_preset)
-            with open(preset_file, "w", encoding="utf-8") as f:
-                json.dump(presets, f, ensure_ascii=False, indent=4)
-
-            command_str = " ".join(new_preset["command"])  # 将命令列表转换为字符串
-            output_type_display = (
-                "与导入格式相同"
-                if new_preset["output_type"] == "keep"
-                else new_preset["output_type"]
+            command = split_command(command_var.get())  # 将命令字符串转换为列表
+            try:
+                PresetTemplate(command).validate()
+            except ValueError as e:
+                messagebox.showerror("错误", str(e), parent=add_window)
+                return
+
+            new_preset = store.add(
+                command,
+                description_var.get(),
+                updated_output_type,
             )
             tree.insert(
-                "",
-                "end",
-                iid=new_preset["key"],
-                values=(command_str, new_preset["description"], output_type_display),
+                "", "end", iid=new_preset["key"], values=tree_values(new_preset)
             )
             add_window.destroy()
 
@@ -901,7 +1643,7 @@ def show_preset_window():
         save_button = ttk.Button(add_window, text="保存", command=save_preset)
         save_button.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
 
-    def edit_preset(preset_window, tree, presets, preset_file):
+    def edit_preset(preset_window, tree):
         selected_item = tree.selection()
         if not selected_item:
             messagebox.showwarning("警告", "请选择一个预设进行修改")
@@ -915,42 +1657,28 @@ def show_preset_window():
             if updated_output_type == "与导入格式相同":
                 updated_output_type = "keep"
 
-            updated_preset = {
-                "key": int(selected_item),
-                "command": command_var.get().split(),  # 将命令字符串转换为列表
-                "description": description_var.get(),
-                "output_type": updated_output_type,
-            }
-            for i, preset in enumerate(presets):
-                if preset["key"] == int(selected_item):
-                    presets[i] = updated_preset
-                    break
-            with open(preset_file, "w", encoding="utf-8") as f:
-                json.dump(presets, f, ensure_ascii=False, indent=4)
+            command = split_command(command_var.get())  # 将命令字符串转换为列表
+            try:
+                PresetTemplate(command).validate()
+            except ValueError as e:
+                messagebox.showerror("错误", str(e), parent=edit_window)
+                return
+
+            updated_preset = store.update(
+                int(selected_item),
+                command,
+                description_var.get(),
+                updated_output_type,
+            )
 
             # 更新 Treeview 中的项，而不是删除旧项并插入新项
-            command_str = " ".join(updated_preset["command"])  # 将命令列表转换为字符串
-            output_type_display = (
-                "与导入格式相同"
-                if updated_preset["output_type"] == "keep"
-                else updated_preset["output_type"]
-            )
-            tree.item(
-                selected_item,
-                values=(
-                    command_str,
-                    updated_preset["description"],
-                    output_type_display,
-                ),
-            )
+            tree.item(selected_item, values=tree_values(updated_preset))
             edit_window.destroy()
 
         edit_window = Toplevel(preset_window)
         edit_window.title("修改预设")
 
-        command_var = StringVar(
-            value=" ".join(selected_preset[0].split())
-        )  # 将命令字符串转换为列表再转换为字符串
+        command_var = StringVar(value=selected_preset[0])
         description_var = StringVar(value=selected_preset[1])
         output_type_display = (
             "与导入格式相同" if selected_preset[2] == "keep" else selected_preset[2]
@@ -973,75 +1701,33 @@ def show_preset_window():
         save_button = ttk.Button(edit_window, text="保存", command=save_preset)
         save_button.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
 
-    def delete_preset(tree, presets, preset_file):
+    def delete_preset(tree):
         selected_item = tree.selection()
         if not selected_item:
             messagebox.showwarning("警告", "请选择一个预设进行删除")
             return
 
         selected_item = selected_item[0]
-        selected_key = int(selected_item)
-
-        # 在 presets 列表中查找具有相同 key 的项并删除
-        for i, preset in enumerate(presets):
-            if preset["key"] == selected_key:
-                del presets[i]
-                break
-
-        # 更新剩余预设的 key 值
-        for i, preset in enumerate(presets):
-            preset["key"] = i + 1
-
-        # 更新 Treeview 和预设文件
+        store.delete(int(selected_item))
         tree.delete(selected_item)
-        with open(preset_file, "w", encoding="utf-8") as f:
-            json.dump(presets, f, ensure_ascii=False, indent=4)
-
-        # 重新加载 Treeview
-        tree.delete(*tree.get_children())
-        for preset in presets:
-            command_str = " ".join(preset["command"])  # 将命令列表转换为字符串
-            output_type_display = (
-                "与导入格式相同"
-                if preset["output_type"] == "keep"
-                else preset["output_type"]
-            )
-            tree.insert(
-                "",
-                "end",
-                iid=preset["key"],
-                values=(command_str, preset["description"], output_type_display),
-            )
 
     def run_preset(tree):
         selected_item = tree.selection()[0]
-        selected_preset = tree.item(selected_item, "values")
+        selected_preset = store.get(int(selected_item))
 
-        # 调整索引，假设 key 列不可见
-        command = selected_preset[0].split()  # 将命令字符串转换为列表
-        output_type = selected_preset[2]
-
-        # 解析命令中的文件类型
-        file_types = []
-        placeholders = ["[视频]", "[音频]", "[媒体]", "[字幕]"]
-        for placeholder in placeholders:
-            for cmd in command:
-                if placeholder in cmd:
-                    file_types.append(placeholder.strip("[]"))
-
-        def execute_command(file_paths, command):
-            # 替换命令中的文件占位符
-            for i, file_path in enumerate(file_paths):
-                command = [
-                    cmd.replace(f"[{file_types[i]}]", file_path, 1) for cmd in command
-                ]
-
-            # 如果 output_type 是 keep，则使用输入文件的扩展名
-            if output_type == "keep":
-                input_file_extension = os.path.splitext(file_paths[0])[1]
-                output_extension = input_file_extension
-            else:
-                output_extension = f".{output_type}"
+        output_type = selected_preset["output_type"]
+
+        # 编译预设命令，解析其中的文件类型
+        template = compile_preset(selected_preset)
+        try:
+            template.validate()
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        file_types = template.file_types
+
+        def execute_command(file_paths):
+            output_extension = preset_output_extension(output_type, file_paths[0])
 
             # 让用户指定输出文件名
             output_file = filedialog.asksaveasfilename(
@@ -1053,7 +1739,8 @@ def show_preset_window():
                 ],
             )
             if output_file:
-                command = [cmd.replace("[输出]", output_file) for cmd in command]
+                # 填入输入和输出文件
+                command = template.fill(file_paths, output_file)
 
                 # 创建新窗口
                 progress_window = Toplevel(root)
@@ -1061,6 +1748,7 @@ def show_preset_window():
 
                 # 显示进度条和进度标签
                 progress_var = StringVar()
+                progress_var.set("进度: 排队中")
                 progress_bar = ttk.Progressbar(
                     progress_window, orient="horizontal", length=300, mode="determinate"
                 )
@@ -1068,64 +1756,455 @@ def show_preset_window():
                 progress_label = Label(progress_window, textvariable=progress_var)
                 progress_label.grid(pady=5)
 
-                def run_and_update():
-                    result = run_ffmpeg_command_with_progress(
-                        command,
-                        progress_var,
-                        progress_bar,
-                        progress_label,
-                        progress_window,
-                        None,
-                    )
-                    messagebox.showinfo("结果", f"完成，返回码: {result}")
+                def on_finish(job):
+                    show_job_result(job, "结果")
                     progress_window.destroy()
 
-                # 启动线程
-                merge_thread = threading.Thread(target=run_and_update)
-                merge_thread.start()
+                # 提交到任务队列
+                get_job_queue().submit(
+                    Job(
+                        command,
+                        outputs=template.output_files(output_file),
+                        on_progress=lambda job, event: root.after(
+                            0,
+                            update_progress_widgets,
+                            progress_var,
+                            progress_bar,
+                            event,
+                        ),
+                        on_finish=lambda job: root.after(0, on_finish, job),
+                    )
+                )
 
         import_files(
             len(file_types),
             file_types,
-            lambda file_paths: execute_command(file_paths, command),
+            execute_command,
         )
 
+    def batch_preset(tree):
+        selected_item = tree.selection()
+        if not selected_item:
+            messagebox.showwarning("警告", "请选择一个预设进行批量运行")
+            return
+        selected_preset = store.get(int(selected_item[0]))
+
+        batch_window = Toplevel(preset_window)
+        batch_window.title("批量运行")
+
+        input_var = StringVar(batch_window)
+        output_dir_var = StringVar(batch_window)
+        pattern_var = StringVar(batch_window, value=DEFAULT_NAME_PATTERN)
+        recursive_var = BooleanVar(batch_window)
+        skip_existing_var = BooleanVar(batch_window)
+
+        def choose_input_dir():
+            folder = filedialog.askdirectory(
+                title="选择输入文件夹", parent=batch_window
+            )
+            if folder:
+                input_var.set(folder)
+
+        def choose_output_dir():
+            folder = filedialog.askdirectory(
+                title="选择输出文件夹", parent=batch_window
+            )
+            if folder:
+                output_dir_var.set(folder)
+
+        input_label = ttk.Label(batch_window, text="输入:")
+        input_label.grid(row=0, column=0, padx=5, pady=5, sticky="e")
+        CreateToolTip(input_label, text="文件夹或通配符，如 D:/videos/*.mp4")
+        ttk.Entry(batch_window, textvariable=input_var, width=40).grid(
+            row=0, column=1, padx=5, pady=5
+        )
+        ttk.Button(batch_window, text="浏览", command=choose_input_dir).grid(
+            row=0, column=2, padx=5, pady=5
+        )
+        output_label = ttk.Label(batch_window, text="输出文件夹:")
+        output_label.grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        CreateToolTip(output_label, text="留空时输出到输入文件所在的文件夹")
+        ttk.Entry(batch_window, textvariable=output_dir_var, width=40).grid(
+            row=1, column=1, padx=5, pady=5
+        )
+        ttk.Button(batch_window, text="浏览", command=choose_output_dir).grid(
+            row=1, column=2, padx=5, pady=5
+        )
+        pattern_label = ttk.Label(batch_window, text="文件名格式:")
+        pattern_label.grid(row=2, column=0, padx=5, pady=5, sticky="e")
+        CreateToolTip(
+            pattern_label,
+            text="{name} 输入文件名，{ext} 输入扩展名，{index} 序号，{parent} 所在文件夹名",
+        )
+        ttk.Entry(batch_window, textvariable=pattern_var, width=40).grid(
+            row=2, column=1, padx=5, pady=5
+        )
+        ttk.Checkbutton(
+            batch_window, text=" 包含子文件夹", variable=recursive_var
+        ).grid(row=3, column=1, padx=5, pady=5, sticky="w")
+        ttk.Checkbutton(
+            batch_window, text=" 跳过已存在的输出文件", variable=skip_existing_var
+        ).grid(row=4, column=1, padx=5, pady=5, sticky="w")
+
+        progress_bar = ttk.Progressbar(
+            batch_window, orient="horizontal", length=300, mode="determinate"
+        )
+        progress_bar.grid(row=6, column=0, columnspan=3, padx=5, pady=5)
+        progress_var = StringVar(batch_window)
+        Label(batch_window, textvariable=progress_var).grid(
+            row=7, column=0, columnspan=3, padx=5, pady=5
+        )
+
+        def update_batch_progress(progress):
+            # 窗口可能已被关闭，任务仍在队列中继续运行
+            if not progress_bar.winfo_exists():
+                return
+            progress_bar["value"] = progress.percent
+            progress_var.set(
+                f"进度: {progress.percent:.1f}%  完成 {progress.done} / {progress.total}"
+                + (f"，失败 {progress.failed}" if progress.failed else "")
+            )
+            if progress.finished:
+                start_button.config(state="normal")
+
+        def start_batch():
+            input_files = expand_inputs([input_var.get()], recursive_var.get())
+            if not input_files:
+                messagebox.showwarning("警告", "没有找到输入文件", parent=batch_window)
+                return
+            try:
+                jobs, progress = build_batch_jobs(
+                    selected_preset,
+                    input_files,
+                    output_dir_var.get() or None,
+                    pattern_var.get(),
+                    skip_existing_var.get(),
+                    on_update=lambda progress: root.after(
+                        0, update_batch_progress, progress
+                    ),
+                )
+            except (ValueError, OSError) as e:
+                messagebox.showerror("错误", str(e), parent=batch_window)
+                return
+            if not jobs:
+                messagebox.showinfo(
+                    "批量运行", "没有需要处理的文件", parent=batch_window
+                )
+                return
+
+            start_button.config(state="disabled")
+            update_batch_progress(progress)
+            job_queue = get_job_queue()
+            for job in jobs:
+                job_queue.submit(job)
+
+        start_button = ttk.Button(batch_window, text="开始", command=start_batch)
+        start_button.grid(row=5, column=0, columnspan=3, padx=5, pady=5)
+
+
+def update_progress_widgets(progress_var, progress_bar, event):
+    # 窗口可能已被关闭
+    if not progress_bar.winfo_exists():
+        return
+    text = f"进度: {convert_seconds_to_time(event.out_time)}"
+    if event.total_seconds:
+        text += f" / {convert_seconds_to_time(event.total_seconds)}"
+    if event.speed:
+        text += f"  速度: {event.speed:.2f}x"
+    if event.fps:
+        text += f"  {event.fps:.0f} fps"
+    progress_var.set(text)
+    if event.percent is not None:
+        progress_bar["value"] = event.percent
+
+
+def show_job_result(job, title):
+    if job.state == CANCELLED:
+        messagebox.showinfo(title, "已取消，不完整的输出文件已删除")
+    elif job.error:
+        messagebox.showerror(title, f"执行命令时出错: {job.error}")
+    elif job.summary:
+        messagebox.showinfo(title, f"完成，{job.summary}")
+    else:
+        messagebox.showinfo(title, f"完成，返回码: {job.returncode}")
+
+
+def ask_save_file(format):
+    return filedialog.asksaveasfilename(
+        title="保存文件",
+        defaultextension=f".{format}",
+        filetypes=[(f"{format.upper()} 文件", f"*.{format}"), ("所有文件", "*.*")],
+    )
+
+
+def start_estimate(command, outputs, estimate_var, estimate_button):
+    """
+    在后台线程中估算导出的耗时和输出大小，结果显示在 estimate_var 中。
+
+    :param outputs: 命令中的输出文件（占位的文件名），样本编码时替换为临时文件
+    """
+    # 延迟导入，仅在使用该功能时加载
+    from estimator import estimate_command
+
+    if not command:
+        return
+    estimate_button.config(state="disabled")
+    estimate_var.set("正在编码样本以估算耗时和大小…")
 
-def start_export_thread(
+    def show(text):
+        # 窗口可能已被关闭
+        if estimate_button.winfo_exists():
+            estimate_button.config(state="normal")
+            estimate_var.set(text)
+
+    def run():
+        try:
+            text = estimate_command(command, outputs).describe()
+        except ValueError as e:
+            text = f"无法估算: {e}"
+        root.after(0, show, text)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def start_export_job(
     command,
     export_button,
-    back_button,
     progress_bar,
     progress_var,
     progress_label,
     root,
     total_duration=None,
+    target=None,
+    description=None,
+    threads=None,
+    outputs=None,
 ):
-    if not command:
+    if not command and not target:
         return
 
-    # 隐藏导出按钮，显示进度条和进度标签
-    export_button.grid_remove()
-    back_button.grid_remove()
+    # 隐藏导出按钮（连同所在的按钮栏），显示进度条和进度标签
+    button_frame = export_button.master
+    button_frame.grid_remove()
+    progress_bar["value"] = 0
+    progress_bar["maximum"] = 100
     progress_bar.grid()
     progress_label.grid()
-    progress_var.set("进度: 0%")
+    progress_var.set("进度: 排队中")
 
-    def export_and_update():
-        # 运行FFmpeg命令并显示进度
-        result = run_ffmpeg_command_with_progress(
-            command, progress_var, progress_bar, progress_label, root, total_duration
-        )
+    job_queue = get_job_queue()
 
+    def on_finish(job):
         # 显示导出结果
-        messagebox.showinfo("导出结果", f"完成，返回码: {result}")
+        show_job_result(job, "导出结果")
 
         # 显示导出按钮，隐藏进度条和进度标签
-        root.after(0, export_button.grid)
-        root.after(0, back_button.grid)
-        root.after(0, progress_bar.grid_remove)
-        root.after(0, progress_label.grid_remove)
-
-    # 启动导出线程
-    export_thread = threading.Thread(target=export_and_update)
-    export_thread.start()
+        if export_button.winfo_exists():
+            control_frame.destroy()
+            button_frame.grid()
+            progress_bar.grid_remove()
+            progress_label.grid_remove()
+
+    job = Job(
+        command,
+        description=description,
+        total_duration=total_duration,
+        target=target,
+        threads=threads,
+        outputs=outputs,
+        on_progress=lambda job, event: root.after(
+            0, update_progress_widgets, progress_var, progress_bar, event
+        ),
+        on_finish=lambda job: root.after(0, on_finish, job),
+    )
+
+    def toggle_pause():
+        if pause_button["text"] == "继续":
+            job_queue.resume(job)
+            pause_button.config(text="暂停")
+        elif job_queue.pause(job):
+            pause_button.config(text="继续")
+            progress_var.set("进度: 已暂停")
+        elif job.state == RUNNING:
+            messagebox.showerror("错误", "暂停任务需要安装 psutil")
+
+    def cancel():
+        if messagebox.askyesno("取消", "确定取消导出吗？不完整的输出文件将被删除。"):
+            job_queue.cancel(job)
+
+    # 暂停和取消按钮放在窗口最下方的空行中，进度条下方的行可能已被其他控件（如波形图）占用
+    grid_info = progress_bar.grid_info()
+    _, rows = progress_bar.master.grid_size()
+    control_frame = ttk.Frame(progress_bar.master)
+    control_frame.grid(
+        row=rows,
+        column=grid_info["column"],
+        columnspan=grid_info["columnspan"],
+        pady=5,
+    )
+    pause_button = ttk.Button(control_frame, text="暂停", command=toggle_pause)
+    pause_button.grid(row=0, column=0, padx=5)
+    cancel_button = ttk.Button(control_frame, text="取消", command=cancel)
+    cancel_button.grid(row=0, column=1, padx=5)
+
+    # 提交到任务队列，由队列控制同时运行的 FFmpeg 进程数
+    job_queue.submit(job)
+
+
+def show_job_queue_window():
+    job_queue = get_job_queue()
+
+    queue_window = Toplevel(root)
+    queue_window.title("任务队列")
+
+    # 显示任务的表格
+    columns = ("任务", "状态", "进度")
+    tree = ttk.Treeview(queue_window, columns=columns, show="headings")
+    for col in columns:
+        tree.heading(col, text=col)
+    tree.column("状态", width=80)
+    tree.column("进度", width=80)
+    tree.grid(row=0, column=0, columnspan=3, padx=10, pady=10)
+
+    # 并发数设置
+    workers_label = Label(queue_window, text="并发数:")
+    workers_label.grid(row=1, column=0, padx=5, pady=5, sticky="e")
+    CreateToolTip(workers_label, text="同时运行的 FFmpeg 进程数")
+    workers_var = IntVar(queue_window)
+    workers_var.set(job_queue.max_workers)
+
+    def apply_max_workers(event=None):
+        try:
+            job_queue.set_max_workers(workers_var.get())
+        except (ValueError, tk.TclError):
+            workers_var.set(job_queue.max_workers)
+
+    workers_spinbox = ttk.Spinbox(
+        queue_window,
+        from_=1,
+        to=os.cpu_count() or 1,
+        textvariable=workers_var,
+        width=5,
+        command=apply_max_workers,
+    )
+    workers_spinbox.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+    workers_spinbox.bind("<Return>", apply_max_workers)
+
+    # 绑定 CPU 核心
+    pin_var = BooleanVar(queue_window)
+    pin_var.set(job_queue.budget.pin)
+    pin_checkbutton = ttk.Checkbutton(
+        queue_window,
+        text=" 绑定CPU核心",
+        variable=pin_var,
+        command=lambda: job_queue.set_pin_cpus(pin_var.get()),
+    )
+    pin_checkbutton.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+    CreateToolTip(
+        pin_checkbutton,
+        text="把每个任务固定在分到的核心上，减少多个任务之间的缓存争用",
+    )
+
+    summary_var = StringVar(queue_window)
+    summary_label = Label(queue_window, textvariable=summary_var)
+    summary_label.grid(row=1, column=2, padx=5, pady=5, sticky="e")
+
+    # 控制选中的任务
+    def selected_jobs():
+        ids = {str(job_id) for job_id in tree.selection()}
+        return [job for job in list(job_queue.jobs) if str(job.id) in ids]
+
+    def pause_jobs():
+        for job in selected_jobs():
+            if not job_queue.pause(job) and job.state == RUNNING:
+                messagebox.showerror(
+                    "错误", "暂停任务需要安装 psutil", parent=queue_window
+                )
+                return
+
+    def resume_jobs():
+        for job in selected_jobs():
+            job_queue.resume(job)
+
+    def cancel_jobs():
+        jobs = selected_jobs()
+        if jobs and messagebox.askyesno(
+            "取消",
+            f"确定取消选中的 {len(jobs)} 个任务吗？不完整的输出文件将被删除。",
+            parent=queue_window,
+        ):
+            for job in jobs:
+                job_queue.cancel(job)
+
+    control_frame = ttk.Frame(queue_window)
+    control_frame.grid(row=3, column=0, columnspan=3, pady=5)
+    ttk.Button(control_frame, text="暂停", command=pause_jobs).grid(
+        row=0, column=0, padx=5
+    )
+    ttk.Button(control_frame, text="继续", command=resume_jobs).grid(
+        row=0, column=1, padx=5
+    )
+    ttk.Button(control_frame, text="取消", command=cancel_jobs).grid(
+        row=0, column=2, padx=5
+    )
+
+    def resume_interrupted():
+        # 继续 data/resume 中记录的中断的编码
+        from resumable_encode import pending_encodes, resumable_target
+
+        # 跳过仍在队列中的编码
+        unfinished = {
+            job.description
+            for job in list(job_queue.jobs)
+            if job.state in (QUEUED, RUNNING, PAUSED)
+        }
+        encodes = [
+            encode for encode in pending_encodes() if encode[0][-1] not in unfinished
+        ]
+        if not encodes:
+            messagebox.showinfo("提示", "没有中断的编码", parent=queue_window)
+            return
+        text = "\n".join(
+            f"{os.path.basename(command[-1])}: 已完成 {done} / {total} 个片段"
+            for command, done, total in encodes
+        )
+        if not messagebox.askyesno(
+            "继续中断的编码", f"{text}\n\n确定继续这些编码吗？", parent=queue_window
+        ):
+            return
+        for command, done, total in encodes:
+            job_queue.submit(
+                Job(
+                    description=command[-1],
+                    target=resumable_target(command),
+                    threads=estimate_threads(command),
+                    outputs=[command[-1]],
+                )
+            )
+
+    ttk.Button(control_frame, text="继续中断的编码", command=resume_interrupted).grid(
+        row=0, column=3, padx=5
+    )
+
+    def refresh():
+        if not queue_window.winfo_exists():
+            return
+        for job in list(job_queue.jobs):
+            values = (
+                os.path.basename(job.description),
+                STATE_NAMES.get(job.state, job.state),
+                f"{job.progress:.1f}%",
+            )
+            if tree.exists(job.id):
+                tree.item(job.id, values=values)
+            else:
+                tree.insert("", "end", iid=job.id, values=values)
+        counts = job_queue.counts()
+        summary_var.set(
+            "，".join(
+                f"{STATE_NAMES[state]} {count}" for state, count in counts.items()
+            )
+        )
+        queue_window.after(500, refresh)
+
+    refresh()
@@ -0,0 +1,384 @@
+import os
+import atexit
+import threading
+import itertools
+from collections import deque
+from process_control import (
+    GRACEFUL_TIMEOUT,
+    can_suspend,
+    resume_process,
+    stop_process,
+    suspend_process,
+)
+from thread_budget import CpuBudget, apply_threads, estimate_threads
+from thread_budget import available_cpus, set_process_affinity
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+STATE_NAMES = {
+    QUEUED: "排队中",
+    RUNNING: "运行中",
+    PAUSED: "已暂停",
+    DONE: "已完成",
+    FAILED: "失败",
+    CANCELLED: "已取消",
+}
+
+
+def default_max_workers():
+    # 单个 x264/x265 进程本身就会占用多个核心，按每 4 核一个并发槽位估算
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+class Job(object):
+    """
+    一个导出任务。
+
+    :param command: 要执行的 FFmpeg 命令列表
+    :param description: 在任务队列中显示的描述
+    :param total_duration: 输出的总时长（"HH:MM:SS.xx"），用于计算进度
+    :param on_progress: 进度回调，参数为 (job, ProgressEvent)，在工作线程中调用
+    :param on_finish: 结束回调，参数为 job，在工作线程中调用
+    :param target: 自定义执行函数，参数为 job，返回返回码；设置后忽略 command
+    :param threads: 任务需要的线程数，默认按命令的编码器和分辨率估算，自定义执行函数为 1
+    :param outputs: 任务写入的输出文件，由生成命令的调用方提供，线程数选项插入在这些文件之前，
+        取消时删除这些不完整的文件
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        command=None,
+        description=None,
+        total_duration=None,
+        on_progress=None,
+        on_finish=None,
+        target=None,
+        threads=None,
+        outputs=None,
+    ):
+        self.id = next(Job._ids)
+        self.command = command
+        self.description = description or (command[-1] if command else "")
+        self.total_duration = total_duration
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.target = target
+        self.wanted_threads = threads
+        self.outputs = list(outputs or [])
+        self.threads = None  # 启动时分到的线程数
+        self.cpus = None  # 绑定的 CPU 编号，为 None 时不绑定
+        self.processes = []  # 任务启动的 FFmpeg 进程
+        self.paused = False
+        self.cancelled = False
+        self.state = QUEUED
+        self.progress = 0.0  # 百分比
+        self.returncode = None
+        self.error = None
+        self.last_event = None  # 最近一次的 ProgressEvent
+        self.log = deque(maxlen=200)  # FFmpeg 日志的最后若干行
+        self.summary = None  # 完成后显示给用户的说明，如实际输出大小
+
+    def report_progress(self, event):
+        self.last_event = event
+        if event.percent is not None:
+            self.progress = event.percent
+        if self.on_progress:
+            self.on_progress(self, event)
+
+    def process_started(self, process):
+        # FFmpeg 进程启动时调用，按分到的核心设置亲和性
+        self.processes = [p for p in self.processes if p.poll() is None]
+        self.processes.append(process)
+        if self.cpus:
+            set_process_affinity(process.pid, self.cpus)
+        # 多步骤的任务在暂停或取消后还可能启动新的进程
+        if self.cancelled:
+            stop_process(process, graceful=False)
+        elif self.paused:
+            suspend_process(process)
+
+    def _live_processes(self):
+        return [process for process in self.processes if process.poll() is None]
+
+    def pause(self):
+        self.paused = True
+        for process in self._live_processes():
+            suspend_process(process)
+
+    def resume(self):
+        self.paused = False
+        for process in self._live_processes():
+            resume_process(process)
+
+    def cancel(self, graceful=True):
+        """
+        取消任务：先让 FFmpeg 正常退出，超时后强制结束，在后台线程中执行，不阻塞调用方。
+        """
+        self.cancelled = True
+        self.paused = False
+        for process in self._live_processes():
+            threading.Thread(
+                target=stop_process, args=(process, graceful), daemon=True
+            ).start()
+
+    def input_files(self):
+        # 命令中 "-i" 后面的参数，取消时无论如何都不会删除
+        if not self.command:
+            return []
+        return [
+            self.command[i + 1]
+            for i, arg in enumerate(self.command[:-1])
+            if arg == "-i"
+        ]
+
+    def remove_outputs(self):
+        """
+        删除取消后留下的不完整的输出：只删除创建任务时记录的 outputs，不从命令中推断，
+        也不删除任何输入文件。
+        """
+        inputs = {os.path.abspath(path) for path in self.input_files()}
+        for output_file in self.outputs:
+            if os.path.abspath(output_file) in inputs:
+                continue
+            if os.path.isfile(output_file):
+                try:
+                    os.remove(output_file)
+                except OSError:
+                    pass
+
+    def estimate(self):
+        """
+        按样本编码估算任务的耗时和输出大小，返回 Estimate；没有命令的任务返回 None。
+
+        结果按输入文件和设置缓存，样本编码在调用方线程中运行，不占用任务队列的槽位。
+        """
+        if not self.command:
+            return None
+        # 延迟导入，仅在使用该功能时加载
+        from estimator import estimate_command
+
+        return estimate_command(self.command, self.outputs, self.wanted_threads)
+
+    def apply_affinity(self):
+        # 分到的核心变化后更新运行中的进程
+        cpus = self.cpus or available_cpus()
+        for process in self.processes:
+            if process.poll() is None:
+                set_process_affinity(process.pid, cpus)
+
+    def run(self):
+        if self.target:
+            return self.target(self)
+
+        # 延迟导入，避免循环依赖
+        from ffmpeg_utils import run_ffmpeg_command
+
+        return run_ffmpeg_command(
+            apply_threads(self.command, self.threads, self.outputs),
+            self.report_progress,
+            self.total_duration,
+            self.log,
+            on_start=self.process_started,
+        )
+
+
+class JobQueue(object):
+    """
+    有界并发的任务队列：任务按提交顺序执行，同时运行的 FFmpeg 进程数不超过 max_workers，
+    且所有任务的线程数之和不超过 CPU 核心数（见 CpuBudget）。
+
+    暂停的任务让出并发槽位和核心，恢复时排在所有等待的任务之前。
+    """
+
+    def __init__(self, max_workers=None, budget=None):
+        self.max_workers = max_workers or default_max_workers()
+        self.budget = budget or CpuBudget()
+        self.jobs = []  # 所有提交过的任务，按提交顺序
+        self._pending = deque()
+        self._resuming = deque()  # 等待恢复的暂停任务
+        self._active = set()  # 占用并发槽位和核心的任务
+        self._threads = 0  # 尚未结束的任务线程
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, job):
+        if job.wanted_threads is None:
+            job.wanted_threads = estimate_threads(job.command) if job.command else 1
+        with self._lock:
+            self.jobs.append(job)
+            self._pending.append(job)
+            self._dispatch()
+        return job
+
+    def set_max_workers(self, max_workers):
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+            self._dispatch()
+
+    def set_pin_cpus(self, pin):
+        # 是否把任务绑定到分到的 CPU 核心上
+        with self._lock:
+            self.budget.set_pin(pin)
+            self._dispatch()
+
+    def pause(self, job):
+        """
+        暂停运行中的任务并让出它的槽位和核心，返回是否成功。
+        """
+        if not can_suspend():
+            return False
+        with self._lock:
+            if job.state != RUNNING:
+                return False
+            job.pause()
+            job.state = PAUSED
+            self._active.discard(job)
+            self.budget.release(job)
+            self._dispatch()
+        return True
+
+    def resume(self, job):
+        # 恢复暂停的任务，有空闲的槽位和核心时立即恢复
+        with self._lock:
+            if job.state == PAUSED and job not in self._resuming:
+                self._resuming.append(job)
+                self._dispatch()
+
+    def cancel(self, job):
+        """
+        取消任务：排队中的任务直接移除，运行中和暂停的任务结束进程并删除不完整的输出。
+        """
+        with self._lock:
+            if job.state == QUEUED:
+                self._pending.remove(job)
+                job.cancelled = True
+                job.state = CANCELLED
+                self._idle.notify_all()
+                finished = True
+            else:
+                finished = False
+                if job in self._resuming:
+                    self._resuming.remove(job)
+                if job.state in (RUNNING, PAUSED):
+                    job.cancel()
+        if finished and job.on_finish:
+            job.on_finish(job)
+
+    def forget(self, job):
+        # 从任务列表中移除已结束的任务，长时间运行的监视服务用来避免任务列表无限增长
+        with self._lock:
+            if job.state in (DONE, FAILED, CANCELLED) and job in self.jobs:
+                self.jobs.remove(job)
+
+    def shutdown(self, timeout=None):
+        """
+        退出程序前调用：取消所有任务并强制结束 FFmpeg 进程，避免留下孤儿进程。
+        """
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+            self._resuming.clear()
+            for job in pending:
+                job.cancelled = True
+                job.state = CANCELLED
+            for job in self.jobs:
+                if job.state in (RUNNING, PAUSED):
+                    job.cancel(graceful=False)
+        return self.wait(timeout)
+
+    def _dispatch(self):
+        # 调用方需持有 self._lock
+        while (self._resuming or self._pending) and len(
+            self._active
+        ) < self.max_workers:
+            waiting = self._resuming or self._pending
+            job = waiting[0]
+            if waiting is self._resuming:
+                # 线程数在启动时已经确定，恢复时按原来的线程数分配核心
+                wanted = job.threads
+            else:
+                # 按同时运行的任务数平分核心，任务需要的更少时只给需要的
+                active = min(
+                    self.max_workers,
+                    len(self._active) + len(self._resuming) + len(self._pending),
+                )
+                wanted = min(job.wanted_threads, self.budget.fair_share(active))
+            cpus = self.budget.acquire(job, wanted, force=not self._active)
+            if cpus is None:
+                break
+            waiting.popleft()
+            self._active.add(job)
+            job.state = RUNNING
+            if waiting is self._resuming:
+                job.apply_affinity()
+                job.resume()
+                continue
+            job.threads = len(cpus)
+            self._threads += 1
+            threading.Thread(target=self._run_job, args=(job,), daemon=True).start()
+        if not self._pending and not self._resuming:
+            self.budget.lend_idle()
+
+    def _run_job(self, job):
+        try:
+            job.returncode = job.run()
+            if job.cancelled:
+                job.state = CANCELLED
+                job.remove_outputs()
+            elif job.returncode == 0:
+                job.state = DONE
+                job.progress = 100.0
+            else:
+                job.state = FAILED
+                if job.log:
+                    job.error = job.log[-1]
+        except Exception as e:
+            job.error = str(e)
+            job.state = CANCELLED if job.cancelled else FAILED
+
+        try:
+            if job.on_finish:
+                job.on_finish(job)
+        finally:
+            with self._lock:
+                self._threads -= 1
+                if job in self._active:
+                    self._active.discard(job)
+                    self.budget.release(job)
+                self._dispatch()
+                self._idle.notify_all()
+
+    def wait(self, timeout=None):
+        # 等待所有任务结束（包括暂停的任务），返回是否已全部结束
+        with self._lock:
+            return self._idle.wait_for(
+                lambda: not self._pending and self._threads == 0, timeout
+            )
+
+    def counts(self):
+        with self._lock:
+            result = {state: 0 for state in STATE_NAMES}
+            for job in self.jobs:
+                result[job.state] = result.get(job.state, 0) + 1
+            return result
+
+
+# 全局任务队列
+_job_queue = None
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+        # 程序退出时结束所有 FFmpeg 进程
+        atexit.register(_job_queue.shutdown, GRACEFUL_TIMEOUT)
+    return _job_queue
@@ -0,0 +1,141 @@
+import bisect
+import subprocess
+import threading
+from utils import file_key, probe
+
+# 按时间窗口读取关键帧时的最小窗口（秒）
+MIN_WINDOW_SECONDS = 5
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+
+def read_keyframes(file_path, intervals=None):
+    """
+    读取视频流中关键帧的时间（秒），按升序返回。
+
+    :param file_path: 媒体文件路径
+    :param intervals: 要读取的时间范围列表，元素为 (开始秒数, 结束秒数)，为空时读取整个文件
+    """
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+    ]
+    if intervals:
+        command.extend(
+            [
+                "-read_intervals",
+                ",".join(f"{max(start, 0):.3f}%{end:.3f}" for start, end in intervals),
+            ]
+        )
+    command.append(file_path)
+
+    result = subprocess.run(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    times = set()
+    for line in result.stdout.decode("utf-8", errors="replace").splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            times.add(float(pts_time))
+    return sorted(times)
+
+
+def keyframe_index(file_path):
+    """
+    返回整个文件的关键帧索引，结果按文件大小、修改时间和 inode 缓存在内存和探测数据库中。
+    """
+    # 延迟导入，避免循环依赖
+    from probe_db import get_probe_db
+
+    key = file_key(file_path)
+    with _index_lock:
+        times = _index_cache.get(key)
+    if times is not None:
+        return times
+
+    db = get_probe_db()
+    times = db.get_keyframes(*key)
+    if times is None:
+        times = read_keyframes(key[0])
+        db.put_keyframes(*key, times)
+
+    with _index_lock:
+        _index_cache[key] = times
+    return times
+
+
+def cached_keyframe_index(file_path):
+    # 仅返回已建立的索引，不触发读取
+    from probe_db import get_probe_db
+
+    key = file_key(file_path)
+    with _index_lock:
+        times = _index_cache.get(key)
+    if times is None:
+        times = get_probe_db().get_keyframes(*key)
+    return times
+
+
+def _window(file_path):
+    info = probe(file_path)
+    interval = info.keyframe_interval if info else None
+    return max(MIN_WINDOW_SECONDS, 3 * (interval or 0))
+
+
+def _read_near(file_path, seconds, limit):
+    # 从 seconds 向 limit 方向逐步扩大窗口读取关键帧，读到即返回
+    low, high = min(seconds, limit), max(seconds, limit)
+    window = _window(file_path)
+    position = seconds
+    while position != limit:
+        if limit > seconds:
+            start, end = position, min(position + window, limit)
+            position = end
+        else:
+            start, end = max(position - window, limit), position
+            position = start
+        times = [
+            t for t in read_keyframes(file_path, [(start, end)]) if low <= t <= high
+        ]
+        if times:
+            return times
+        window *= 2
+    return []
+
+
+def keyframe_at_or_after(file_path, seconds, limit):
+    """
+    返回 [seconds, limit] 范围内的第一个关键帧时间，没有时返回 None。
+
+    已建立完整索引时直接查找，否则只读取 seconds 附近的数据。
+    """
+    index = cached_keyframe_index(file_path)
+    if index is None:
+        index = _read_near(file_path, seconds, limit)
+    i = bisect.bisect_left(index, seconds)
+    if i < len(index) and index[i] <= limit:
+        return index[i]
+    return None
+
+
+def keyframe_at_or_before(file_path, seconds, limit):
+    """
+    返回 [limit, seconds] 范围内的最后一个关键帧时间，没有时返回 None。
+
+    已建立完整索引时直接查找，否则只读取 seconds 附近的数据。
+    """
+    index = cached_keyframe_index(file_path)
+    if index is None:
+        index = _read_near(file_path, seconds, limit)
+    i = bisect.bisect_right(index, seconds)
+    if i > 0 and index[i - 1] >= limit:
+        return index[i - 1]
+    return None
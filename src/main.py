@@ -1,9 +1,17 @@
-from tkinter import *
-from ffmpeg_utils import check_ffmpeg, start_ffmpeg_download
-from gui import show_main_window, set_root
+import sys
 
 
 def main():
+    # 带参数启动时进入命令行模式，不加载图形界面
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+
+        sys.exit(cli_main(sys.argv[1:]))
+
+    from tkinter import Tk
+    from ffmpeg_utils import check_ffmpeg, start_ffmpeg_download
+    from gui import show_main_window, set_root
+
     if not check_ffmpeg():
         start_ffmpeg_download()  # 下载FFmpeg
 
@@ -0,0 +1,297 @@
+import os
+from utils import convert_time_to_seconds, convert_seconds_to_time
+
+
+class Operation(object):
+    """
+    组合操作中的一步。compile_operations() 把多个操作合并为一次 FFmpeg 调用。
+    """
+
+    # 操作名称，对应 parse_operation() 中的 "名称=参数"
+    name = None
+
+    def describe(self):
+        # 默认按名称和参数描述，如 "scale width=1280, height=-2"，子类可以提供更易读的描述
+        params = ", ".join(f"{key}={value}" for key, value in vars(self).items())
+        return f"{self.name or type(self).__name__} {params}".strip()
+
+
+class Trim(Operation):
+    """
+    裁剪，时间相对于上一步的输出；多次裁剪会合并为一次。
+
+    :param start: 开始秒数
+    :param end: 结束秒数，为 None 时到结尾
+    """
+
+    name = "trim"
+
+    def __init__(self, start, end=None):
+        if end is not None and end <= start:
+            raise ValueError("裁剪的结束时间必须晚于开始时间")
+        self.start = start
+        self.end = end
+
+    def describe(self):
+        end = "结尾" if self.end is None else convert_seconds_to_time(self.end)
+        return f"裁剪 {convert_seconds_to_time(self.start)} - {end}"
+
+
+class Scale(Operation):
+    """
+    缩放，宽或高为 -2 时按比例计算；多次缩放只保留最后一次。
+    """
+
+    name = "scale"
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def describe(self):
+        return f"缩放 {self.width}x{self.height}"
+
+
+class Rotate(Operation):
+    """
+    旋转或翻转，连续的旋转和翻转会合并为最少的滤镜。
+
+    :param mode: ROTATE_MODES 中的名称
+    """
+
+    name = "rotate"
+
+    def __init__(self, mode):
+        if mode not in ROTATE_MODES:
+            raise ValueError(f"未知的旋转方式: {mode}")
+        self.mode = mode
+
+    def describe(self):
+        return ROTATE_NAMES[self.mode]
+
+
+class Codec(Operation):
+    """
+    视频编码器，如 libx264，"copy" 表示不重新编码。
+    """
+
+    name = "codec"
+
+    def __init__(self, codec):
+        self.codec = codec
+
+    def describe(self):
+        return "不重新编码" if self.codec == "copy" else f"编码器 {self.codec}"
+
+
+class Bitrate(Operation):
+    """
+    码率（kbps），kind 为 "video" 或 "audio"。
+    """
+
+    name = "bitrate"
+
+    def __init__(self, kind, kbps):
+        self.kind = kind
+        self.kbps = kbps
+
+    def describe(self):
+        return f"{'视频' if self.kind == 'video' else '音频'}码率 {self.kbps}kbps"
+
+
+class Quality(Operation):
+    name = "crf"
+
+    def __init__(self, crf):
+        if not 0 <= crf <= 51:
+            raise ValueError("crf 的范围为 0-51")
+        self.crf = crf
+
+    def describe(self):
+        return f"品质 crf={self.crf}"
+
+
+class Metadata(Operation):
+    name = "metadata"
+
+    def __init__(self, keep):
+        self.keep = keep
+
+    def describe(self):
+        return "保留元数据" if self.keep else "去除元数据"
+
+
+# 旋转和翻转表示为 (先水平翻转与否, 再顺时针旋转 90° 的次数)
+ROTATE_MODES = {
+    "cw90": (False, 1),
+    "ccw90": (False, 3),
+    "180": (False, 2),
+    "hflip": (True, 0),
+    "vflip": (True, 2),
+}
+ROTATE_NAMES = {
+    "cw90": "顺时针旋转90°",
+    "ccw90": "逆时针旋转90°",
+    "180": "旋转180°",
+    "hflip": "水平翻转",
+    "vflip": "垂直翻转",
+}
+# 合并后的变换对应的最少滤镜
+TRANSFORM_FILTERS = {
+    (False, 0): [],
+    (False, 1): ["transpose=1"],
+    (False, 2): ["hflip", "vflip"],
+    (False, 3): ["transpose=2"],
+    (True, 0): ["hflip"],
+    (True, 1): ["transpose=3"],
+    (True, 2): ["vflip"],
+    (True, 3): ["transpose=0"],
+}
+
+
+def _compose(first, second):
+    # 先做 first 再做 second。旋转后水平翻转等于先水平翻转再反向旋转
+    flip1, turns1 = first
+    flip2, turns2 = second
+    turns = ((-turns1 if flip2 else turns1) + turns2) % 4
+    return (flip1 != flip2, turns)
+
+
+def fuse_trims(operations, duration=None):
+    """
+    把所有裁剪合并为输入文件上的一个时间范围，返回 (开始秒数, 结束秒数)，结束为 None 时到结尾。
+
+    每次裁剪的时间相对于前一次裁剪的结果，合并后的范围为空时抛出 ValueError。
+    """
+    start, end = 0.0, duration
+    for operation in operations:
+        if not isinstance(operation, Trim):
+            continue
+        new_start = start + operation.start
+        new_end = None if operation.end is None else start + operation.end
+        if end is not None:
+            new_end = end if new_end is None else min(new_end, end)
+        if new_end is not None and new_end <= new_start:
+            raise ValueError("裁剪后的时间范围为空")
+        start, end = new_start, new_end
+    return start, end
+
+
+def compile_operations(input_file, output_file, operations):
+    """
+    把操作列表编译为一条 FFmpeg 命令，所有滤镜合并为一个 -vf，不产生中间文件。
+
+    - 多次裁剪合并为一个时间范围，放在输入前快速定位
+    - 旋转和翻转合并为最少的滤镜，缩放放在旋转之后，尺寸按旋转调整
+    - 编码器为 "copy" 时不能使用滤镜
+
+    操作组合无效时抛出 ValueError。
+    """
+    start, end = fuse_trims(operations)
+    transform = (False, 0)
+    size = None  # 最后一次缩放的尺寸，相对于当前的 transform
+    size_transform = None
+    codec = None
+    video_bitrate = audio_bitrate = None
+    crf = None
+    keep_metadata = True
+
+    for operation in operations:
+        if isinstance(operation, Scale):
+            size = (operation.width, operation.height)
+            size_transform = transform
+        elif isinstance(operation, Rotate):
+            transform = _compose(transform, ROTATE_MODES[operation.mode])
+        elif isinstance(operation, Codec):
+            codec = operation.codec
+        elif isinstance(operation, Bitrate):
+            if operation.kind == "video":
+                video_bitrate = operation.kbps
+            else:
+                audio_bitrate = operation.kbps
+        elif isinstance(operation, Quality):
+            crf = operation.crf
+        elif isinstance(operation, Metadata):
+            keep_metadata = operation.keep
+
+    filters = list(TRANSFORM_FILTERS[transform])
+    if size is not None:
+        width, height = size
+        # 缩放之后又旋转了奇数个 90° 时，宽高互换
+        if (transform[1] - size_transform[1]) % 2:
+            width, height = height, width
+        filters.append(f"scale={width}:{height}")
+
+    if codec == "copy" and (filters or crf is not None or video_bitrate):
+        raise ValueError("不重新编码时不能缩放、旋转或修改视频码率和品质")
+
+    command = ["ffmpeg", "-y"]
+    if start:
+        command.extend(["-ss", f"{start:.3f}"])
+    if end is not None:
+        command.extend(["-to", f"{end:.3f}"])
+    command.extend(["-i", input_file])
+    command.extend(["-map_metadata", "0" if keep_metadata else "-1"])
+    if keep_metadata and os.path.splitext(input_file)[1].lower() == ".mov":
+        command.extend(["-movflags", "use_metadata_tags"])
+    if filters:
+        command.extend(["-vf", ",".join(filters)])
+    if codec == "copy":
+        command.extend(["-c:v", "copy"])
+        if audio_bitrate is None:
+            command.extend(["-c:a", "copy"])
+    elif codec:
+        command.extend(["-c:v", codec])
+    if video_bitrate:
+        command.extend(["-b:v", f"{video_bitrate}k"])
+    if crf is not None:
+        command.extend(["-crf", str(crf)])
+    if audio_bitrate:
+        command.extend(["-b:a", f"{audio_bitrate}k"])
+    command.append(output_file)
+    return command
+
+
+def _parse_time(value):
+    # 支持 "HH:MM:SS.xx" 和秒数两种格式
+    if ":" in value:
+        return convert_time_to_seconds(value)
+    return float(value)
+
+
+def parse_operation(text):
+    """
+    解析 "名称=参数" 形式的操作，无效时抛出 ValueError。
+
+    trim=开始-结束（结束可省略）、scale=宽x高、rotate=cw90|ccw90|180|hflip|vflip、
+    codec=编码器（如 libx264、libx265、copy）、vbitrate=kbps、abitrate=kbps、
+    crf=0-51、metadata=keep|strip
+    """
+    name, _, value = text.partition("=")
+    name, value = name.strip(), value.strip()
+    if not value:
+        raise ValueError(f"缺少参数: {text}")
+    try:
+        if name == "trim":
+            start, _, end = value.partition("-")
+            return Trim(_parse_time(start), _parse_time(end) if end else None)
+        if name == "scale":
+            width, _, height = value.partition("x")
+            return Scale(int(width), int(height))
+        if name == "rotate":
+            return Rotate(value)
+        if name == "codec":
+            return Codec(value)
+        if name == "vbitrate":
+            return Bitrate("video", int(value))
+        if name == "abitrate":
+            return Bitrate("audio", int(value))
+        if name == "crf":
+            return Quality(int(value))
+        if name == "metadata":
+            if value not in ("keep", "strip"):
+                raise ValueError("metadata 的参数为 keep 或 strip")
+            return Metadata(value == "keep")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"无效的操作 {text}: {e}")
+    raise ValueError(f"未知的操作: {name}")
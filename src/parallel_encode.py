@@ -0,0 +1,258 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from ffmpeg_utils import get_muxer_codecs, run_ffmpeg_command, write_concat_list
+from keyframes import keyframe_at_or_after
+from progress import ProgressAggregator
+from thread_budget import apply_threads
+from utils import probe
+
+# 每个片段的最短时长（秒），过短的片段拼接开销大于收益
+MIN_SEGMENT_SECONDS = 10
+# 每个工作进程分到的片段数，片段在关键帧处切分，长度不均，多切几段以平衡负载
+SEGMENTS_PER_WORKER = 2
+# 音频编码和最终封装在总进度中的权重
+AUDIO_WEIGHT = 0.05
+MUX_WEIGHT = 0.02
+# 会改变输入时间范围的选项，包含这些选项的命令不做分段
+TRIM_OPTIONS = ("-ss", "-to", "-t", "-sseof")
+# 指定视频、音频编码器的输出选项，后出现的覆盖前面的
+VIDEO_CODEC_OPTIONS = ("-c", "-codec", "-c:v", "-codec:v", "-vcodec")
+AUDIO_CODEC_OPTIONS = ("-c", "-codec", "-c:a", "-codec:a", "-acodec")
+# 扩展名与 FFmpeg 封装格式名称不同的常见格式
+EXTENSION_MUXERS = {
+    "mkv": "matroska",
+    "mka": "matroska",
+    "ts": "mpegts",
+    "m2ts": "mpegts",
+    "m4a": "ipod",
+    "wmv": "asf",
+}
+# 无法分段编码后用 concat 分离器拼接的封装格式
+UNSPLITTABLE_MUXERS = ("hls", "dash", "segment", "image2", "gif", "apng", "null")
+
+
+def default_workers():
+    return max(2, (os.cpu_count() or 1) // 4)
+
+
+def input_index(command):
+    # 返回唯一的 "-i" 参数位置，有多个输入时返回 None
+    indexes = [i for i, arg in enumerate(command) if arg == "-i"]
+    if len(indexes) != 1:
+        return None
+    return indexes[0]
+
+
+def can_split(command):
+    return input_index(command) is not None and not any(
+        arg in TRIM_OPTIONS for arg in command
+    )
+
+
+def output_muxer(command):
+    # 输出的封装格式：输出选项中的 -f，否则按输出文件的扩展名推断
+    muxer = None
+    options = command[input_index(command) + 2 : -1]
+    for i, arg in enumerate(options[:-1]):
+        if arg == "-f":
+            muxer = options[i + 1]
+    if muxer is None:
+        extension = os.path.splitext(command[-1])[1][1:].lower()
+        muxer = EXTENSION_MUXERS.get(extension, extension)
+    return muxer or None
+
+
+def resolve_encoders(command):
+    """
+    返回输出实际使用的 (视频编码器, 音频编码器)：命令中指定的编码器，
+    未指定时为输出封装格式的默认编码，没有默认编码时为 None。
+    输出格式无法分段编码后拼接，或 FFmpeg 不支持其封装格式时返回 None。
+
+    :param command: 只有一个输入文件的命令，最后一个参数为输出文件
+    """
+    muxer = output_muxer(command)
+    if muxer is None or muxer in UNSPLITTABLE_MUXERS or "%" in command[-1]:
+        return None
+    codecs = get_muxer_codecs(muxer)
+    if codecs is None:
+        return None
+    video_encoder, audio_encoder = codecs
+    options = command[input_index(command) + 2 : -1]
+    for i, arg in enumerate(options[:-1]):
+        if arg in VIDEO_CODEC_OPTIONS:
+            video_encoder = options[i + 1]
+        if arg in AUDIO_CODEC_OPTIONS:
+            audio_encoder = options[i + 1]
+    return video_encoder, audio_encoder
+
+
+def intermediate_file(work_dir, name, command):
+    # 片段和音频使用与输出相同的扩展名，即相同的封装格式和默认编码
+    return os.path.join(work_dir, name + os.path.splitext(command[-1])[1])
+
+
+def plan_segments(input_file, count):
+    """
+    在关键帧处把输入切分为最多 count 段，返回 [(开始秒数, 结束秒数)]。
+    """
+    info = probe(input_file)
+    if info is None or not info.has_video or not info.duration:
+        return [(0.0, info.duration if info else None)]
+
+    duration = info.duration
+    # 关键帧的 pts_time 包含容器的开始时间，-ss 则从文件开头计数
+    start_time = info.start_time or 0.0
+    count = max(1, min(count, int(duration // MIN_SEGMENT_SECONDS)))
+    boundaries = [0.0]
+    for i in range(1, count):
+        keyframe = keyframe_at_or_after(
+            input_file, duration * i / count + start_time, duration + start_time
+        )
+        if keyframe is None:
+            continue
+        keyframe -= start_time
+        if keyframe - boundaries[-1] >= MIN_SEGMENT_SECONDS:
+            boundaries.append(keyframe)
+    boundaries.append(duration)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def segment_command(command, start, end, segment_file, threads):
+    i = input_index(command)
+    result = command[:i] + ["-ss", f"{start:.6f}"] + command[i : i + 2]
+    result += ["-t", f"{end - start:.6f}"] + command[i + 2 : -1]
+    result += ["-an", "-sn", "-dn", "-threads", str(threads), segment_file]
+    return result
+
+
+def audio_command(command, audio_file):
+    return command[:-1] + ["-vn", "-sn", "-dn", audio_file]
+
+
+def build_mux_command(command, list_file, audio_file):
+    """
+    生成把编码好的视频片段与音频、原文件的元数据一起无损封装的命令。
+
+    :param command: 原始的 FFmpeg 命令，输入和输出文件、元数据选项从中读取
+    :param list_file: 片段的 concat 列表文件
+    :param audio_file: 单独编码的音频文件，没有音频时为 None
+    """
+    input_file = command[input_index(command) + 1]
+    mux_command = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file]
+    if audio_file:
+        mux_command.extend(["-i", audio_file])
+    mux_command.extend(["-i", input_file, "-map", "0:v"])
+    if audio_file:
+        mux_command.extend(["-map", "1:a"])
+    metadata_input = 2 if audio_file else 1
+    keep_metadata = "-map_metadata" not in command or (
+        command[command.index("-map_metadata") + 1] != "-1"
+    )
+    mux_command.extend(
+        [
+            "-c",
+            "copy",
+            "-map_metadata",
+            str(metadata_input) if keep_metadata else "-1",
+        ]
+    )
+    if "-movflags" in command:
+        i = command.index("-movflags")
+        mux_command.extend(command[i : i + 2])
+    mux_command.append(command[-1])
+    return mux_command
+
+
+def run_parallel_encode(
+    command, workers=None, on_progress=None, log=None, threads=None, on_start=None
+):
+    """
+    分段并行编码：在关键帧处把输入切分为多段，用相同的参数同时编码，
+    音频单独编码，最后用 concat 分离器无损拼接。
+
+    片段和音频写入与输出相同的封装格式，未指定编码器时与输出一样使用该格式的默认编码，
+    拼接时可以无损复制。
+    命令无法分段（多个输入、包含裁剪选项、输出格式无法拼接或输入没有视频）时按原命令执行。
+    返回最后一个执行的 FFmpeg 进程的返回码。
+
+    :param command: build_command 生成的命令，最后一个参数为输出文件
+    :param threads: 所有片段共用的线程数，默认为 CPU 核心数
+    :param on_start: 每个 FFmpeg 进程启动后的回调，参数为 subprocess.Popen
+    """
+    workers = workers or default_workers()
+    encoders = resolve_encoders(command) if can_split(command) else None
+    if encoders is None or encoders[0] is None:
+        return run_ffmpeg_command(
+            apply_threads(command, threads or os.cpu_count() or 1, [command[-1]]),
+            on_progress,
+            log=log,
+            on_start=on_start,
+        )
+
+    input_file = command[input_index(command) + 1]
+    output_file = command[-1]
+    segments = plan_segments(input_file, workers * SEGMENTS_PER_WORKER)
+    if len(segments) < 2:
+        return run_ffmpeg_command(
+            apply_threads(command, threads or os.cpu_count() or 1, [command[-1]]),
+            on_progress,
+            log=log,
+            on_start=on_start,
+        )
+
+    info = probe(input_file)
+    duration = info.duration
+    threads = max(1, (threads or os.cpu_count() or 1) // workers)
+    work_dir = tempfile.mkdtemp(
+        prefix=".parallel_", dir=os.path.dirname(os.path.abspath(output_file))
+    )
+    try:
+        aggregator = ProgressAggregator(duration, on_progress)
+        tasks = []
+        segment_files = []
+        for i, (start, end) in enumerate(segments):
+            segment_file = intermediate_file(work_dir, f"segment_{i}", command)
+            segment_files.append(segment_file)
+            tasks.append(
+                (
+                    segment_command(command, start, end, segment_file, threads),
+                    aggregator.part(f"segment_{i}", end - start),
+                )
+            )
+        # 输出格式没有默认音频编码时，与原命令一样不输出音频
+        audio_file = None
+        if info.has_audio and encoders[1]:
+            audio_file = intermediate_file(work_dir, "audio", command)
+            tasks.append(
+                (
+                    audio_command(command, audio_file),
+                    aggregator.part("audio", duration, duration * AUDIO_WEIGHT),
+                )
+            )
+        mux_progress = aggregator.part("mux", duration, duration * MUX_WEIGHT)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    run_ffmpeg_command,
+                    task_command,
+                    callback,
+                    log=log,
+                    on_start=on_start,
+                )
+                for task_command, callback in tasks
+            ]
+            returncodes = [future.result() for future in futures]
+        failed = [returncode for returncode in returncodes if returncode != 0]
+        if failed:
+            return failed[0]
+
+        # 拼接视频片段并与音频、元数据一起封装
+        list_file = os.path.join(work_dir, "segments.txt")
+        write_concat_list(segment_files, list_file)
+        mux_command = build_mux_command(command, list_file, audio_file)
+        return run_ffmpeg_command(mux_command, mux_progress, log=log, on_start=on_start)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
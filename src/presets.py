@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import shlex
+import functools
+import threading
+from utils import DATA_DIR
+
+PRESET_FILE = os.path.join(DATA_DIR, "presets.json")
+# 预设命令中的输入文件占位符，按此顺序依次选择文件
+PLACEHOLDERS = ["[视频]", "[音频]", "[媒体]", "[字幕]"]
+OUTPUT_PLACEHOLDER = "[输出]"
+_ALL_PLACEHOLDERS = PLACEHOLDERS + [OUTPUT_PLACEHOLDER]
+_PLACEHOLDER_PATTERN = re.compile(
+    "(" + "|".join(re.escape(placeholder) for placeholder in _ALL_PLACEHOLDERS) + ")"
+)
+# 编译后的模板中输出文件的槽位
+_OUTPUT_SLOT = -1
+# 丢弃输出的写法，只做分析（如 -f null -）的预设不需要输出文件占位符
+DISCARD_OUTPUTS = ("-", "pipe:", "pipe:1", "NUL", "/dev/null")
+# 缓存的编译模板数量
+TEMPLATE_CACHE_SIZE = 256
+# 日志条目超过该数量（且超过预设数量）时合并写回预设文件
+JOURNAL_COMPACT_SIZE = 100
+
+
+class PresetStore(object):
+    """
+    预设存储，按 key 索引，修改只追加到日志文件，不重写整个预设文件。
+
+    presets.json 保存按显示顺序排列的预设列表，presets.journal 每行记录一次修改，
+    日志条目过多时合并写回 presets.json。第一次访问时才读取文件。
+    key 在预设的整个生命周期中保持不变，移动和删除不会改变其他预设的 key。
+    """
+
+    def __init__(self, preset_file=PRESET_FILE):
+        self.preset_file = preset_file
+        self.journal_file = os.path.splitext(preset_file)[0] + ".journal"
+        self._presets = None
+        self._order = None
+        self._journal_size = 0
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._presets is not None:
+            return
+        presets = []
+        if os.path.exists(self.preset_file):
+            with open(self.preset_file, "r", encoding="utf-8") as f:
+                presets = json.load(f)
+        self._presets = {preset["key"]: preset for preset in presets}
+        self._order = [preset["key"] for preset in presets]
+
+        # 重放日志。每个条目以换行符结尾，最后一个换行符之后是崩溃时未写完的条目，跳过；
+        # 按字节读取，未写完的条目可能截断在多字节字符中间
+        self._journal_size = 0
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "rb") as f:
+                lines = f.read().split(b"\n")
+            for line in lines[:-1]:
+                self._apply(json.loads(line))
+                self._journal_size += 1
+
+    def _apply(self, entry):
+        # 日志条目均为幂等操作，合并过程中崩溃后重放也能得到相同结果
+        op = entry["op"]
+        if op == "put":
+            preset = entry["preset"]
+            if preset["key"] not in self._presets:
+                self._order.append(preset["key"])
+            self._presets[preset["key"]] = preset
+        elif op == "delete":
+            if self._presets.pop(entry["key"], None) is not None:
+                self._order.remove(entry["key"])
+        elif op == "move":
+            if entry["key"] in self._presets:
+                self._order.remove(entry["key"])
+                self._order.insert(entry["index"], entry["key"])
+
+    def _write(self, entry):
+        self._apply(entry)
+        data_dir = os.path.dirname(self.journal_file)
+        if data_dir and not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        self._truncate_torn_entry()
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_size += 1
+        if self._journal_size > max(JOURNAL_COMPACT_SIZE, len(self._presets)):
+            self.compact()
+
+    def _truncate_torn_entry(self):
+        # 崩溃时最后一个条目可能没有写完，追加前截断到最后一个换行符，否则新条目会与它连成一行
+        try:
+            f = open(self.journal_file, "rb+")
+        except FileNotFoundError:
+            return
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            f.truncate(f.read().rfind(b"\n") + 1)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """
+        把日志合并写回预设文件。先原子替换预设文件，再清空日志。
+        """
+        with self._lock:
+            self._load()
+            data_dir = os.path.dirname(self.preset_file)
+            if data_dir and not os.path.exists(data_dir):
+                os.makedirs(data_dir)
+            temp_file = self.preset_file + ".tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(list(self), f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.preset_file)
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self._journal_size = 0
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._order)
+
+    def __iter__(self):
+        # 按显示顺序返回预设
+        with self._lock:
+            self._load()
+            presets = [self._presets[key] for key in self._order]
+        return iter(presets)
+
+    def get(self, key):
+        with self._lock:
+            self._load()
+            return self._presets.get(key)
+
+    def add(self, command, description, output_type):
+        with self._lock:
+            self._load()
+            preset = {
+                "key": max(self._presets, default=0) + 1,
+                "command": command,
+                "description": description,
+                "output_type": output_type,
+            }
+            self._write({"op": "put", "preset": preset})
+            return preset
+
+    def update(self, key, command, description, output_type):
+        with self._lock:
+            self._load()
+            preset = {
+                "key": key,
+                "command": command,
+                "description": description,
+                "output_type": output_type,
+            }
+            self._write({"op": "put", "preset": preset})
+            return preset
+
+    def delete(self, key):
+        with self._lock:
+            self._load()
+            if key in self._presets:
+                self._write({"op": "delete", "key": key})
+
+    def move(self, key, direction):
+        """
+        把预设上移（direction 为 -1）或下移（direction 为 1），返回新位置；无法移动时返回 None。
+        """
+        with self._lock:
+            self._load()
+            if key not in self._presets:
+                return None
+            index = self._order.index(key) + direction
+            if index < 0 or index >= len(self._order):
+                return None
+            self._write({"op": "move", "key": key, "index": index})
+            return index
+
+
+_preset_store = None
+_preset_store_lock = threading.Lock()
+
+
+def get_preset_store():
+    global _preset_store
+    with _preset_store_lock:
+        if _preset_store is None:
+            _preset_store = PresetStore()
+        return _preset_store
+
+
+def split_command(text):
+    """
+    把命令字符串拆分为参数列表，支持用引号包含空格；反斜杠按普通字符处理，兼容 Windows 路径。
+    """
+    lexer = shlex.shlex(text, posix=True)
+    lexer.whitespace_split = True
+    lexer.escape = ""
+    # "#" 不作为注释，滤镜中的颜色（如 color=#ff0000）原样保留
+    lexer.commenters = ""
+    return list(lexer)
+
+
+def join_command(command):
+    # split_command 的逆操作，含空格或引号的参数加引号
+    parts = []
+    for arg in command:
+        if arg and not any(char.isspace() or char in "'\"" for char in arg):
+            parts.append(arg)
+        elif '"' not in arg:
+            parts.append(f'"{arg}"')
+        else:
+            parts.append("'" + arg.replace("'", "'\"'\"'") + "'")
+    return " ".join(parts)
+
+
+class PresetTemplate(object):
+    """
+    编译后的预设命令：占位符在编译时解析为槽位，生成命令时不再搜索和替换字符串。
+
+    输入槽位的顺序与选择文件的顺序一致：先按 PLACEHOLDERS 中的类型顺序，
+    同一类型再按在命令中出现的顺序。
+    """
+
+    def __init__(self, command):
+        self.command = list(command)
+        occurrences = []
+        # 每个参数编译为字符串（不含占位符）或由字符串和槽位组成的列表
+        self._parts = []
+        for arg in self.command:
+            pieces = [piece for piece in _PLACEHOLDER_PATTERN.split(arg) if piece]
+            if len(pieces) == 1 and pieces[0] not in _ALL_PLACEHOLDERS:
+                self._parts.append(arg)
+                continue
+            compiled = []
+            for piece in pieces:
+                if piece == OUTPUT_PLACEHOLDER:
+                    compiled.append(_OUTPUT_SLOT)
+                elif piece in PLACEHOLDERS:
+                    compiled.append(len(occurrences))
+                    occurrences.append(piece)
+                else:
+                    compiled.append(piece)
+            self._parts.append(compiled)
+
+        # 把出现顺序映射为选择文件的顺序
+        order = sorted(
+            range(len(occurrences)),
+            key=lambda i: (PLACEHOLDERS.index(occurrences[i]), i),
+        )
+        slot_of = {occurrence: slot for slot, occurrence in enumerate(order)}
+        for compiled in self._parts:
+            if isinstance(compiled, list):
+                for i, piece in enumerate(compiled):
+                    if isinstance(piece, int) and piece != _OUTPUT_SLOT:
+                        compiled[i] = slot_of[piece]
+        self.file_types = [occurrences[i].strip("[]") for i in order]
+        self.has_output = any(
+            isinstance(compiled, list) and _OUTPUT_SLOT in compiled
+            for compiled in self._parts
+        )
+        self.discards_output = bool(self.command) and (
+            self.command[-1] in DISCARD_OUTPUTS
+            or any(
+                arg == "-f" and value == "null"
+                for arg, value in zip(self.command, self.command[1:])
+            )
+        )
+
+    def validate(self):
+        # 检查预设命令是否可以运行，不能运行时抛出 ValueError
+        if not self.command:
+            raise ValueError("预设命令为空")
+        if not self.has_output and not self.discards_output:
+            raise ValueError(f"预设命令中缺少输出文件占位符 {OUTPUT_PLACEHOLDER}")
+
+    def output_files(self, output_file):
+        # 命令实际写入的输出文件，丢弃输出的预设不写入 output_file
+        return [output_file] if self.has_output else []
+
+    def fill(self, file_paths, output_file):
+        """
+        生成实际运行的命令列表。
+
+        :param file_paths: 与 file_types 一一对应的输入文件路径
+        :param output_file: 输出文件路径
+        """
+        if len(file_paths) != len(self.file_types):
+            raise ValueError(
+                f"预设需要 {len(self.file_types)} 个输入文件，实际为 {len(file_paths)} 个"
+            )
+        values = list(file_paths)
+        values.append(output_file)  # 对应 _OUTPUT_SLOT（-1）
+        command = []
+        for compiled in self._parts:
+            if isinstance(compiled, str):
+                command.append(compiled)
+            else:
+                command.append(
+                    "".join(
+                        values[piece] if isinstance(piece, int) else piece
+                        for piece in compiled
+                    )
+                )
+        return command
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _compile_command(command):
+    return PresetTemplate(command)
+
+
+def compile_preset(preset):
+    # 相同的命令只编译一次
+    return _compile_command(tuple(preset["command"]))
+
+
+def preset_output_extension(output_type, input_file):
+    # 如果 output_type 是 keep，则使用输入文件的扩展名
+    if output_type == "keep":
+        return os.path.splitext(input_file)[1]
+    return f".{output_type}"
@@ -0,0 +1,118 @@
+import io
+import subprocess
+import threading
+from collections import OrderedDict
+from thumbnails import read_ppm_frames
+from utils import probe
+
+# 预览图高度（像素）
+PREVIEW_HEIGHT = 180
+# 内存中缓存的预览帧数量
+PREVIEW_CACHE_SIZE = 64
+# 拖动滑杆时停顿多久（毫秒）后才解码预览帧
+PREVIEW_DELAY_MS = 80
+
+
+def decode_frame(file_path, seconds, height=PREVIEW_HEIGHT):
+    """
+    解码指定时间的一帧，返回 PPM 图像数据，失败时返回 None。
+
+    -ss 放在输入前：先快速定位到之前的关键帧，再向后解码到目标时间，结果是帧准确的。
+    """
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-ss",
+        f"{max(seconds, 0):.3f}",
+        "-i",
+        file_path,
+        "-map",
+        "0:v:0",
+        "-frames:v",
+        "1",
+        "-vf",
+        f"scale=-2:{height}",
+        "-f",
+        "image2pipe",
+        "-c:v",
+        "ppm",
+        "pipe:1",
+    ]
+    try:
+        result = subprocess.run(
+            command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        return None
+    for frame in read_ppm_frames(io.BytesIO(result.stdout)):
+        return frame
+    return None
+
+
+class FramePreview(object):
+    """
+    拖动滑动条时的预览帧解码器。
+
+    同一时间最多运行一个 FFmpeg 进程：解码期间的新请求只保留最后一个，
+    解码完成后再处理。解码结果按帧号缓存在 LRU 缓存中。
+
+    :param file_path: 媒体文件路径
+    :param on_frame: 解码完成时的回调 on_frame(秒数, PPM 数据)，在工作线程中调用
+    """
+
+    def __init__(
+        self, file_path, on_frame, height=PREVIEW_HEIGHT, cache_size=PREVIEW_CACHE_SIZE
+    ):
+        self.file_path = file_path
+        self.on_frame = on_frame
+        self.height = height
+        self.cache_size = cache_size
+        info = probe(file_path)
+        self.frame_rate = (info.frame_rate if info else None) or 25
+        self._cache = OrderedDict()
+        self._pending = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _cache_key(self, seconds):
+        # 同一帧内的时间使用同一个缓存项
+        return int(seconds * self.frame_rate)
+
+    def request(self, seconds):
+        """
+        请求预览指定时间的帧，命中缓存时直接回调。
+        """
+        key = self._cache_key(seconds)
+        with self._lock:
+            frame = self._cache.get(key)
+            if frame is not None:
+                self._cache.move_to_end(key)
+            else:
+                self._pending = seconds
+                if self._running:
+                    return
+                self._running = True
+        if frame is not None:
+            self.on_frame(seconds, frame)
+            return
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                seconds = self._pending
+                self._pending = None
+                if seconds is None:
+                    self._running = False
+                    return
+            key = self._cache_key(seconds)
+            frame = decode_frame(self.file_path, key / self.frame_rate, self.height)
+            if frame is None:
+                continue
+            with self._lock:
+                self._cache[key] = frame
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            self.on_frame(seconds, frame)
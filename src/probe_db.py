@@ -0,0 +1,221 @@
+import os
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import DATA_DIR, MEDIA_EXTENSIONS, MediaInfo, run_ffprobe
+
+PROBE_DB_FILE = os.path.join(DATA_DIR, "probe.db")
+# 扫描文件夹时每批写入数据库的条目数
+SCAN_BATCH_SIZE = 100
+
+
+class ProbeDatabase(object):
+    """
+    持久化的探测结果数据库，按路径索引，文件大小、修改时间或 inode 变化后失效。
+    """
+
+    def __init__(self, db_file=PROBE_DB_FILE):
+        db_dir = os.path.dirname(db_file)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS media ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                "inode INTEGER, info TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS keyframes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                "inode INTEGER, times TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS waveforms ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                "inode INTEGER, peaks BLOB)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS estimates ("
+                "path TEXT, settings TEXT, size INTEGER, mtime INTEGER, "
+                "inode INTEGER, result TEXT, PRIMARY KEY (path, settings))"
+            )
+
+    def get(self, path, size, mtime, inode):
+        # 返回仍然有效的 MediaInfo，不存在或已失效时返回 None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, inode, info FROM media WHERE path = ?",
+                (path,),
+            ).fetchone()
+        if row is None or tuple(row[:3]) != (size, mtime, inode):
+            return None
+        data = json.loads(row[3])
+        # 旧版本的记录没有 start_time，重新探测
+        if "start_time" not in data:
+            return None
+        return MediaInfo.from_dict(data)
+
+    def put_many(self, items):
+        # items 为 (inode, MediaInfo) 列表
+        rows = [
+            (
+                info.path,
+                info.size,
+                info.mtime,
+                inode,
+                json.dumps(info.to_dict(), ensure_ascii=False),
+            )
+            for inode, info in items
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO media (path, size, mtime, inode, info) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def put(self, info, inode):
+        self.put_many([(inode, info)])
+
+    def get_keyframes(self, path, size, mtime, inode):
+        # 返回仍然有效的关键帧时间列表，不存在或已失效时返回 None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, inode, times FROM keyframes WHERE path = ?",
+                (path,),
+            ).fetchone()
+        if row is None or tuple(row[:3]) != (size, mtime, inode):
+            return None
+        return json.loads(row[3])
+
+    def put_keyframes(self, path, size, mtime, inode, times):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO keyframes (path, size, mtime, inode, times) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime, inode, json.dumps(times)),
+            )
+
+    def get_waveform(self, path, size, mtime, inode):
+        # 返回仍然有效的波形峰值数据（bytes），不存在或已失效时返回 None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, inode, peaks FROM waveforms WHERE path = ?",
+                (path,),
+            ).fetchone()
+        if row is None or tuple(row[:3]) != (size, mtime, inode):
+            return None
+        return bytes(row[3])
+
+    def put_waveform(self, path, size, mtime, inode, peaks):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO waveforms (path, size, mtime, inode, peaks) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime, inode, sqlite3.Binary(peaks)),
+            )
+
+    def get_estimate(self, path, settings, size, mtime, inode):
+        # 返回仍然有效的耗时和大小估算（dict），不存在或已失效时返回 None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, inode, result FROM estimates "
+                "WHERE path = ? AND settings = ?",
+                (path, settings),
+            ).fetchone()
+        if row is None or tuple(row[:3]) != (size, mtime, inode):
+            return None
+        return json.loads(row[3])
+
+    def put_estimate(self, path, settings, size, mtime, inode, result):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO estimates "
+                "(path, settings, size, mtime, inode, result) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, settings, size, mtime, inode, json.dumps(result)),
+            )
+
+    def valid_keys(self, folder):
+        # 返回文件夹下已记录条目的 {路径: (大小, 修改时间, inode)}
+        prefix = os.path.join(os.path.abspath(folder), "")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime, inode FROM media "
+                "WHERE path >= ? AND path < ?",
+                (prefix, prefix + "\uffff"),
+            ).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_probe_db = None
+_probe_db_lock = threading.Lock()
+
+
+def get_probe_db():
+    global _probe_db
+    with _probe_db_lock:
+        if _probe_db is None:
+            _probe_db = ProbeDatabase()
+        return _probe_db
+
+
+def scan_folder(folder, recursive=True, max_workers=None, on_progress=None):
+    """
+    批量探测文件夹中的媒体文件并写入数据库，已记录且未变化的文件会被跳过。
+
+    :param folder: 要扫描的文件夹
+    :param recursive: 是否包含子文件夹
+    :param max_workers: 同时运行的 ffprobe 进程数，默认与 CPU 核心数相同
+    :param on_progress: 进度回调，参数为 (已完成数, 待探测总数)
+    :return: 新探测的文件数
+    """
+    db = get_probe_db()
+    known = db.valid_keys(folder)
+
+    pending = []
+    for dir_path, dir_names, file_names in os.walk(folder):
+        if not recursive:
+            dir_names.clear()
+        for file_name in file_names:
+            if not file_name.lower().endswith(MEDIA_EXTENSIONS):
+                continue
+            path = os.path.abspath(os.path.join(dir_path, file_name))
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            if known.get(path) != key:
+                pending.append((path, key))
+
+    total = len(pending)
+    done = 0
+    batch = []
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = {
+            executor.submit(run_ffprobe, path, size, mtime): inode
+            for path, (size, mtime, inode) in pending
+        }
+        for future in as_completed(futures):
+            info = future.result()
+            if info is not None:
+                batch.append((futures[future], info))
+            if len(batch) >= SCAN_BATCH_SIZE:
+                db.put_many(batch)
+                batch = []
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+    if batch:
+        db.put_many(batch)
+    return total
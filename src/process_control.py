@@ -0,0 +1,80 @@
+import os
+import signal
+import subprocess
+
+# 取消时等待 FFmpeg 响应 "q" 的时间（秒），超时后强制结束
+GRACEFUL_TIMEOUT = 5
+
+
+def popen_kwargs():
+    """
+    让 FFmpeg 运行在单独的进程组中：可以整体暂停和结束，也不会收到终端的 Ctrl+C。
+    """
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def can_suspend():
+    # Windows 没有 SIGSTOP，需要 psutil 才能暂停进程
+    if os.name != "nt":
+        return True
+    try:
+        import psutil  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _signal_process(process, sig, psutil_method):
+    if process.poll() is not None:
+        return False
+    try:
+        if os.name == "nt":
+            import psutil
+
+            getattr(psutil.Process(process.pid), psutil_method)()
+        else:
+            os.killpg(process.pid, sig)
+        return True
+    except Exception:
+        # 没有 psutil 或进程已经结束
+        return False
+
+
+def suspend_process(process):
+    # 暂停进程组，返回是否成功
+    return _signal_process(process, getattr(signal, "SIGSTOP", None), "suspend")
+
+
+def resume_process(process):
+    # 恢复暂停的进程组，返回是否成功
+    return _signal_process(process, getattr(signal, "SIGCONT", None), "resume")
+
+
+def stop_process(process, graceful=True, timeout=GRACEFUL_TIMEOUT):
+    """
+    结束 FFmpeg 进程：先通过 stdin 发送 "q" 让 FFmpeg 正常收尾，超时后强制结束整个进程组。
+
+    :param graceful: 为 False 时直接强制结束
+    """
+    if process.poll() is not None:
+        return
+    # 暂停中的进程无法响应 "q"
+    resume_process(process)
+    if graceful and process.stdin:
+        try:
+            process.stdin.write("q\n")
+            process.stdin.flush()
+            process.wait(timeout)
+            return
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            pass
+    try:
+        if os.name == "nt":
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    process.wait()
@@ -0,0 +1,214 @@
+import re
+import threading
+
+# FFmpeg -progress 输出为 key=value 行，每个块以 progress=continue/end 结束
+PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats"]
+
+_duration_pattern = re.compile(r"Duration: (\d+):(\d+):(\d+\.\d+)")
+
+
+class ProgressEvent(object):
+    """
+    FFmpeg 的一次进度报告。
+
+    :param frame: 已输出的帧数
+    :param fps: 当前编码速度（帧/秒）
+    :param out_time: 已输出的时长（秒）
+    :param total_size: 已写入的字节数
+    :param speed: 相对实时的处理倍速，未知时为 None
+    :param bitrate: 当前码率（kbit/s），未知时为 None
+    :param total_seconds: 输出的总时长（秒），未知时为 None
+    :param finished: 是否为最后一次报告
+    """
+
+    __slots__ = (
+        "frame",
+        "fps",
+        "out_time",
+        "total_size",
+        "speed",
+        "bitrate",
+        "total_seconds",
+        "finished",
+    )
+
+    def __init__(
+        self,
+        frame=0,
+        fps=0.0,
+        out_time=0.0,
+        total_size=0,
+        speed=None,
+        bitrate=None,
+        total_seconds=None,
+        finished=False,
+    ):
+        self.frame = frame
+        self.fps = fps
+        self.out_time = out_time
+        self.total_size = total_size
+        self.speed = speed
+        self.bitrate = bitrate
+        self.total_seconds = total_seconds
+        self.finished = finished
+
+    @property
+    def percent(self):
+        if self.finished:
+            return 100.0
+        if not self.total_seconds:
+            return None
+        return min(self.out_time / self.total_seconds * 100, 100.0)
+
+    @property
+    def remaining_seconds(self):
+        # 根据处理倍速估算剩余时间
+        if not self.total_seconds or not self.speed:
+            return None
+        return max(self.total_seconds - self.out_time, 0) / self.speed
+
+    def __repr__(self):
+        return (
+            f"ProgressEvent(frame={self.frame}, out_time={self.out_time:.2f}, "
+            f"total_seconds={self.total_seconds}, speed={self.speed}, "
+            f"finished={self.finished})"
+        )
+
+
+def _parse_float(value, suffix=""):
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[: -len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None  # N/A
+
+
+def _parse_out_time(fields):
+    # out_time_ms 在 FFmpeg 中实际也是微秒
+    for key in ("out_time_us", "out_time_ms"):
+        value = fields.get(key)
+        if value and value != "N/A":
+            try:
+                return max(int(value), 0) / 1000000
+            except ValueError:
+                pass
+    value = fields.get("out_time")
+    if value and value != "N/A":
+        h, m, s = value.split(":")
+        return max(int(h) * 3600 + int(m) * 60 + float(s), 0.0)
+    return None
+
+
+class ProgressParser(object):
+    """
+    增量解析 FFmpeg -progress 输出，每读完一个块生成一个 ProgressEvent。
+    """
+
+    def __init__(self, total_seconds=None):
+        self.total_seconds = total_seconds
+        self._fields = {}
+        self._out_time = 0.0
+
+    def feed(self, line):
+        # 返回完整块对应的 ProgressEvent，块未结束时返回 None
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        if key != "progress":
+            self._fields[key] = value
+            return None
+
+        fields = self._fields
+        self._fields = {}
+        # 结束时 out_time 可能为 N/A，沿用上一次的值
+        out_time = _parse_out_time(fields)
+        if out_time is not None:
+            self._out_time = out_time
+        return ProgressEvent(
+            frame=int(_parse_float(fields.get("frame", "0")) or 0),
+            fps=_parse_float(fields.get("fps", "0")) or 0.0,
+            out_time=self._out_time,
+            total_size=int(_parse_float(fields.get("total_size", "0")) or 0),
+            speed=_parse_float(fields.get("speed", "N/A"), "x") or None,
+            bitrate=_parse_float(fields.get("bitrate", "N/A"), "kbits/s"),
+            total_seconds=self.total_seconds,
+            finished=value == "end",
+        )
+
+
+def add_progress_args(command):
+    # 在可执行文件之后插入 -progress 参数，已包含时保持不变
+    if "-progress" in command:
+        return list(command)
+    return command[:1] + PROGRESS_ARGS + command[1:]
+
+
+def parse_duration_line(line):
+    # 从 FFmpeg 日志行中解析输入总时长（秒）
+    if "Duration:" not in line:
+        return None
+    match = _duration_pattern.search(line)
+    if match:
+        h, m, s = match.groups()
+        return int(h) * 3600 + int(m) * 60 + float(s)
+    return None
+
+
+class ProgressAggregator(object):
+    """
+    把多个步骤或片段的进度合并为一个总进度。
+
+    :param total_seconds: 总进度对应的时长（秒）
+    :param on_progress: 总进度回调，参数为 ProgressEvent
+    """
+
+    def __init__(self, total_seconds, on_progress=None):
+        self.total_seconds = total_seconds
+        self.on_progress = on_progress
+        self._parts = {}
+        self._events = {}  # 各步骤最近一次的 ProgressEvent
+        self._lock = threading.Lock()
+
+    def part(self, name, seconds, weight=None):
+        """
+        登记一个步骤，返回该步骤的进度回调。
+
+        :param name: 步骤名称
+        :param seconds: 该步骤输出的时长（秒）
+        :param weight: 该步骤在总进度中的权重，默认与 seconds 相同
+        """
+        with self._lock:
+            self._parts[name] = [0.0, seconds, seconds if weight is None else weight]
+
+        def callback(event):
+            with self._lock:
+                part = self._parts[name]
+                if event.finished:
+                    part[0] = 1.0
+                elif part[1]:
+                    part[0] = min(event.out_time / part[1], 1.0)
+                self._events[name] = event
+                aggregated = self._aggregate()
+            if self.on_progress:
+                self.on_progress(aggregated)
+
+        return callback
+
+    def _aggregate(self):
+        total_weight = sum(part[2] for part in self._parts.values()) or 1
+        done = sum(part[0] * part[2] for part in self._parts.values())
+        running = [
+            event
+            for name, event in self._events.items()
+            if not event.finished and self._parts[name][0] < 1.0
+        ]
+        return ProgressEvent(
+            frame=sum(event.frame for event in self._events.values()),
+            fps=sum(event.fps for event in running),
+            out_time=done / total_weight * (self.total_seconds or 0),
+            total_size=sum(event.total_size for event in self._events.values()),
+            speed=sum(event.speed or 0 for event in running) or None,
+            total_seconds=self.total_seconds,
+        )
@@ -0,0 +1,278 @@
+import os
+import json
+import math
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ffmpeg_utils import run_ffmpeg_command, write_concat_list
+from parallel_encode import (
+    AUDIO_WEIGHT,
+    MUX_WEIGHT,
+    audio_command,
+    build_mux_command,
+    can_split,
+    input_index,
+    intermediate_file,
+    plan_segments,
+    resolve_encoders,
+    segment_command,
+)
+from progress import ProgressAggregator, ProgressEvent
+from thread_budget import apply_threads
+from utils import DATA_DIR, file_key, probe
+
+# 断点续传的日志和已完成的片段保存在这里，重启后仍然存在
+RESUME_DIR = os.path.join(DATA_DIR, "resume")
+# 每个片段的目标时长（秒），中断后最多重新编码这么长
+RESUME_SEGMENT_SECONDS = 300
+
+
+def journal_key(command, encoders):
+    # 同一条命令（相同的输入、参数和输出）且实际使用相同的编码器时对应同一份日志，
+    # 更换 FFmpeg 后默认编码器可能不同，已完成的片段不能再与新的片段拼接
+    data = json.dumps([command, list(encoders)])
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class EncodeJournal(object):
+    """
+    断点续传编码的日志：记录命令、输入文件的状态、片段划分和已完成的步骤。
+
+    每完成一个步骤就整体重写一次日志（先写临时文件再重命名），崩溃后日志总是完整的。
+
+    :param command: 原始的 FFmpeg 命令
+    :param encoders: 输出实际使用的 (视频编码器, 音频编码器)，见 resolve_encoders
+    """
+
+    def __init__(self, command, encoders):
+        self.command = command
+        self.encoders = list(encoders)
+        key = journal_key(command, encoders)
+        self.path = os.path.join(RESUME_DIR, key + ".json")
+        self.work_dir = os.path.join(RESUME_DIR, key)
+        self.input_key = None
+        self.segments = []
+        self.done = set()
+        self._lock = threading.Lock()
+
+    @property
+    def input_file(self):
+        return self.command[input_index(self.command) + 1]
+
+    def load(self):
+        """
+        读取已有的日志，返回是否可以继续。输入文件变化（大小、修改时间）后日志失效。
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            input_key = list(file_key(self.input_file))
+        except (OSError, ValueError):
+            return False
+        if (
+            data.get("command") != self.command
+            or data.get("encoders") != self.encoders
+            or data.get("input") != input_key
+        ):
+            return False
+        self.input_key = input_key
+        self.segments = [tuple(segment) for segment in data["segments"]]
+        # 只信任文件仍然存在的步骤
+        self.done = {
+            name
+            for name in data["done"]
+            if os.path.exists(os.path.join(self.work_dir, name))
+        }
+        return True
+
+    def start(self, segments):
+        # 开始新的编码，清除旧的片段
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        os.makedirs(self.work_dir)
+        self.input_key = list(file_key(self.input_file))
+        self.segments = segments
+        self.done = set()
+        self._save()
+
+    def mark_done(self, name):
+        with self._lock:
+            self.done.add(name)
+            self._save()
+
+    def _save(self):
+        data = {
+            "command": self.command,
+            "encoders": self.encoders,
+            "input": self.input_key,
+            "segments": self.segments,
+            "done": sorted(self.done),
+        }
+        temp_file = self.path + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+
+    def remove(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def pending_encodes():
+    """
+    返回所有未完成的断点续传编码，每项为 (命令, 已完成的片段数, 总片段数)。
+    """
+    result = []
+    if not os.path.isdir(RESUME_DIR):
+        return result
+    for file_name in sorted(os.listdir(RESUME_DIR)):
+        if not file_name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(RESUME_DIR, file_name), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        done = [name for name in data["done"] if name.startswith("segment_")]
+        result.append((data["command"], len(done), len(data["segments"])))
+    return result
+
+
+def run_resumable_encode(
+    command,
+    on_progress=None,
+    log=None,
+    threads=None,
+    on_start=None,
+    workers=1,
+    is_cancelled=None,
+):
+    """
+    断点续传编码：在关键帧处把输入切分为约 RESUME_SEGMENT_SECONDS 秒的片段依次编码，
+    每完成一段记录到 data/resume 下的日志中，最后无损拼接。
+
+    同一条命令再次运行时（崩溃、重启或取消之后）跳过已完成的片段，只编码剩下的部分。
+    片段和音频写入与输出相同的封装格式，日志按命令和实际使用的编码器区分。
+    编码成功后删除日志和片段。命令无法分段（见 run_parallel_encode）时按原命令执行。
+    返回最后一个执行的 FFmpeg 进程的返回码。
+
+    :param command: build_command 生成的命令，最后一个参数为输出文件
+    :param threads: 编码使用的线程数，默认为 CPU 核心数
+    :param workers: 同时编码的片段数，大于 1 时与分段并行编码相同
+    :param is_cancelled: 返回任务是否已取消的函数；取消时 FFmpeg 正常退出，
+        此时的片段不完整，不能记为已完成
+    """
+    threads = threads or os.cpu_count() or 1
+    encoders = resolve_encoders(command) if can_split(command) else None
+    input_file = command[input_index(command) + 1] if encoders else None
+    info = probe(input_file) if input_file else None
+    if info is None or not info.has_video or not info.duration or encoders[0] is None:
+        return run_ffmpeg_command(
+            apply_threads(command, threads, [command[-1]]),
+            on_progress,
+            log=log,
+            on_start=on_start,
+        )
+
+    if not os.path.exists(RESUME_DIR):
+        os.makedirs(RESUME_DIR)
+    journal = EncodeJournal(command, encoders)
+    if journal.load():
+        if log is not None:
+            log.append(f"从断点继续编码，已完成 {len(journal.done)} 个步骤")
+    else:
+        count = max(1, math.ceil(info.duration / RESUME_SEGMENT_SECONDS))
+        journal.start(plan_segments(input_file, count))
+
+    duration = info.duration
+    segment_threads = max(1, threads // workers)
+    aggregator = ProgressAggregator(duration, on_progress)
+    tasks = []
+    segment_files = []
+    for i, (start, end) in enumerate(journal.segments):
+        segment_file = intermediate_file(journal.work_dir, f"segment_{i}", command)
+        name = os.path.basename(segment_file)
+        segment_files.append(segment_file)
+        tasks.append(
+            (
+                name,
+                lambda path, start=start, end=end: segment_command(
+                    command, start, end, path, segment_threads
+                ),
+                aggregator.part(name, end - start),
+            )
+        )
+    audio_file = None
+    if info.has_audio and encoders[1]:
+        audio_file = intermediate_file(journal.work_dir, "audio", command)
+        name = os.path.basename(audio_file)
+        tasks.append(
+            (
+                name,
+                lambda path: audio_command(command, path),
+                aggregator.part(name, duration, duration * AUDIO_WEIGHT),
+            )
+        )
+    mux_progress = aggregator.part("mux", duration, duration * MUX_WEIGHT)
+
+    def run_task(name, build_command, callback):
+        if name in journal.done:
+            callback(ProgressEvent(finished=True))
+            return 0
+        # 先写入临时文件，完成后再重命名，中断时不会留下看似完整的片段
+        temp_file = os.path.join(journal.work_dir, "partial_" + name)
+        returncode = run_ffmpeg_command(
+            build_command(temp_file), callback, log=log, on_start=on_start
+        )
+        if returncode != 0 or (is_cancelled and is_cancelled()):
+            return returncode or 1
+        os.replace(temp_file, os.path.join(journal.work_dir, name))
+        journal.mark_done(name)
+        return 0
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_task, *task) for task in tasks]
+            returncodes = [future.result() for future in futures]
+    else:
+        returncodes = []
+        for task in tasks:
+            returncodes.append(run_task(*task))
+            if returncodes[-1] != 0:
+                break
+    failed = [returncode for returncode in returncodes if returncode != 0]
+    if failed:
+        # 保留日志和已完成的片段，下次从这里继续
+        return failed[0]
+
+    list_file = os.path.join(journal.work_dir, "segments.txt")
+    write_concat_list(segment_files, list_file)
+    returncode = run_ffmpeg_command(
+        build_mux_command(command, list_file, audio_file),
+        mux_progress,
+        log=log,
+        on_start=on_start,
+    )
+    if returncode == 0 and not (is_cancelled and is_cancelled()):
+        journal.remove()
+    return returncode
+
+
+def resumable_target(command, workers=1):
+    """
+    返回运行断点续传编码的任务执行函数，用作 Job 的 target。
+    """
+    return lambda job: run_resumable_encode(
+        command,
+        job.report_progress,
+        job.log,
+        job.threads,
+        job.process_started,
+        workers,
+        lambda: job.cancelled,
+    )
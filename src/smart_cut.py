@@ -0,0 +1,234 @@
+import os
+import shutil
+import tempfile
+from ffmpeg_utils import run_ffmpeg_command, write_concat_list
+from keyframes import keyframe_at_or_after, keyframe_at_or_before
+from progress import ProgressAggregator
+from utils import probe
+
+# 源视频编码对应的编码器，首尾片段需要用相同的编码重新编码
+VIDEO_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "mpeg4": "mpeg4",
+    "mpeg2video": "mpeg2video",
+    "vp8": "libvpx",
+    "vp9": "libvpx-vp9",
+    "av1": "libaom-av1",
+}
+AUDIO_ENCODERS = {
+    "aac": "aac",
+    "mp3": "libmp3lame",
+    "opus": "libopus",
+    "vorbis": "libvorbis",
+    "flac": "flac",
+    "ac3": "ac3",
+    "alac": "alac",
+}
+H264_PROFILES = {
+    "baseline": "baseline",
+    "constrained baseline": "baseline",
+    "main": "main",
+    "high": "high",
+    "high 10": "high10",
+    "high 4:2:2": "high422",
+    "high 4:4:4 predictive": "high444",
+}
+
+# 首尾片段的重新编码质量
+EDGE_CRF = 18
+# 短于该时长（秒）的首尾片段直接忽略
+MIN_EDGE_SECONDS = 0.01
+# 流复制时的寻址余量（秒），保证定位到目标关键帧而不是前一个
+SEEK_EPSILON = 0.001
+# 流复制和最终封装在总进度中的权重（相对于重新编码）
+COPY_WEIGHT = 0.05
+
+
+def can_smart_cut(info):
+    return info is not None and info.video_codec in VIDEO_ENCODERS
+
+
+def plan_smart_cut(file_path, start, end, start_time=0.0):
+    """
+    规划智能裁剪，返回 [(方式, 开始秒数, 结束秒数)]，方式为 "encode" 或 "copy"。
+
+    start、end 和返回的时间与 -ss 一样从文件开头计数，关键帧的 pts_time 包含容器的开始时间，
+    查找时换算。区间内找不到两个关键帧时返回 None，此时只能整体重新编码。
+
+    :param start_time: 容器的开始时间（秒），即 MediaInfo.start_time
+    """
+    first_keyframe = keyframe_at_or_after(
+        file_path, start + start_time, end + start_time
+    )
+    if first_keyframe is None:
+        return None
+    last_keyframe = keyframe_at_or_before(file_path, end + start_time, first_keyframe)
+    if last_keyframe is None or last_keyframe - first_keyframe < MIN_EDGE_SECONDS:
+        return None
+    first_keyframe -= start_time
+    last_keyframe -= start_time
+
+    pieces = []
+    if first_keyframe - start > MIN_EDGE_SECONDS:
+        pieces.append(("encode", start, first_keyframe))
+    pieces.append(("copy", first_keyframe, last_keyframe))
+    if end - last_keyframe > MIN_EDGE_SECONDS:
+        pieces.append(("encode", last_keyframe, end))
+    return pieces
+
+
+def edge_encode_args(info):
+    # 重新编码的片段需要与流复制的部分参数一致，才能无损拼接
+    video = info.video_stream
+    encoder = VIDEO_ENCODERS[info.video_codec]
+    args = ["-c:v", encoder]
+    if info.pix_fmt:
+        args.extend(["-pix_fmt", info.pix_fmt])
+    profile = H264_PROFILES.get(str(video.get("profile", "")).lower())
+    if encoder == "libx264" and profile:
+        args.extend(["-profile:v", profile])
+    if encoder in ("libx264", "libx265"):
+        args.extend(["-crf", str(EDGE_CRF)])
+    elif video.get("bit_rate"):
+        args.extend(["-b:v", video["bit_rate"]])
+    return args
+
+
+def _segment_extension(info):
+    # H.264/H.265 使用 MPEG-TS，参数集随码流传输，拼接时不依赖文件头
+    if info.video_codec in ("h264", "hevc", "mpeg2video"):
+        return ".ts"
+    return ".mkv"
+
+
+def build_smart_cut_commands(input_file, output_file, start, end, work_dir):
+    """
+    生成智能裁剪的命令列表，元素为 (命令, 输出时长, 进度权重)；无法智能裁剪时返回 None。
+    """
+    info = probe(input_file)
+    if not can_smart_cut(info):
+        return None
+    pieces = plan_smart_cut(input_file, start, end, info.start_time or 0.0)
+    if pieces is None:
+        return None
+
+    steps = []
+    segment_files = []
+    extension = _segment_extension(info)
+    for i, (mode, piece_start, piece_end) in enumerate(pieces):
+        segment_file = os.path.join(work_dir, f"segment_{i}{extension}")
+        segment_files.append(segment_file)
+        if mode == "encode":
+            # 首尾片段保持原始方向，与流复制部分一致
+            command = [
+                "ffmpeg",
+                "-y",
+                "-noautorotate",
+                "-ss",
+                f"{piece_start:.6f}",
+                "-i",
+                input_file,
+                "-t",
+                f"{piece_end - piece_start:.6f}",
+                "-map",
+                "0:v:0",
+                *edge_encode_args(info),
+                segment_file,
+            ]
+            weight = piece_end - piece_start
+        else:
+            command = [
+                "ffmpeg",
+                "-y",
+                "-ss",
+                f"{piece_start + SEEK_EPSILON:.6f}",
+                "-i",
+                input_file,
+                "-t",
+                f"{piece_end - piece_start - 2 * SEEK_EPSILON:.6f}",
+                "-map",
+                "0:v:0",
+                "-c:v",
+                "copy",
+                "-avoid_negative_ts",
+                "make_zero",
+                segment_file,
+            ]
+            weight = (piece_end - piece_start) * COPY_WEIGHT
+        steps.append((command, piece_end - piece_start, weight))
+
+    # 拼接视频片段，音频整体重新编码后一起封装
+    list_file = os.path.join(work_dir, "segments.txt")
+    write_concat_list(segment_files, list_file)
+    command = ["ffmpeg", "-y"]
+    if info.rotation:
+        command.extend(["-display_rotation", str(info.rotation)])
+    command.extend(["-f", "concat", "-safe", "0", "-i", list_file])
+    command.extend(
+        ["-ss", f"{start:.6f}", "-t", f"{end - start:.6f}", "-i", input_file]
+    )
+    command.extend(["-map", "0:v:0", "-map", "1:a?", "-c:v", "copy"])
+    audio_encoder = AUDIO_ENCODERS.get(info.audio_codec)
+    if audio_encoder:
+        command.extend(["-c:a", audio_encoder])
+        if info.audio_bit_rate:
+            command.extend(["-b:a", str(info.audio_bit_rate)])
+    command.extend(["-map_metadata", "1"])
+    if os.path.splitext(input_file)[1].lower() == ".mov":
+        command.extend(["-movflags", "use_metadata_tags"])
+    command.append(output_file)
+    steps.append((command, end - start, (end - start) * COPY_WEIGHT))
+    return steps
+
+
+def run_smart_cut(
+    input_file, output_file, start, end, on_progress=None, log=None, on_start=None
+):
+    """
+    智能裁剪：只重新编码首尾不完整的 GOP，中间部分流复制，最后拼接成一个文件。
+
+    无法智能裁剪时（音频文件、不支持的编码或区间内关键帧不足）整体重新编码。
+    返回最后一个执行的 FFmpeg 进程的返回码。
+    """
+    work_dir = tempfile.mkdtemp(
+        prefix=".smartcut_", dir=os.path.dirname(os.path.abspath(output_file))
+    )
+    try:
+        steps = build_smart_cut_commands(input_file, output_file, start, end, work_dir)
+        if steps is None:
+            steps = [
+                (
+                    [
+                        "ffmpeg",
+                        "-y",
+                        "-ss",
+                        f"{start:.6f}",
+                        "-i",
+                        input_file,
+                        "-t",
+                        f"{end - start:.6f}",
+                        "-map_metadata",
+                        "0",
+                        output_file,
+                    ],
+                    end - start,
+                    end - start,
+                )
+            ]
+
+        aggregator = ProgressAggregator(end - start, on_progress)
+        callbacks = [
+            aggregator.part(i, seconds, weight)
+            for i, (command, seconds, weight) in enumerate(steps)
+        ]
+        returncode = 0
+        for (command, seconds, weight), callback in zip(steps, callbacks):
+            returncode = run_ffmpeg_command(
+                command, callback, log=log, on_start=on_start
+            )
+            if returncode != 0:
+                break
+        return returncode
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
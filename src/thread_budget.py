@@ -0,0 +1,250 @@
+import os
+import re
+from utils import probe
+
+# 按输出高度估算 libx264 能有效利用的线程数，分辨率越低，多线程的收益越早饱和
+HEIGHT_THREADS = (
+    (480, 2),
+    (720, 4),
+    (1080, 6),
+    (1440, 8),
+)
+MAX_VIDEO_THREADS = 12
+# 各编码器相对 libx264 的线程需求，未列出的编码器多线程效率较低
+CODEC_THREAD_FACTORS = {
+    "libx264": 1.0,
+    "libx265": 1.5,
+    "libsvtav1": 1.5,
+}
+OTHER_CODEC_FACTOR = 0.5
+
+
+def available_cpus():
+    # 当前进程允许使用的 CPU 编号
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def set_process_affinity(pid, cpus):
+    """
+    把进程绑定到指定的 CPU 上，返回是否成功。
+
+    Linux 使用 os.sched_setaffinity，其他平台需要安装 psutil，否则不绑定。
+    """
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, cpus)
+            return True
+        import psutil
+
+        psutil.Process(pid).cpu_affinity(list(cpus))
+        return True
+    except Exception:
+        # 没有 psutil、进程已经结束或 CPU 编号无效
+        return False
+
+
+def option_value(command, name):
+    # 返回选项最后一次出现时的值
+    value = None
+    for i, arg in enumerate(command[:-1]):
+        if arg == name:
+            value = command[i + 1]
+    return value
+
+
+def _output_height(command):
+    # 从 -s 或滤镜中的 scale 取输出高度，多个分辨率时取最大的
+    heights = []
+    size = option_value(command, "-s")
+    if size and "x" in size:
+        heights.append(size.split("x")[1])
+    for name in ("-vf", "-filter_complex"):
+        graph = option_value(command, name)
+        if graph:
+            heights.extend(re.findall(r"scale=-?\d+:(\d+)", graph))
+    heights = [int(height) for height in heights if height.isdigit()]
+    if heights:
+        return max(heights)
+
+    input_file = option_value(command, "-i")
+    info = probe(input_file) if input_file else None
+    return info.height if info else None
+
+
+def estimate_threads(command):
+    """
+    按视频编码器和输出分辨率估算一个 FFmpeg 命令能有效利用的线程数。
+
+    不重新编码视频或只处理音频的命令只需要一个线程。
+    """
+    input_file = option_value(command, "-i")
+    info = probe(input_file) if input_file else None
+    codec = option_value(command, "-c:v")
+    if codec == "copy" or "-vn" in command or (info and not info.has_video):
+        return 1
+
+    height = _output_height(command) or 1080
+    threads = MAX_VIDEO_THREADS
+    for max_height, count in HEIGHT_THREADS:
+        if height <= max_height:
+            threads = count
+            break
+    # 未指定编码器时，mp4 等格式默认使用 libx264
+    factor = CODEC_THREAD_FACTORS.get(codec or "libx264", OTHER_CODEC_FACTOR)
+    # 一次解码输出多个分辨率时，每个分辨率各有一个编码器
+    encoders = max(1, sum(1 for arg in command if re.fullmatch(r"\[v\d+\]", arg)))
+    return max(1, min(int(threads * factor * encoders), len(available_cpus())))
+
+
+def output_positions(command, outputs):
+    # 已知的输出文件在命令中的位置，取最后一次出现且不是输入文件的位置；找不到时返回 None
+    positions = []
+    for output_file in outputs:
+        indexes = [
+            i
+            for i, arg in enumerate(command)
+            if i > 0 and arg == output_file and command[i - 1] != "-i"
+        ]
+        if not indexes:
+            return None
+        positions.append(indexes[-1])
+    return sorted(positions)
+
+
+def apply_threads(command, threads, outputs):
+    """
+    在命令中加入线程数选项，返回新的命令列表。
+
+    -threads 只插入在 outputs（生成命令时已知的输出文件）之前，不解析其余参数，
+    因此也适用于包含任意选项的预设命令。没有已知的输出文件、在命令中找不到输出文件
+    或命令中已有 -threads 时不做修改。线程数在所有视频编码器之间平分，滤镜线程数与之相同。
+    """
+    if not command or not outputs or "-threads" in command:
+        return command
+    positions = output_positions(command, outputs)
+    if positions is None:
+        return command
+    encoders = max(1, sum(1 for arg in command if re.fullmatch(r"\[v\d+\]", arg)))
+    per_encoder = str(max(1, threads // encoders))
+    options = ["-threads", per_encoder]
+    if option_value(command, "-c:v") == "libx265" and "-x265-params" not in command:
+        # x265 默认按全部核心创建线程池，不受 -threads 限制
+        options.extend(["-x265-params", f"pools={per_encoder}"])
+
+    result = list(command[:1]) + ["-filter_threads", str(threads)]
+    if "-filter_complex" in command:
+        result.extend(["-filter_complex_threads", str(threads)])
+    last = 1
+    for index in positions:
+        result.extend(command[last:index] + options + [command[index]])
+        last = index + 1
+    result.extend(command[last:])
+    return result
+
+
+class CpuBudget(object):
+    """
+    全局的 CPU 核心预算：每个运行中的任务分到一组核心，线程数等于核心数。
+
+    任务结束后释放的核心先分给排队的任务；没有排队任务且开启了绑定时，
+    借给运行中的任务（扩大它们的 CPU 亲和性），新任务需要时再收回。
+    所有方法都在任务队列的锁内调用。
+
+    :param cpus: 可用的 CPU 编号，默认为当前进程允许使用的全部 CPU
+    :param pin: 是否把 FFmpeg 进程绑定到分到的核心上
+    """
+
+    def __init__(self, cpus=None, pin=False):
+        self.cpus = list(cpus or available_cpus())
+        self.pin = pin
+        self._free = list(self.cpus)
+        self._grants = {}  # job.id -> 任务启动时分到的核心
+        self._lent = {}  # job.id -> 借给运行中任务的核心
+        self._jobs = {}
+
+    @property
+    def total(self):
+        return len(self.cpus)
+
+    @property
+    def free(self):
+        return len(self._free) + sum(len(cpus) for cpus in self._lent.values())
+
+    def fair_share(self, active):
+        # active 个任务同时运行时每个任务应得的核心数
+        return max(1, self.total // max(1, active))
+
+    def acquire(self, job, wanted, force=False):
+        """
+        为任务分配核心，返回分到的核心列表；核心不足时返回 None，任务需要继续排队。
+
+        可用核心不少于需求的一半时即可启动；force 为 True（没有运行中的任务）时总是启动。
+        """
+        wanted = max(1, min(wanted, self.total))
+        if self.free < wanted:
+            if not force and self.free < max(1, wanted // 2):
+                return None
+        self._reclaim(wanted)
+        cpus = self._free[:wanted]
+        del self._free[: len(cpus)]
+        self._grants[job.id] = cpus
+        self._jobs[job.id] = job
+        job.cpus = list(cpus) if self.pin else None
+        return cpus
+
+    def release(self, job):
+        cpus = self._grants.pop(job.id, [])
+        cpus += self._lent.pop(job.id, [])
+        self._jobs.pop(job.id, None)
+        self._free.extend(cpus)
+        self._free.sort()
+
+    def _reclaim(self, wanted):
+        # 从借出的核心中收回，直到空闲核心足够或没有可收回的
+        for job_id in list(self._lent):
+            if len(self._free) >= wanted:
+                break
+            lent = self._lent[job_id]
+            count = min(len(lent), wanted - len(self._free))
+            self._free.extend(lent[len(lent) - count :])
+            del lent[len(lent) - count :]
+            if not lent:
+                del self._lent[job_id]
+            self._update_affinity(job_id)
+        self._free.sort()
+
+    def set_pin(self, pin):
+        # 开启或关闭绑定，运行中的任务立即生效
+        self.pin = pin
+        if not pin:
+            for cpus in self._lent.values():
+                self._free.extend(cpus)
+            self._lent = {}
+            self._free.sort()
+        for job_id in list(self._jobs):
+            self._update_affinity(job_id)
+
+    def lend_idle(self):
+        """
+        把空闲的核心平均借给运行中的任务，只在开启绑定时有效。
+        """
+        if not self.pin or not self._free or not self._grants:
+            return
+        job_ids = sorted(self._grants, key=lambda job_id: len(self._grants[job_id]))
+        for i, cpu in enumerate(self._free):
+            self._lent.setdefault(job_ids[i % len(job_ids)], []).append(cpu)
+        self._free = []
+        for job_id in job_ids:
+            self._update_affinity(job_id)
+
+    def _update_affinity(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        if self.pin:
+            job.cpus = self._grants[job_id] + self._lent.get(job_id, [])
+        else:
+            job.cpus = None
+        job.apply_affinity()
@@ -0,0 +1,126 @@
+import os
+import hashlib
+import subprocess
+from utils import DATA_DIR, file_key
+
+THUMBNAIL_DIR = os.path.join(DATA_DIR, "thumbnails")
+# 胶片条的缩略图数量和高度（像素）
+FILMSTRIP_TILES = 16
+THUMBNAIL_HEIGHT = 48
+
+
+def filmstrip_cache_file(file_path, count, height):
+    # 缓存文件名包含文件大小、修改时间和 inode，源文件变化后自动失效
+    key = repr((file_key(file_path), count, height)).encode("utf-8")
+    return os.path.join(THUMBNAIL_DIR, hashlib.sha1(key).hexdigest() + ".ppm")
+
+
+def _read_token(stream):
+    # 读取 PPM 文件头中的一个字段，跳过空白和注释
+    token = b""
+    while True:
+        char = stream.read(1)
+        if not char:
+            return None
+        if char == b"#":
+            while char not in (b"\n", b""):
+                char = stream.read(1)
+        elif char.isspace():
+            if token:
+                return token
+        else:
+            token += char
+
+
+def read_ppm_frames(stream):
+    """
+    从二进制流中逐个读取 PPM（P6）图像，返回完整图像数据的生成器。
+    """
+    while True:
+        magic = _read_token(stream)
+        if magic is None:
+            return
+        if magic != b"P6":
+            raise ValueError(f"不支持的图像格式: {magic!r}")
+        width, height, maxval = (int(_read_token(stream)) for _ in range(3))
+        size = width * height * 3 * (2 if maxval > 255 else 1)
+        pixels = stream.read(size)
+        if len(pixels) < size:
+            return
+        yield b"P6\n%d %d\n%d\n" % (width, height, maxval) + pixels
+
+
+def generate_filmstrip(
+    file_path,
+    duration,
+    count=FILMSTRIP_TILES,
+    height=THUMBNAIL_HEIGHT,
+    on_tile=None,
+    cancel=None,
+):
+    """
+    生成均匀分布在整个时长上的缩略图，返回 PPM 图像数据的列表。
+
+    只解码关键帧，一次 FFmpeg 调用生成全部缩略图，长视频也能较快完成。
+    结果缓存在 data/thumbnails 中，缓存命中时不启动 FFmpeg。
+
+    :param duration: 媒体时长（秒）
+    :param on_tile: 每生成一张缩略图时调用 on_tile(序号, PPM 数据)，在调用线程中执行
+    :param cancel: threading.Event，设置后停止生成并返回已生成的部分
+    """
+    cache_file = filmstrip_cache_file(file_path, count, height)
+    if os.path.exists(cache_file):
+        with open(cache_file, "rb") as f:
+            tiles = list(read_ppm_frames(f))
+        if len(tiles) == count:
+            if on_tile:
+                for i, tile in enumerate(tiles):
+                    on_tile(i, tile)
+            return tiles
+
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        file_path,
+        "-map",
+        "0:v:0",
+        "-vf",
+        f"fps={count}/{duration:.3f},scale=-2:{height}",
+        "-frames:v",
+        str(count),
+        "-f",
+        "image2pipe",
+        "-c:v",
+        "ppm",
+        "pipe:1",
+    ]
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    tiles = []
+    try:
+        for tile in read_ppm_frames(process.stdout):
+            if cancel is not None and cancel.is_set():
+                break
+            if on_tile:
+                on_tile(len(tiles), tile)
+            tiles.append(tile)
+    finally:
+        process.kill()
+        process.stdout.close()
+        process.wait()
+
+    # 只缓存完整的结果，先写入临时文件再重命名
+    if len(tiles) == count:
+        if not os.path.exists(THUMBNAIL_DIR):
+            os.makedirs(THUMBNAIL_DIR)
+        temp_file = cache_file + ".tmp"
+        with open(temp_file, "wb") as f:
+            for tile in tiles:
+                f.write(tile)
+        os.replace(temp_file, cache_file)
+    return tiles
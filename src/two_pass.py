@@ -0,0 +1,211 @@
+import os
+import shutil
+import tempfile
+from ffmpeg_utils import run_ffmpeg_command
+from progress import ProgressAggregator
+from thread_budget import apply_threads, option_value
+from utils import probe, convert_time_to_seconds
+
+# 容器封装的额外开销，按总大小的比例预留
+CONTAINER_OVERHEAD = 0.02
+# 视频码率低于此值（kbps）时画质无法接受，拒绝编码
+MIN_VIDEO_KBPS = 100
+# 重新编码音频且未指定码率时，FFmpeg 默认的音频码率（kbps）
+DEFAULT_AUDIO_KBPS = 128
+# 第一遍只收集统计信息，速度较快，在总进度中的权重较小
+FIRST_PASS_WEIGHT = 0.35
+
+
+def parse_seconds(value):
+    if value is None:
+        return None
+    if ":" in value:
+        return convert_time_to_seconds(value)
+    return float(value)
+
+
+def remove_option(command, name):
+    # 移除选项及其值
+    result = []
+    skip = False
+    for arg in command:
+        if skip:
+            skip = False
+        elif arg == name:
+            skip = True
+        else:
+            result.append(arg)
+    return result
+
+
+def output_duration(command, info):
+    # 输出的时长（秒），考虑命令中的 -ss、-to 和 -t
+    start = parse_seconds(option_value(command, "-ss")) or 0.0
+    length = parse_seconds(option_value(command, "-t"))
+    if length is not None:
+        return length
+    end = parse_seconds(option_value(command, "-to"))
+    if end is None:
+        end = info.duration
+    return end - start if end is not None else None
+
+
+def audio_kbps(command, info):
+    # 输出的音频码率（kbps）
+    if "-an" in command or not info.has_audio:
+        return 0
+    bitrate = option_value(command, "-b:a")
+    if bitrate:
+        return float(bitrate.rstrip("kK"))
+    if option_value(command, "-c:a") == "copy" and info.audio_bit_rate:
+        return info.audio_bit_rate / 1000
+    return DEFAULT_AUDIO_KBPS
+
+
+def target_video_bitrate(target_mb, duration, audio_bitrate):
+    """
+    按目标文件大小计算视频码率（kbps），1 MB 按 1000000 字节计算。
+
+    码率过低时抛出 ValueError，并给出可行的最小目标大小。
+    """
+    total_kbits = target_mb * 8000 * (1 - CONTAINER_OVERHEAD)
+    video_kbps = total_kbits / duration - audio_bitrate
+    if video_kbps < MIN_VIDEO_KBPS:
+        minimum = (
+            (MIN_VIDEO_KBPS + audio_bitrate)
+            * duration
+            / 8000
+            / (1 - CONTAINER_OVERHEAD)
+        )
+        raise ValueError(
+            f"目标大小过小：{duration:.0f} 秒的视频至少需要 {minimum:.1f} MB"
+        )
+    return int(video_kbps)
+
+
+def escape_option_value(value):
+    # -x265-params 等 "键=值:键=值" 形式的选项中，值里的反斜杠、单引号和冒号需要转义，
+    # 否则 Windows 路径中盘符后的冒号会把值截断
+    for char in ("\\", "'", ":"):
+        value = value.replace(char, "\\" + char)
+    return value
+
+
+def build_two_pass_commands(command, video_kbps, passlog):
+    """
+    把导出命令改写为两遍编码，返回 (第一遍命令, 第二遍命令)。
+
+    原命令中的 -crf 和 -b:v 被替换为计算出的码率。第一遍不输出音频、不写文件，
+    并使用快速分析设置；统计文件写入 passlog。
+    """
+    base = remove_option(remove_option(command, "-crf"), "-b:v")
+    codec = option_value(base, "-c:v")
+    if codec == "copy":
+        raise ValueError("不重新编码视频时无法按目标大小编码")
+
+    def pass_args(number):
+        if codec == "libx265":
+            # libx265 不支持 -pass，通过 x265-params 设置
+            params = option_value(base, "-x265-params")
+            extra = f"pass={number}:stats={escape_option_value(passlog + '.log')}"
+            if number == 1:
+                extra += ":slow-firstpass=0"
+            return ["-x265-params", f"{params}:{extra}" if params else extra]
+        args = ["-pass", str(number), "-passlogfile", passlog]
+        if codec in (None, "libx264") and number == 1:
+            args.extend(["-fastfirstpass", "1"])
+        return args
+
+    body = remove_option(base[:-1], "-x265-params")
+    rate = ["-b:v", f"{video_kbps}k"]
+    first = body + rate + pass_args(1) + ["-an", "-sn", "-f", "null", os.devnull]
+    second = body + rate + pass_args(2) + [base[-1]]
+    return first, second
+
+
+def run_two_pass_encode(
+    command,
+    target_mb,
+    on_progress=None,
+    log=None,
+    threads=None,
+    on_start=None,
+    is_cancelled=None,
+):
+    """
+    按目标文件大小两遍编码：根据时长和音频码率计算视频码率，第一遍收集统计信息，
+    第二遍按统计信息分配码率。统计文件写在输出文件旁边的临时文件夹中，结束后删除。
+
+    返回最后一个执行的 FFmpeg 进程的返回码，无法计算码率时抛出 ValueError。
+
+    :param command: build_command 生成的命令，最后一个参数为输出文件
+    """
+    input_file = option_value(command, "-i")
+    info = probe(input_file)
+    if info is None:
+        raise ValueError(f"无法读取媒体信息: {input_file}")
+    duration = output_duration(command, info)
+    if not duration:
+        raise ValueError("无法获取媒体时长")
+    video_kbps = target_video_bitrate(target_mb, duration, audio_kbps(command, info))
+    if log is not None:
+        log.append(f"目标大小 {target_mb} MB，视频码率 {video_kbps} kbps")
+
+    work_dir = tempfile.mkdtemp(
+        prefix=".twopass_", dir=os.path.dirname(os.path.abspath(command[-1]))
+    )
+    try:
+        first, second = build_two_pass_commands(
+            command, video_kbps, os.path.join(work_dir, "passlog")
+        )
+        aggregator = ProgressAggregator(duration, on_progress)
+        first_progress = aggregator.part(1, duration, duration * FIRST_PASS_WEIGHT)
+        second_progress = aggregator.part(
+            2, duration, duration * (1 - FIRST_PASS_WEIGHT)
+        )
+        threads = threads or os.cpu_count() or 1
+        returncode = run_ffmpeg_command(
+            apply_threads(first, threads, [os.devnull]),
+            first_progress,
+            log=log,
+            on_start=on_start,
+        )
+        if returncode != 0 or (is_cancelled and is_cancelled()):
+            return returncode
+        return run_ffmpeg_command(
+            apply_threads(second, threads, [command[-1]]),
+            second_progress,
+            log=log,
+            on_start=on_start,
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def size_report(output_file, target_mb):
+    # 比较实际大小与目标大小
+    actual_mb = os.path.getsize(output_file) / 1000000
+    deviation = (actual_mb - target_mb) / target_mb * 100
+    return f"目标大小 {target_mb:g} MB，实际 {actual_mb:.2f} MB（{deviation:+.1f}%）"
+
+
+def two_pass_target(command, target_mb):
+    """
+    返回按目标大小两遍编码的任务执行函数，用作 Job 的 target；完成后 job.summary 为大小对比。
+    """
+
+    def target(job):
+        returncode = run_two_pass_encode(
+            command,
+            target_mb,
+            job.report_progress,
+            job.log,
+            job.threads,
+            job.process_started,
+            lambda: job.cancelled,
+        )
+        if returncode == 0 and not job.cancelled and os.path.exists(command[-1]):
+            job.summary = size_report(command[-1], target_mb)
+        return returncode
+
+    return target
@@ -1,27 +1,283 @@
+import os
+import json
 import subprocess
-import re
+import threading
+from collections import OrderedDict
+
+DATA_DIR = "data"
+MEDIA_EXTENSIONS = (
+    ".mp4",
+    ".avi",
+    ".mkv",
+    ".mov",
+    ".flv",
+    ".ogg",
+    ".webm",
+    ".mp3",
+    ".aac",
+    ".wav",
+    ".flac",
+    ".m4a",
+)
+
+# 探测时读取开头若干秒的数据包，用于估计关键帧间隔
+KEYFRAME_PROBE_SECONDS = 10
+PROBE_CACHE_SIZE = 64
+
+
+class MediaInfo(object):
+    """
+    媒体文件的探测结果，由 probe() 返回。
+
+    :param path: 文件路径
+    :param size: 文件大小（字节）
+    :param mtime: 文件修改时间（纳秒）
+    :param format_name: 容器格式
+    :param duration: 总时长（秒），未知时为 None
+    :param bit_rate: 总码率（bit/s），未知时为 None
+    :param streams: 流信息列表，每项为 ffprobe 输出的字典
+    :param keyframe_interval: 开头部分视频关键帧的平均间隔（秒），未知时为 None
+    :param start_time: 容器的开始时间（秒），关键帧等时间戳从这里开始计数，未知时为 None
+    """
+
+    def __init__(
+        self,
+        path,
+        size,
+        mtime,
+        format_name=None,
+        duration=None,
+        bit_rate=None,
+        streams=None,
+        keyframe_interval=None,
+        start_time=None,
+    ):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.format_name = format_name
+        self.duration = duration
+        self.bit_rate = bit_rate
+        self.streams = streams or []
+        self.keyframe_interval = keyframe_interval
+        self.start_time = start_time
+
+        video = self.video_stream or {}
+        audio = self.audio_stream or {}
+        self.video_codec = video.get("codec_name")
+        self.width = video.get("width")
+        self.height = video.get("height")
+        self.pix_fmt = video.get("pix_fmt")
+        self.frame_rate = _parse_rate(video.get("avg_frame_rate")) or _parse_rate(
+            video.get("r_frame_rate")
+        )
+        self.rotation = _parse_rotation(video)
+        self.audio_codec = audio.get("codec_name")
+        self.sample_rate = _parse_number(audio.get("sample_rate"), int)
+        self.channels = audio.get("channels")
+        self.audio_bit_rate = _parse_number(audio.get("bit_rate"), int)
+
+    @property
+    def video_stream(self):
+        # 忽略作为封面的图片流
+        for stream in self.streams:
+            if stream.get("codec_type") == "video" and not stream.get(
+                "disposition", {}
+            ).get("attached_pic"):
+                return stream
+        return None
+
+    @property
+    def audio_stream(self):
+        for stream in self.streams:
+            if stream.get("codec_type") == "audio":
+                return stream
+        return None
+
+    @property
+    def has_video(self):
+        return self.video_stream is not None
+
+    @property
+    def has_audio(self):
+        return self.audio_stream is not None
+
+    @property
+    def display_size(self):
+        # 旋转 90° 或 270° 时宽高互换
+        if not self.width or not self.height:
+            return None
+        if self.rotation % 180 == 90:
+            return self.height, self.width
+        return self.width, self.height
+
+    @property
+    def duration_str(self):
+        if self.duration is None:
+            return None
+        return convert_seconds_to_time(self.duration)
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "size": self.size,
+            "mtime": self.mtime,
+            "format_name": self.format_name,
+            "duration": self.duration,
+            "bit_rate": self.bit_rate,
+            "streams": self.streams,
+            "keyframe_interval": self.keyframe_interval,
+            "start_time": self.start_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def _parse_number(value, type_=float):
+    try:
+        return type_(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rate(value):
+    # 帧率格式为 "30000/1001"
+    if not value or "/" not in value:
+        return None
+    num, den = value.split("/")
+    num, den = _parse_number(num), _parse_number(den)
+    if not num or not den:
+        return None
+    return num / den
+
+
+def _parse_rotation(stream):
+    rotation = None
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            rotation = _parse_number(side_data["rotation"])
+    if rotation is None:
+        rotation = _parse_number(stream.get("tags", {}).get("rotate"))
+    return int(round(rotation or 0)) % 360
+
+
+def _keyframe_interval(packets, stream_index):
+    times = [
+        _parse_number(packet.get("pts_time"))
+        for packet in packets
+        if packet.get("stream_index") == stream_index and "K" in packet.get("flags", "")
+    ]
+    times = sorted(t for t in times if t is not None)
+    if len(times) < 2:
+        return None
+    return (times[-1] - times[0]) / (len(times) - 1)
+
+
+def file_key(file_path):
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def run_ffprobe(file_path, size, mtime):
+    # 一次 ffprobe 调用同时获取容器、流和开头部分的关键帧信息
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        "-show_entries",
+        "packet=stream_index,pts_time,flags",
+        "-read_intervals",
+        f"%+{KEYFRAME_PROBE_SECONDS}",
+        file_path,
+    ]
+    try:
+        result = subprocess.run(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+        data = json.loads(result.stdout.decode("utf-8", errors="replace"))
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
+        return None
+
+    format_info = data.get("format", {})
+    streams = data.get("streams", [])
+    info = MediaInfo(
+        file_path,
+        size,
+        mtime,
+        format_name=format_info.get("format_name"),
+        duration=_parse_number(format_info.get("duration")),
+        bit_rate=_parse_number(format_info.get("bit_rate"), int),
+        streams=streams,
+        start_time=_parse_number(format_info.get("start_time")),
+    )
+    video = info.video_stream
+    if video is not None:
+        info.keyframe_interval = _keyframe_interval(
+            data.get("packets", []), video.get("index")
+        )
+    return info
+
+
+_probe_cache = OrderedDict()
+_probe_lock = threading.Lock()
+
+
+def probe(file_path):
+    """
+    探测媒体文件信息，返回 MediaInfo，失败时返回 None。
+
+    结果按 (路径, 大小, 修改时间, inode) 缓存在内存中并持久化到探测数据库，
+    文件被修改后会重新探测。
+    """
+    # 延迟导入，避免循环依赖
+    from probe_db import get_probe_db
+
+    try:
+        key = file_key(file_path)
+    except OSError:
+        return None
+    path, size, mtime, inode = key
+
+    with _probe_lock:
+        info = _probe_cache.get(key)
+        if info is not None:
+            _probe_cache.move_to_end(key)
+            return info
+
+    db = get_probe_db()
+    info = db.get(path, size, mtime, inode)
+    if info is None:
+        info = run_ffprobe(path, size, mtime)
+        if info is None:
+            return None
+        db.put(info, inode)
+
+    with _probe_lock:
+        _probe_cache[key] = info
+        _probe_cache.move_to_end(key)
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    return info
 
 
 def get_media_duration(file_path):
-    command = ["ffmpeg", "-i", file_path]
-    result = subprocess.run(command, stderr=subprocess.PIPE, text=True)
-    duration_pattern = re.compile(r"Duration: (\d+:\d+:\d+\.\d+)")
-    match = duration_pattern.search(result.stderr)
-    if match:
-        return match.group(1)
+    info = probe(file_path)
+    if info:
+        return info.duration_str
     return None
 
 
 # 获取视频宽高比，以便提供分辨率选项
 def get_aspect_ratio(file_path):
-    command = ["ffmpeg", "-i", file_path]
-    result = subprocess.run(
-        command, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True
-    )
-    resolution_pattern = re.compile(r"(\d{2,5})x(\d{2,5})")
-    match = resolution_pattern.search(result.stderr)
-    if match:
-        width, height = map(int, match.groups())
+    info = probe(file_path)
+    if info and info.display_size:
+        width, height = info.display_size
         ratio = width / height
         if abs(ratio - 4 / 3) < 0.01:
             return "4:3"
@@ -34,7 +290,7 @@ def get_aspect_ratio(file_path):
 
 def convert_time_to_seconds(time_str):
     h, m, s = map(float, time_str.split(":"))
-    return int(h * 3600 + m * 60 + s)
+    return h * 3600 + m * 60 + s
 
 
 def convert_seconds_to_time(seconds):
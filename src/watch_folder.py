@@ -0,0 +1,446 @@
+import os
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import threading
+from batch import DEFAULT_NAME_PATTERN, batch_output_path, validate_name_pattern
+from job_queue import Job
+from presets import get_preset_store, compile_preset, preset_output_extension
+from utils import DATA_DIR, MEDIA_EXTENSIONS
+
+WATCH_FILE = os.path.join(DATA_DIR, "watch.json")
+# 文件大小和修改时间保持不变这么久（秒）后才认为写入完成
+STABLE_SECONDS = 10
+# 检查待处理文件和等待事件的间隔（秒）
+CHECK_INTERVAL = 1.0
+# 没有 inotify 时检查文件夹修改时间的间隔（秒）
+POLL_INTERVAL = 5.0
+
+# inotify 事件，见 <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+# 事件类型：文件或文件夹出现（创建、移入、写入后关闭）、消失，以及事件丢失需要重新扫描
+CREATED = "created"
+REMOVED = "removed"
+OVERFLOW = "overflow"
+
+
+class WatchRule(object):
+    """
+    一条监视规则：把出现在 folder 中的媒体文件用预设处理，输出到 output_dir。
+
+    :param folder: 监视的文件夹
+    :param preset_key: data/presets.json 中的预设编号，预设只能有一个输入文件
+    :param output_dir: 输出文件夹，不能位于监视的文件夹中，否则输出会被再次处理
+    :param name_pattern: 输出文件名格式，与批量运行相同
+    :param recursive: 是否监视子文件夹，子文件夹的结构在输出文件夹中保留
+    """
+
+    def __init__(
+        self,
+        folder,
+        preset_key,
+        output_dir,
+        name_pattern=DEFAULT_NAME_PATTERN,
+        recursive=False,
+    ):
+        self.folder = os.path.abspath(folder)
+        self.preset_key = preset_key
+        self.output_dir = os.path.abspath(output_dir) if output_dir else None
+        self.name_pattern = name_pattern
+        self.recursive = recursive
+        self.preset = None
+        self.template = None
+        self.count = 0  # 已提交的任务数，用于输出文件名中的 {index}
+
+    def validate(self):
+        # 检查规则是否可以运行，不能运行时抛出 ValueError
+        if not os.path.isdir(self.folder):
+            raise ValueError(f"监视的文件夹不存在: {self.folder}")
+        if not self.output_dir:
+            raise ValueError(f"{self.folder} 没有指定输出文件夹")
+        inside = os.path.join(self.folder, "")
+        if self.output_dir == self.folder or (
+            self.recursive and self.output_dir.startswith(inside)
+        ):
+            raise ValueError(f"输出文件夹不能位于监视的文件夹中: {self.output_dir}")
+        self.preset = get_preset_store().get(self.preset_key)
+        if self.preset is None:
+            raise ValueError(f"预设不存在: {self.preset_key}")
+        self.template = compile_preset(self.preset)
+        self.template.validate()
+        if len(self.template.file_types) != 1:
+            raise ValueError(
+                f"监视文件夹只支持一个输入文件的预设，预设 {self.preset_key} 需要 "
+                f"{len(self.template.file_types)} 个"
+            )
+        validate_name_pattern(self.name_pattern)
+
+    def covers(self, path):
+        # 文件是否属于这条规则
+        parent = os.path.dirname(path)
+        if parent == self.folder:
+            return True
+        return self.recursive and parent.startswith(os.path.join(self.folder, ""))
+
+    def output_path(self, input_file):
+        relative = os.path.relpath(os.path.dirname(input_file), self.folder)
+        return batch_output_path(
+            input_file,
+            os.path.normpath(os.path.join(self.output_dir, relative)),
+            self.name_pattern,
+            preset_output_extension(self.preset["output_type"], input_file),
+            self.count + 1,
+        )
+
+
+def load_watch_rules(watch_file=WATCH_FILE):
+    """
+    从配置文件读取监视规则，文件内容为列表，每项包含 folder、preset，
+    可选 output、pattern 和 recursive。
+    """
+    with open(watch_file, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [
+        WatchRule(
+            entry["folder"],
+            entry["preset"],
+            entry.get("output"),
+            entry.get("pattern", DEFAULT_NAME_PATTERN),
+            entry.get("recursive", False),
+        )
+        for entry in entries
+    ]
+
+
+class InotifyEvents(object):
+    """
+    通过 inotify 接收文件夹的变化，只在 Linux 上可用，不需要额外的依赖。
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._ctypes = ctypes
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs = {}  # 监视描述符 -> 文件夹
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith("linux")
+
+    def add(self, folder):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            # 超过 fs.inotify.max_user_watches 时为 ENOSPC
+            error = self._ctypes.get_errno()
+            raise OSError(error, f"无法监视 {folder}: {os.strerror(error)}")
+        self._dirs[wd] = folder
+
+    def read(self, timeout):
+        # 等待事件，返回 [(事件类型, 路径, 是否为文件夹)]
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    events.append((OVERFLOW, None, False))
+                    continue
+                if mask & (IN_IGNORED | IN_DELETE_SELF):
+                    self._dirs.pop(wd, None)
+                    continue
+                folder = self._dirs.get(wd)
+                if folder is None or not name:
+                    continue
+                path = os.path.join(folder, os.fsdecode(name))
+                kind = REMOVED if mask & (IN_DELETE | IN_MOVED_FROM) else CREATED
+                events.append((kind, path, bool(mask & IN_ISDIR)))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingEvents(object):
+    """
+    没有 inotify 时的替代方案：定期检查被监视文件夹的修改时间，只重新列出有变化的文件夹。
+
+    文件夹中增加、删除或重命名文件时修改时间会变化，写入已有文件时不会，
+    写入过程由 FolderWatcher 检查文件大小来跟踪。
+    """
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self._dirs = {}  # 文件夹 -> (修改时间, {文件名: (inode, 是否为文件夹)})
+        self._next_poll = 0.0
+
+    @staticmethod
+    def _list(folder):
+        entries = {}
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    entries[entry.name] = (entry.inode(), entry.is_dir())
+                except OSError:
+                    continue
+        return entries
+
+    def add(self, folder):
+        self._dirs[folder] = (os.stat(folder).st_mtime_ns, self._list(folder))
+
+    def read(self, timeout):
+        now = time.monotonic()
+        if now < self._next_poll:
+            time.sleep(min(timeout, self._next_poll - now))
+            return []
+        self._next_poll = now + self.interval
+        events = []
+        for folder, (mtime, entries) in list(self._dirs.items()):
+            try:
+                new_mtime = os.stat(folder).st_mtime_ns
+                if new_mtime == mtime:
+                    continue
+                new_entries = self._list(folder)
+            except OSError:
+                # 文件夹已被删除
+                del self._dirs[folder]
+                continue
+            self._dirs[folder] = (new_mtime, new_entries)
+            for name, (inode, is_dir) in new_entries.items():
+                if entries.get(name, (None,))[0] != inode:
+                    events.append((CREATED, os.path.join(folder, name), is_dir))
+            for name, (inode, is_dir) in entries.items():
+                if name not in new_entries:
+                    events.append((REMOVED, os.path.join(folder, name), is_dir))
+        return events
+
+    def close(self):
+        self._dirs = {}
+
+
+class FolderWatcher(object):
+    """
+    监视文件夹，新文件写入完成（大小和修改时间在 stable_seconds 内不变）后按规则提交到任务队列。
+
+    启动时扫描一次所有监视的文件夹，之后只处理文件系统事件，不再扫描整个目录树
+    （inotify 事件队列溢出时除外）。输出文件已存在的输入会被跳过，因此重启后只处理
+    停止期间新增的文件。任务的并发数和 CPU 核心由任务队列控制。
+
+    :param rules: WatchRule 列表
+    :param job_queue: 提交任务的任务队列
+    :param stable_seconds: 判断文件写入完成的时间（秒）
+    :param polling: 为 True 时不使用 inotify
+    :param on_job_finish: 任务结束时的回调，参数为 job，在工作线程中调用
+    :param log: 输出日志的函数，参数为一行文本
+    """
+
+    def __init__(
+        self,
+        rules,
+        job_queue,
+        stable_seconds=STABLE_SECONDS,
+        polling=False,
+        on_job_finish=None,
+        log=None,
+    ):
+        self.rules = rules
+        self.job_queue = job_queue
+        self.stable_seconds = stable_seconds
+        self.polling = polling
+        self.on_job_finish = on_job_finish
+        self.log = log or (lambda text: None)
+        self._events = None
+        self._pending = {}  # 路径 -> (大小, 修改时间, 开始保持不变的时间)
+        self._submitted = {}  # 路径 -> 提交时的 (大小, 修改时间)
+        self._stopped = threading.Event()
+
+    def _open_events(self):
+        if not self.polling and InotifyEvents.available():
+            try:
+                events = InotifyEvents()
+                for rule in self.rules:
+                    for folder in self._folders(rule.folder, rule.recursive):
+                        events.add(folder)
+                return events
+            except OSError as e:
+                self.log(f"无法使用 inotify（{e}），改为定期检查")
+        events = PollingEvents()
+        for rule in self.rules:
+            for folder in self._folders(rule.folder, rule.recursive):
+                events.add(folder)
+        return events
+
+    @staticmethod
+    def _folders(folder, recursive):
+        if not recursive:
+            return [folder]
+        return [dir_path for dir_path, _, _ in os.walk(folder)]
+
+    def _rule_for(self, path):
+        for rule in self.rules:
+            if rule.covers(path):
+                return rule
+        return None
+
+    def _scan(self, folder, recursive):
+        # 把文件夹中已有的媒体文件加入待处理列表
+        for dir_path, dir_names, file_names in os.walk(folder):
+            if not recursive:
+                dir_names.clear()
+            for file_name in file_names:
+                self._touch(os.path.join(dir_path, file_name))
+
+    def _touch(self, path):
+        # 文件出现或被写入，重新开始计时
+        name = os.path.basename(path)
+        if name.startswith(".") or not name.lower().endswith(MEDIA_EXTENSIONS):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        key = (stat.st_size, stat.st_mtime_ns)
+        if self._submitted.get(path) == key:
+            return
+        self._pending[path] = key + (time.monotonic(),)
+
+    def _handle(self, kind, path, is_dir):
+        if kind == OVERFLOW:
+            self.log("文件系统事件过多，已丢失部分事件，重新扫描所有监视的文件夹")
+            for rule in self.rules:
+                self._scan(rule.folder, rule.recursive)
+            return
+        if kind == REMOVED:
+            prefix = os.path.join(path, "")
+            for known in (self._pending, self._submitted):
+                known.pop(path, None)
+                if is_dir:
+                    for other in [p for p in known if p.startswith(prefix)]:
+                        del known[other]
+            return
+        rule = self._rule_for(path)
+        if rule is None:
+            return
+        if not is_dir:
+            self._touch(path)
+        elif rule.recursive:
+            # 新的子文件夹：开始监视，并处理监视开始前已经写入的文件
+            for folder in self._folders(path, True):
+                try:
+                    self._events.add(folder)
+                except OSError as e:
+                    self.log(str(e))
+            self._scan(path, True)
+
+    def _check_pending(self):
+        now = time.monotonic()
+        for path, (size, mtime, since) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 文件已被删除或移走
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= self.stable_seconds:
+                del self._pending[path]
+                self._submitted[path] = (size, mtime)
+                self._submit(path)
+
+    def _submit(self, input_file):
+        rule = self._rule_for(input_file)
+        if rule is None:
+            return
+        output_file = rule.output_path(input_file)
+        if os.path.exists(output_file):
+            self.log(f"跳过（输出已存在）: {input_file}")
+            return
+        output_dir = os.path.dirname(output_file)
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        rule.count += 1
+
+        def on_finish(job):
+            # 长时间运行时不保留已结束的任务，避免任务列表无限增长
+            self.job_queue.forget(job)
+            if self.on_job_finish:
+                self.on_job_finish(job)
+
+        self.log(f"加入队列: {input_file} -> {output_file}")
+        self.job_queue.submit(
+            Job(
+                rule.template.fill([input_file], output_file),
+                description=output_file,
+                outputs=rule.template.output_files(output_file),
+                on_finish=on_finish,
+            )
+        )
+
+    def run(self):
+        """
+        开始监视，阻塞到调用 stop() 为止。规则无效时抛出 ValueError。
+        """
+        for rule in self.rules:
+            rule.validate()
+        self._events = self._open_events()
+        self.log(
+            f"正在监视 {len(self.rules)} 个文件夹"
+            f"（{'定期检查' if isinstance(self._events, PollingEvents) else 'inotify'}）"
+        )
+        try:
+            for rule in self.rules:
+                self._scan(rule.folder, rule.recursive)
+            while not self._stopped.is_set():
+                for kind, path, is_dir in self._events.read(CHECK_INTERVAL):
+                    self._handle(kind, path, is_dir)
+                self._check_pending()
+        finally:
+            self._events.close()
+
+    def stop(self):
+        self._stopped.set()
+
+    @property
+    def pending_count(self):
+        # 正在等待写入完成的文件数
+        return len(self._pending)
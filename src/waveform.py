@@ -0,0 +1,117 @@
+import subprocess
+import numpy as np
+from utils import file_key, probe
+
+# 解码时的采样率，波形概览不需要原始采样率
+WAVEFORM_SAMPLE_RATE = 8000
+# 峰值数据的分段数，绘制时再按画布宽度合并
+PEAK_BUCKETS = 2000
+# 每次从管道读取的采样数
+READ_SAMPLES = 65536
+
+
+def compute_peaks(file_path, duration, buckets=PEAK_BUCKETS):
+    """
+    解码音频并计算每段的最小值和最大值，返回形状为 (段数, 2) 的 int16 数组。
+
+    PCM 数据从 FFmpeg 管道逐块读取，内存占用与文件长度无关。
+    """
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-i",
+        file_path,
+        "-map",
+        "0:a:0",
+        "-ac",
+        "1",
+        "-ar",
+        str(WAVEFORM_SAMPLE_RATE),
+        "-f",
+        "s16le",
+        "-c:a",
+        "pcm_s16le",
+        "pipe:1",
+    ]
+    samples_per_bucket = max(1, int(duration * WAVEFORM_SAMPLE_RATE / buckets) + 1)
+    # 每次处理整数个分段，不足一段的采样留到下一次
+    read_size = max(READ_SAMPLES // samples_per_bucket, 1) * samples_per_bucket * 2
+
+    peaks = []
+    rest = b""
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            data = process.stdout.read(read_size)
+            if not data:
+                break
+            data = rest + data
+            usable = len(data) // (samples_per_bucket * 2) * samples_per_bucket * 2
+            rest = data[usable:]
+            if usable:
+                samples = np.frombuffer(data[:usable], dtype="<i2")
+                samples = samples.reshape(-1, samples_per_bucket)
+                peaks.append(
+                    np.stack([samples.min(axis=1), samples.max(axis=1)], axis=1)
+                )
+        if len(rest) >= 2:
+            samples = np.frombuffer(rest[: len(rest) // 2 * 2], dtype="<i2")
+            peaks.append(np.array([[samples.min(), samples.max()]], dtype=np.int16))
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    if not peaks:
+        return np.zeros((0, 2), dtype=np.int16)
+    return np.concatenate(peaks).astype(np.int16)
+
+
+def waveform_peaks(file_path):
+    """
+    返回文件第一条音轨的波形峰值，结果按文件大小、修改时间和 inode 缓存在探测数据库中。
+
+    文件没有音频时返回 None。
+    """
+    # 延迟导入，避免循环依赖
+    from probe_db import get_probe_db
+
+    info = probe(file_path)
+    if info is None or not info.has_audio or not info.duration:
+        return None
+
+    key = file_key(file_path)
+    db = get_probe_db()
+    data = db.get_waveform(*key)
+    if data is not None:
+        return np.frombuffer(data, dtype="<i2").reshape(-1, 2)
+
+    peaks = compute_peaks(key[0], info.duration)
+    db.put_waveform(*key, peaks.astype("<i2").tobytes())
+    return peaks
+
+
+def waveform_polygon(peaks, x, y, width, height):
+    """
+    把峰值按画布宽度合并为一个多边形，返回 Canvas.create_polygon 使用的坐标列表。
+
+    :param x: 波形左边的横坐标
+    :param y: 波形中线的纵坐标
+    :param width: 波形的宽度（像素）
+    :param height: 波形的总高度（像素）
+    """
+    width = int(width)
+    if len(peaks) == 0 or width < 2:
+        return []
+    # 每个像素列取对应各段的最小值中的最小值和最大值中的最大值
+    starts = np.linspace(0, len(peaks), width, endpoint=False).astype(int)
+    starts = np.unique(starts)
+    lows = np.minimum.reduceat(peaks[:, 0], starts) / 32768
+    highs = np.maximum.reduceat(peaks[:, 1], starts) / 32768
+    xs = x + np.arange(len(starts)) * (width / len(starts))
+
+    top = np.stack([xs, y - highs * height / 2], axis=1)
+    bottom = np.stack([xs[::-1], y - lows[::-1] * height / 2], axis=1)
+    return np.concatenate([top, bottom]).ravel().tolist()
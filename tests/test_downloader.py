@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import downloader  # noqa: E402
+from downloader import DownloadError, download_file  # noqa: E402
+
+DATA = os.urandom(100 * 1024)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    本地测试服务器：提供 DATA，支持 Range 请求，可以模拟连接中断。
+
+    server.drop_after: 下一个 GET 请求只发送这么多字节后断开连接，为 None 时完整发送
+    server.accept_ranges: 为 False 时忽略 Range 请求头，总是返回整个文件
+    server.ranges: 收到的 Range 请求头
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse_range(self):
+        header = self.headers.get("Range")
+        if not header or not self.server.accept_ranges:
+            return None
+        start, _, end = header[len("bytes=") :].partition("-")
+        return int(start), int(end) if end else len(DATA) - 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(DATA)))
+        if self.server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        byte_range = self._parse_range()
+        if byte_range is None:
+            body = DATA
+            self.send_response(200)
+        else:
+            with self.server.lock:
+                self.server.ranges.append(self.headers["Range"])
+            start, end = byte_range
+            body = DATA[start : end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(DATA)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        with self.server.lock:
+            drop_after, self.server.drop_after = self.server.drop_after, None
+        if drop_after is not None:
+            # 声明完整长度但只发送一部分，模拟下载中途断网
+            self.wfile.write(body[:drop_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class DownloadFileTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        self.server.drop_after = None
+        self.server.accept_ranges = True
+        self.server.ranges = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/ffmpeg.zip"
+
+        self.work_dir = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.work_dir, "ffmpeg.zip")
+        self.part_file = self.output_file + ".part"
+        self.state_file = self.part_file + ".json"
+        # 不使用环境变量中的代理
+        self.session = requests.Session()
+        self.session.trust_env = False
+
+        # 缩小块和分段的大小，让小文件也能分段、多次记录续传位置
+        for name, value in (
+            ("CHUNK_SIZE", 4 * 1024),
+            ("WRITE_BUFFER_SIZE", 8 * 1024),
+            ("MIN_RANGE_SIZE", 16 * 1024),
+            ("STATE_SAVE_INTERVAL", 0),
+        ):
+            patcher = mock.patch.object(downloader, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.session.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def download(self, **kwargs):
+        return download_file(self.url, self.output_file, session=self.session, **kwargs)
+
+    def read_output(self):
+        with open(self.output_file, "rb") as f:
+            return f.read()
+
+    def assert_no_partial_files(self):
+        self.assertFalse(os.path.exists(self.part_file))
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_parallel_ranges(self):
+        progress = []
+        self.download(
+            sha256=hashlib.sha256(DATA).hexdigest(),
+            connections=4,
+            on_progress=lambda *args: progress.append(args),
+        )
+
+        self.assertEqual(self.read_output(), DATA)
+        self.assertEqual(len(self.server.ranges), 4)
+        self.assertEqual(len(set(self.server.ranges)), 4)
+        self.assertEqual(progress[-1][:2], (len(DATA), len(DATA)))
+        self.assert_no_partial_files()
+
+    def test_resume_after_dropped_connection(self):
+        self.server.drop_after = 40 * 1024
+        with self.assertRaises(requests.RequestException):
+            self.download(connections=1)
+
+        # 中断后保留 .part 和记录已落盘位置的 .part.json
+        self.assertFalse(os.path.exists(self.output_file))
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        [(start, end, done)] = state["ranges"]
+        self.assertEqual((start, end), (0, len(DATA) - 1))
+        self.assertGreater(done, 0)
+        self.assertLessEqual(done, 40 * 1024)
+
+        progress = []
+        self.download(connections=1, on_progress=lambda *args: progress.append(args))
+
+        # 第二次只请求剩下的部分
+        self.assertEqual(self.server.ranges[-1], f"bytes={done}-{len(DATA) - 1}")
+        self.assertEqual(self.read_output(), DATA)
+        self.assertEqual(progress[-1][0], len(DATA))
+        self.assert_no_partial_files()
+
+    def test_state_for_other_url_ignored(self):
+        self.server.drop_after = 40 * 1024
+        with self.assertRaises(requests.RequestException):
+            self.download(connections=1)
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        state["url"] = "http://example.com/other.zip"
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+        self.download(connections=1)
+
+        self.assertEqual(self.server.ranges[-1], f"bytes=0-{len(DATA) - 1}")
+        self.assertEqual(self.read_output(), DATA)
+
+    def test_checksum_mismatch_removes_partial_file(self):
+        with self.assertRaises(DownloadError):
+            self.download(sha256="0" * 64, connections=4)
+
+        self.assertFalse(os.path.exists(self.output_file))
+        self.assert_no_partial_files()
+
+    def test_server_without_ranges(self):
+        self.server.accept_ranges = False
+        self.download(sha256=hashlib.sha256(DATA).hexdigest(), connections=4)
+
+        self.assertEqual(self.read_output(), DATA)
+        self.assertEqual(self.server.ranges, [])
+        self.assert_no_partial_files()
+
+
+if __name__ == "__main__":
+    unittest.main()
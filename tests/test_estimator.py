@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from estimator import sample_command  # noqa: E402
+from ffmpeg_utils import (  # noqa: E402
+    build_command,
+    build_ladder_command,
+    ladder_output_files,
+)
+
+
+def input_options(command):
+    # 第一个 "-i" 之前的选项
+    return command[1 : command.index("-i")]
+
+
+class SampleCommandTest(unittest.TestCase):
+    def test_single_output(self):
+        command = build_command(
+            "in.mp4", "out.mp4", "mp4 (h264)", "与原视频相同",
+            "", "", 23, "", "", "", True, "", "", False,
+        )  # fmt: skip
+        sample, files = sample_command(command, ["out.mp4"], 10.0, 5.0, "work", 0)
+
+        self.assertEqual(files, [os.path.join("work", "sample_0_0.mp4")])
+        self.assertEqual(sample[-1], files[0])
+        self.assertNotIn("out.mp4", sample)
+        options = input_options(sample)
+        self.assertEqual(options[options.index("-ss") + 1], "10.000000")
+        self.assertEqual(options[options.index("-t") + 1], "5.000000")
+
+    def test_trim_options_replaced(self):
+        command = build_command(
+            "in.mp4", "out.mp4", "mp4 (h264)", "与原视频相同",
+            "", "", 23, "", "", "", True, "00:00:30", "00:01:00", False,
+        )  # fmt: skip
+        sample, _ = sample_command(command, ["out.mp4"], 40.0, 5.0, "work", 1)
+
+        self.assertEqual(sample.count("-ss"), 1)
+        self.assertEqual(sample.count("-t"), 1)
+        self.assertNotIn("-to", sample)
+        self.assertIn("-ss", input_options(sample))
+
+    def test_multiple_outputs_bounded(self):
+        # -t 必须是输入选项，否则只限制第一个输出，其余分辨率会编码到文件末尾
+        resolutions = ["1280x720", "1920x1080"]
+        outputs = ladder_output_files("out.mp4", resolutions)
+        command = build_ladder_command(
+            "in.mp4", outputs, "mp4 (h264)", resolutions, "", 23, "", True
+        )
+        sample, files = sample_command(command, outputs, 10.0, 5.0, "work", 0)
+
+        self.assertEqual(len(files), 2)
+        for output_file in outputs:
+            self.assertNotIn(output_file, sample)
+        options = input_options(sample)
+        self.assertEqual(options[options.index("-t") + 1], "5.000000")
+        self.assertEqual(sample.count("-t"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
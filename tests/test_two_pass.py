@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from two_pass import build_two_pass_commands  # noqa: E402
+
+
+def parse_key_values(text):
+    # 与 FFmpeg 的 av_dict_parse_string(text, "=", ":") 相同的拆分规则：
+    # 反斜杠转义下一个字符，单引号内的字符原样保留
+    pairs = []
+    token = ""
+    key = None
+    quoted = False
+    chars = iter(text)
+    for char in chars:
+        if quoted:
+            if char == "'":
+                quoted = False
+            else:
+                token += char
+        elif char == "\\":
+            token += next(chars, "")
+        elif char == "'":
+            quoted = True
+        elif char == "=" and key is None:
+            key, token = token, ""
+        elif char == ":":
+            pairs.append((key, token))
+            key, token = None, ""
+        else:
+            token += char
+    pairs.append((key, token))
+    return dict(pairs)
+
+
+def option_value(command, name):
+    return command[command.index(name) + 1]
+
+
+class TwoPassCommandTest(unittest.TestCase):
+    def test_x265_windows_stats_path(self):
+        passlog = r"C:\Users\a b\.twopass_1\pass'log"
+        command = ["ffmpeg", "-i", "in.mp4", "-c:v", "libx265", "-crf", "23", "o.mp4"]
+        first, second = build_two_pass_commands(command, 1000, passlog)
+
+        for number, pass_command in ((1, first), (2, second)):
+            params = parse_key_values(option_value(pass_command, "-x265-params"))
+            self.assertEqual(params["pass"], str(number))
+            self.assertEqual(params["stats"], passlog + ".log")
+        self.assertNotIn("-crf", second)
+        self.assertEqual(second[-1], "o.mp4")
+
+    def test_x265_keeps_existing_params(self):
+        command = [
+            "ffmpeg", "-i", "in.mp4", "-c:v", "libx265",
+            "-x265-params", "aq-mode=3", "o.mp4",
+        ]  # fmt: skip
+        _, second = build_two_pass_commands(command, 1000, "/tmp/passlog")
+
+        params = parse_key_values(option_value(second, "-x265-params"))
+        self.assertEqual(params["aq-mode"], "3")
+        self.assertEqual(params["stats"], "/tmp/passlog.log")
+
+    def test_x264_passlogfile(self):
+        passlog = r"C:\Users\a b\passlog"
+        command = ["ffmpeg", "-i", "in.mp4", "-c:v", "libx264", "o.mp4"]
+        first, second = build_two_pass_commands(command, 1000, passlog)
+
+        self.assertEqual(option_value(first, "-passlogfile"), passlog)
+        self.assertEqual(option_value(second, "-pass"), "2")
+
+
+if __name__ == "__main__":
+    unittest.main()